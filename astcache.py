@@ -0,0 +1,261 @@
+import gc
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+from array import array
+from lisptypes import LispEmptyList, LispNonEmptyList, LispNumber, LispSymbol, LispValue
+from parser import parse
+from scope import Scope, bind_to_static_scope
+from source import Source, Span
+
+# Binary format of a cached program. All integers are little-endian, every section starts at a
+# multiple of 8 bytes:
+#
+#   header     MAGIC, FORMAT_VERSION, flags and the size of every section, see `HEADER`
+#   kinds      one byte per node, in postfix order: the items of a list come before the list itself
+#   operands   one int64 per node: symbol index, number, list length or big number index
+#   spans      start and end (int64) of every list, -1 for lists without a span
+#   lines      `Source.line_starts` of the source the spans refer to
+#   symbols    names of the symbols, UTF-8, separated by newlines (which the reader never puts in a name)
+#   numbers    numbers that don't fit in an int64, in decimal, separated by newlines
+#   name       name of the source, UTF-8
+#
+# Nodes in postfix order are rebuilt with a single stack, however deep the program is nested.
+MAGIC = b"LISPAST\0"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sIIqqqqqqq")
+
+# Node kinds
+SYMBOL = 0
+NUMBER = 1
+BIG_NUMBER = 2
+EMPTY = 3
+LIST = 4
+
+# Flags
+STATIC = 1
+NAMED = 2
+
+INT64_MIN, INT64_MAX = -2**63, 2**63 - 1
+
+# The modules whose code decides what a source parses and binds to
+VERSIONED_MODULES = ["lisptypes.py", "parser.py", "stringreader.py", "scope.py", "astcache.py"]
+interpreter_version: str | None = None
+
+
+def get_interpreter_version() -> str:
+    """A hash of the code that produces the cached programs, so changing it invalidates the cache"""
+    global interpreter_version
+    if interpreter_version is None:
+        digest = hashlib.sha256()
+        directory = os.path.dirname(os.path.abspath(__file__))
+        for module in VERSIONED_MODULES:
+            with open(os.path.join(directory, module), "rb") as f:
+                digest.update(f.read())
+        interpreter_version = digest.hexdigest()
+    return interpreter_version
+
+
+def padding(size: int) -> int:
+    return -size % 8
+
+
+def serialize(ast: list[LispValue], static: bool = False) -> bytes:
+    """The program `ast` in the cache format. Spans must all come from the same source"""
+    kinds = bytearray()
+    operands = array("q")
+    spans = array("q")
+    symbols: dict[LispSymbol, int] = {}
+    numbers: list[str] = []
+    source: Source | None = None
+
+    # Postfix order without recursion: lists are visited once to push their items, then emitted
+    pending: list[tuple[LispValue, bool]] = [(form, False) for form in reversed(ast)]
+    while pending:
+        node, visited = pending.pop()
+        if isinstance(node, LispNonEmptyList):
+            if not visited:
+                pending.append((node, True))
+                pending.extend((item, False) for item in reversed(node.to_python_list()))
+                continue
+            kinds.append(LIST)
+            operands.append(len(node))
+            if node.span is None:
+                spans.extend((-1, -1))
+            else:
+                if source is None:
+                    source = node.span.source
+                elif node.span.source is not source:
+                    raise Exception("can't serialize a program parsed from several sources")
+                spans.extend((node.span.start, node.span.end))
+        elif isinstance(node, LispSymbol):
+            if "\n" in node.symbolName:
+                raise Exception(f"can't serialize the symbol {node!r}")
+            kinds.append(SYMBOL)
+            operands.append(symbols.setdefault(node, len(symbols)))
+        elif isinstance(node, LispNumber):
+            if INT64_MIN <= node.numberValue <= INT64_MAX:
+                kinds.append(NUMBER)
+                operands.append(node.numberValue)
+            else:
+                kinds.append(BIG_NUMBER)
+                operands.append(len(numbers))
+                numbers.append(str(node.numberValue))
+        elif isinstance(node, LispEmptyList):
+            kinds.append(EMPTY)
+            operands.append(0)
+        else:
+            raise Exception(f"can't serialize {node!r}")
+
+    lines = source.line_starts if source is not None else array("q", [0])
+    symbol_bytes = "\n".join(symbol.symbolName for symbol in symbols).encode()
+    number_bytes = "\n".join(numbers).encode()
+    name_bytes = source.name.encode() if source is not None and source.name is not None else b""
+    flags = (STATIC if static else 0) | (NAMED if source is not None and source.name is not None else 0)
+
+    sections = [
+        bytes(kinds),
+        operands.tobytes(),
+        spans.tobytes(),
+        lines.tobytes(),
+        symbol_bytes,
+        number_bytes,
+        name_bytes,
+    ]
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, flags, len(kinds), len(spans) // 2, len(lines),
+                         len(symbols), len(symbol_bytes), len(number_bytes), len(name_bytes))
+    return header + b"".join(section + bytes(padding(len(section))) for section in sections)
+
+
+def deserialize(data: bytes | mmap.mmap) -> list[LispValue]:
+    """The program stored in `data`, any buffer (e.g. a `mmap.mmap`) in the cache format"""
+    view = memoryview(data)
+    try:
+        (magic, version, flags, node_count, span_count, line_count,
+         symbol_count, symbols_size, numbers_size, name_size) = HEADER.unpack_from(view)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise Exception(f"not a cached program of format version {FORMAT_VERSION}")
+
+        offset = HEADER.size
+
+        def section(size: int) -> memoryview:
+            nonlocal offset
+            start = offset
+            if size < 0 or start + size > len(view):
+                raise Exception("truncated cached program")
+            offset += size + padding(size)
+            return view[start:start + size]
+
+        kinds = section(node_count)
+        operands = section(8 * node_count).cast("q")
+        spans = section(16 * span_count).cast("q")
+        lines = array("q")
+        lines.frombytes(section(8 * line_count))
+        symbol_text = str(section(symbols_size), "utf-8")
+        number_text = str(section(numbers_size), "utf-8")
+        name = str(section(name_size), "utf-8") if flags & NAMED else None
+
+        symbols = [LispSymbol(symbol) for symbol in symbol_text.split("\n")] if symbol_count else []
+        big_numbers = [LispNumber(int(number)) for number in number_text.split("\n")] if numbers_size else []
+        source = Source(name)
+        source.line_starts = lines
+
+        # Nothing built here can be part of a cycle, so the cyclic collector is only in the way: it
+        # would go over the growing program again and again while the nodes are being allocated
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            return build(bytes(kinds), operands.tolist(), spans.tolist(), symbols, big_numbers, source)
+        finally:
+            if collecting:
+                gc.enable()
+    finally:
+        view.release()
+
+
+def build(kinds: bytes, operands: list[int], spans: list[int], symbols: list[LispSymbol],
+          big_numbers: list[LispNumber], source: Source) -> list[LispValue]:
+    values: list[LispValue] = []
+    push = values.append
+    small_numbers, small_min, small_max = LispNumber.small, LispNumber.SMALL_MIN, LispNumber.SMALL_MAX
+    empty = LispEmptyList()
+    view = LispNonEmptyList.view
+    next_span = 0
+
+    for kind, operand in zip(kinds, operands):
+        if kind == SYMBOL:
+            push(symbols[operand])
+        elif kind == LIST:
+            items = tuple(values[len(values) - operand:])
+            del values[len(values) - operand:]
+            node = view(items, 0, empty)
+            start = spans[next_span]
+            if start >= 0:
+                node.span = Span(source, start, spans[next_span + 1])
+            next_span += 2
+            push(node)
+        elif kind == NUMBER:
+            push(small_numbers[operand - small_min] if small_min <= operand <= small_max else LispNumber(operand))
+        elif kind == EMPTY:
+            push(empty)
+        else:
+            push(big_numbers[operand])
+    return values
+
+
+class ASTCache():
+    """Parsed programs stored in `directory` by the hash of their source and of the code that parsed them.
+    Cached programs are read through a memory map, and a hit skips tokenizing entirely.
+
+    Programs are cached before `bind_to_static_scope`: its renames are numbered by a counter of the
+    process, so they are made anew after every load and never collide with names the process uses"""
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+
+    def key(self, code: bytes, name: str | None) -> str:
+        """Errors name the source they were parsed from, so programs are cached by name as well"""
+        digest = hashlib.sha256(get_interpreter_version().encode())
+        digest.update(b"\0" if name is None else name.encode() + b"\1")
+        digest.update(code)
+        return digest.hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".ast")
+
+    def get(self, key: str) -> list[LispValue] | None:
+        """The program cached under `key`, None if there is none or it can't be read"""
+        try:
+            with open(self.path(key), "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return deserialize(data)
+        except Exception:
+            return None
+
+    def put(self, key: str, ast: list[LispValue]) -> None:
+        """Caches `ast` under `key`. The file is written aside and renamed, so readers never see it half-written"""
+        os.makedirs(self.directory, exist_ok=True)
+        descriptor, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, "wb") as f:
+                f.write(serialize(ast))
+            os.replace(temporary, self.path(key))
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+    def parse(self, code: str | bytes, name: str | None = None, static: bool = False) -> list[LispValue]:
+        """`parse(code, name)` cached, followed by `bind_to_static_scope` if `static`"""
+        data = code.encode() if isinstance(code, str) else code
+        key = self.key(data, name)
+        ast = self.get(key)
+        if ast is None:
+            ast = parse(code if isinstance(code, str) else code.decode(), name)
+            self.put(key, ast)
+        return bind_to_static_scope(ast, Scope()) if static else ast
+
+    def parse_file(self, path: str, static: bool = False) -> list[LispValue]:
+        # Read as text like everywhere else, so line endings are translated the same way
+        with open(path) as f:
+            return self.parse(f.read(), path, static)
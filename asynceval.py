@@ -0,0 +1,17 @@
+import asyncio
+from lisptypes import LispValue
+from scope import Scope
+from screen import Screen
+from stackeval import run, start
+
+# Work items the evaluator runs before letting other tasks of the event loop run
+STEPS_PER_YIELD = 1000
+
+
+async def eval_async(ast: list[LispValue], scope: Scope, screen: Screen, steps_per_yield: int = STEPS_PER_YIELD) -> LispValue:
+    """Evaluates a program like `stackeval.eval_stack`, yielding to the event loop every `steps_per_yield`
+    work items, so long programs don't starve the other tasks of the loop"""
+    work, values = start(ast)
+    while not run(work, values, scope, screen, steps_per_yield):
+        await asyncio.sleep(0)
+    return values[-1]
@@ -0,0 +1,108 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+from astcache import ASTCache
+from engines import ENGINES, evaluate
+from parser import parse
+from scope import Scope, bind_to_static_scope
+from screen import BufferScreen
+
+
+class ProgramReport(NamedTuple):
+    """The outcome of one program of a batch. `result` is None when the program failed with `error`"""
+    path: str
+    output: str
+    result: str | None
+    error: str | None
+    seconds: float
+
+
+def find_sources(target: str) -> list[str]:
+    """The .lisp files under a directory, or the paths listed in a manifest file, one per line.
+    Relative paths in a manifest are relative to the manifest itself"""
+    if os.path.isdir(target):
+        paths: list[str] = []
+        for directory, _, files in os.walk(target):
+            paths.extend(os.path.join(directory, name) for name in files if name.endswith(".lisp"))
+        return sorted(paths)
+
+    base = os.path.dirname(target)
+    with open(target) as manifest:
+        lines = [line.strip() for line in manifest]
+    return [os.path.join(base, line) for line in lines if line and not line.startswith("#")]
+
+
+def run_source(path: str, static: bool = False, engine: str = "tree", cache_dir: str | None = None) -> ProgramReport:
+    """Runs the program at `path`. With a `cache_dir`, parsed programs are cached there, see `astcache.ASTCache`"""
+    screen = BufferScreen()
+    start = time.perf_counter()
+    try:
+        if cache_dir is not None:
+            ast = ASTCache(cache_dir).parse_file(path, static)
+        else:
+            with open(path) as f:
+                ast = parse(f.read(), path)
+            if static:
+                ast = bind_to_static_scope(ast, Scope())
+        result, error = str(evaluate(ast, Scope(), screen, engine)), None
+    except Exception as exception:
+        result, error = None, str(exception)
+    return ProgramReport(path, screen.get_contents(), result, error, time.perf_counter() - start)
+
+
+def run_sources(paths: list[str], static: bool, engine: str, cache_dir: str | None = None) -> list[ProgramReport]:
+    return [run_source(path, static, engine, cache_dir) for path in paths]
+
+
+def run_batch(paths: list[str], workers: int | None = None, chunk_size: int = 16,
+              static: bool = False, engine: str = "tree", cache_dir: str | None = None) -> list[ProgramReport]:
+    """Runs every program on a pool of `workers` processes (one per core by default), each worker
+    taking `chunk_size` programs at a time. Reports come back in the order of `paths`"""
+    if engine not in ENGINES:
+        raise Exception(
+            f"unknown engine {engine}, available engines are: {', '.join(ENGINES)}")
+    chunks = [paths[i:i + chunk_size] for i in range(0, len(paths), chunk_size)]
+
+    reports: list[ProgramReport] = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for chunk_reports in pool.map(run_sources, chunks, [static] * len(chunks), [engine] * len(chunks),
+                                      [cache_dir] * len(chunks)):
+            reports.extend(chunk_reports)
+    return reports
+
+
+def main(argv: list[str] | None = None) -> int:
+    arguments = argparse.ArgumentParser(description="Runs many Lisp programs on a process pool")
+    arguments.add_argument("target", help="a directory of .lisp files, or a manifest listing one path per line")
+    arguments.add_argument("--workers", type=int, default=None, help="number of processes, one per core by default")
+    arguments.add_argument("--chunk-size", type=int, default=16, help="programs sent to a worker at a time")
+    arguments.add_argument("--static", action="store_true", help="bind programs to static scope before running them")
+    arguments.add_argument("--engine", default="tree", choices=list(ENGINES))
+    arguments.add_argument("--cache", help="directory to cache parsed programs in, keyed by their contents")
+    arguments.add_argument("--report", help="file to write the JSON report to, standard output by default")
+    options = arguments.parse_args(argv)
+
+    start = time.perf_counter()
+    reports = run_batch(find_sources(options.target), options.workers, options.chunk_size,
+                        options.static, options.engine, options.cache)
+    report = {
+        "programs": [program._asdict() for program in reports],
+        "failed": sum(program.error is not None for program in reports),
+        "seconds": time.perf_counter() - start,
+    }
+
+    if options.report is None:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(options.report, "w") as f:
+            json.dump(report, f, indent=2)
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,46 @@
+import time
+from compiler import eval_compiled
+from engines import Engine
+from interpreter import eval
+from lisptypes import LispValue
+from parser import parse
+from scope import Scope, bind_to_static_scope, resolve_lexical_addresses
+from screen import Screen
+
+
+class NullScreen(Screen):
+    def print(self, contents: str) -> None:
+        pass
+
+
+def make_nested_program(depth: int, repeat: int) -> str:
+    """Functions defined inside each other `depth` levels deep, each calling the next one `repeat` times.
+    The innermost body reads a variable from every level"""
+    code = "(let g 1)\n"
+    for level in range(depth):
+        code += f"(defun f{level} (x{level}) (let y{level} (+ x{level} 1))\n"
+    code += "(+ g " + " ".join(f"x{level} y{level}" for level in range(depth)) + ")"
+    for level in reversed(range(depth - 1)):
+        code += ")\n" + " ".join(f"(f{level + 1} {level})" for _ in range(repeat))
+    code += ")\n" + " ".join(f"(f0 {i})" for i in range(repeat)) + "\n"
+    return code
+
+
+def run(name: str, engine: Engine, ast: list[LispValue]):
+    start = time.perf_counter()
+    result = engine(ast, Scope(), NullScreen())
+    print(f"{name:<30} {(time.perf_counter() - start)*1000:9.2f} ms   result {result}")
+
+
+def main():
+    code = make_nested_program(8, 4)
+    static_ast = bind_to_static_scope(parse(code), Scope())
+    addressed_ast = resolve_lexical_addresses(static_ast)
+
+    run("tree, renamed symbols", eval, static_ast)
+    run("closure, renamed symbols", eval_compiled, static_ast)
+    run("closure, lexical addresses", eval_compiled, addressed_ast)
+
+
+if __name__ == "__main__":
+    main()
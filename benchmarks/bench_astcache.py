@@ -0,0 +1,29 @@
+import os
+import tempfile
+import time
+from astcache import ASTCache
+from benchmarks.workloads import large_source
+
+
+def main():
+    for size in [1_000_000, 4_000_000]:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "program.lisp")
+            with open(path, "w") as f:
+                f.write(large_source(size))
+            cache = ASTCache(os.path.join(directory, "cache"))
+
+            for static in [False, True]:
+                start = time.perf_counter()
+                cache.parse_file(path, static)
+                cold = time.perf_counter() - start
+                start = time.perf_counter()
+                cache.parse_file(path, static)
+                warm = time.perf_counter() - start
+
+                scope = "static" if static else "dynamic"
+                print(f"{size / 1e6:.0f} MB {scope:<8} cold {cold*1000:9.2f} ms   warm {warm*1000:9.2f} ms   {cold / warm:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
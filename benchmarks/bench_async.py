@@ -0,0 +1,58 @@
+import asyncio
+import time
+from typing import Awaitable, Callable
+from asynceval import eval_async
+from benchmarks.bench_engines import NullScreen, make_call_heavy_program
+from parser import parse
+from scope import Scope
+from stackeval import eval_stack
+
+
+async def measure_latency(run_scripts: Callable[[], Awaitable[object]]) -> list[float]:
+    """Lateness of a task that wants to wake up every millisecond while `run_scripts` runs"""
+    latencies: list[float] = []
+
+    async def ticker():
+        while True:
+            expected = time.perf_counter() + 0.001
+            await asyncio.sleep(0.001)
+            latencies.append(time.perf_counter() - expected)
+
+    ticking = asyncio.create_task(ticker())
+    await asyncio.sleep(0.01)
+    await run_scripts()
+    ticking.cancel()
+    return latencies
+
+
+def report(name: str, latencies: list[float], elapsed: float):
+    latencies = sorted(latencies)
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[min(len(latencies) - 1, len(latencies) * 99 // 100)] * 1000
+    print(f"{name:<22} total {elapsed*1000:8.1f} ms   ticker p50 {p50:7.2f} ms   p99 {p99:7.2f} ms   max {latencies[-1]*1000:7.2f} ms")
+
+
+def main():
+    ast = parse(make_call_heavy_program(6))
+    scripts = 8
+
+    async def blocking():
+        for _ in range(scripts):
+            eval_stack(ast, Scope(), NullScreen())
+            await asyncio.sleep(0)
+
+    start = time.perf_counter()
+    latencies = asyncio.run(measure_latency(blocking))
+    report("eval_stack, blocking", latencies, time.perf_counter() - start)
+
+    for steps in [100, 1_000, 10_000]:
+        async def cooperative():
+            await asyncio.gather(*(eval_async(ast, Scope(), NullScreen(), steps) for _ in range(scripts)))
+
+        start = time.perf_counter()
+        latencies = asyncio.run(measure_latency(cooperative))
+        report(f"eval_async, {steps} steps", latencies, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+import os
+import tempfile
+import time
+from batch import run_batch, run_sources
+from benchmarks.bench_engines import make_call_heavy_program
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        paths: list[str] = []
+        for i in range(400):
+            path = os.path.join(directory, f"program{i}.lisp")
+            with open(path, "w") as f:
+                f.write(make_call_heavy_program(4) + f"(print (level4 {i}))\n")
+            paths.append(path)
+
+        start = time.perf_counter()
+        run_sources(paths, False, "tree")
+        sequential = time.perf_counter() - start
+        print(f"in process  {len(paths) / sequential:9.1f} programs/s")
+
+        for workers in sorted({1, 2, 4, os.cpu_count() or 1}):
+            start = time.perf_counter()
+            run_batch(paths, workers=workers)
+            elapsed = time.perf_counter() - start
+            print(f"{workers} workers   {len(paths) / elapsed:9.1f} programs/s   {sequential / elapsed:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
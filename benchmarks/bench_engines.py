@@ -0,0 +1,40 @@
+import time
+from engines import ENGINES, evaluate
+from parser import parse
+from scope import Scope
+from screen import Screen
+
+
+class NullScreen(Screen):
+    def print(self, contents: str) -> None:
+        pass
+
+
+def make_call_heavy_program(levels: int) -> str:
+    """A tree of calls: every level calls the one below it three times, so the program makes 3^levels calls"""
+    code = """(defun square (x) (* x x))
+              (defun level0 (n) (/ (+ (square n) (square (- n 1))) 2))
+           """
+    for level in range(1, levels + 1):
+        code += f"(defun level{level} (n) (- (+ (level{level - 1} n) (level{level - 1} (+ n 1))) (level{level - 1} 1)))\n"
+    code += f"(level{levels} 3)\n"
+    return code
+
+
+def main():
+    code = make_call_heavy_program(9)
+    ast = parse(code)
+
+    timings: dict[str, float] = {}
+    for engine in ENGINES:
+        start = time.perf_counter()
+        result = evaluate(ast, Scope(), NullScreen(), engine)
+        timings[engine] = time.perf_counter() - start
+        print(f"{engine:<10} {timings[engine]*1000:9.2f} ms   result {result}")
+
+    for engine, timing in timings.items():
+        print(f"{engine:<10} speedup over tree: {timings['tree'] / timing:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import copy
+import time
+from benchmarks.bench_scope import bench_blocks, bench_lookups, bench_program, make_globals_program
+from environment import PersistentScope
+from lisptypes import LispNumber, LispSymbol
+from scope import Scope, SymbolType
+
+
+def report(name: str, shallow: float, persistent: float):
+    print(f"{name:<40} shallow {shallow*1000:9.2f} ms   persistent {persistent*1000:9.2f} ms   {persistent/shallow:6.1f}x slower")
+
+
+def bench_snapshots(scope: Scope, globals_count: int, snapshots: int) -> float:
+    """Takes `snapshots` snapshots of a scope with `globals_count` globals, changing one of them in between"""
+    symbols = [LispSymbol(f"g{i}") for i in range(globals_count)]
+    for i, symbol in enumerate(symbols):
+        scope.create_symbol(symbol, LispNumber(i), SymbolType.VARIABLE)
+
+    kept: list[object] = []
+    start = time.perf_counter()
+    for i in range(snapshots):
+        scope.set_symbol(symbols[i % globals_count], LispNumber(i), SymbolType.VARIABLE)
+        kept.append(scope.snapshot() if isinstance(scope, PersistentScope) else copy.deepcopy(scope))
+    return time.perf_counter() - start
+
+
+def main():
+    for globals_count in [10, 100, 1000]:
+        report(f"lookups, {globals_count} globals",
+               bench_lookups(Scope(), globals_count, 100_000),
+               bench_lookups(PersistentScope(), globals_count, 100_000))
+
+    report("200 nested blocks, 20 bindings each",
+           bench_blocks(Scope(), 200, 20),
+           bench_blocks(PersistentScope(), 200, 20))
+
+    code = make_globals_program(500, 2_000)
+    report("program, 500 globals",
+           bench_program(Scope(), code),
+           bench_program(PersistentScope(), code))
+
+    # Snapshots of a `Scope` have to copy it
+    for globals_count in [100, 1000]:
+        shallow = bench_snapshots(Scope(), globals_count, 200)
+        persistent = bench_snapshots(PersistentScope(), globals_count, 200)
+        print(f"{f'200 snapshots, {globals_count} globals':<40} deepcopy {shallow*1000:9.2f} ms   "
+              f"persistent {persistent*1000:9.2f} ms   {shallow/persistent:6.1f}x faster")
+
+
+if __name__ == "__main__":
+    main()
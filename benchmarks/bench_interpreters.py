@@ -0,0 +1,25 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from benchmarks.bench_engines import NullScreen, make_call_heavy_program
+from interpreter import Interpreter
+from parser import parse
+from scope import Scope
+
+
+def run_program(code: str) -> None:
+    Interpreter().eval(parse(code), Scope(), NullScreen())
+
+
+def main():
+    programs = [make_call_heavy_program(4) + f"(level4 {i})\n" for i in range(400)]
+
+    for workers in [1, 2, 4, 8]:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(run_program, programs))
+        elapsed = time.perf_counter() - start
+        print(f"{workers} threads   {len(programs) / elapsed:9.1f} programs/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+import time
+from typing import Callable
+from benchmarks.bench_engines import NullScreen, make_call_heavy_program
+from interpreter import Interpreter
+from limits import LimitedInterpreter, Limits, eval_limited
+from parser import parse
+from scope import Scope
+
+
+def best_of(runs: int, run: Callable[[], object]) -> float:
+    timings: list[float] = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    ast = parse(make_call_heavy_program(8))
+    generous = Limits(max_steps=10**9, max_depth=10**6, max_cells=10**9)
+
+    baseline = best_of(3, lambda: Interpreter().eval(ast, Scope(), NullScreen()))
+    disabled = best_of(3, lambda: eval_limited(ast, Scope(), NullScreen(), Limits()))
+    enforced = best_of(3, lambda: LimitedInterpreter(generous).eval(ast, Scope(), NullScreen()))
+
+    print(f"Interpreter              {baseline*1000:9.2f} ms")
+    print(f"eval_limited, no limits  {disabled*1000:9.2f} ms   {(disabled / baseline - 1)*100:+6.1f}%")
+    print(f"all limits enforced      {enforced*1000:9.2f} ms   {(enforced / baseline - 1)*100:+6.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import time
+import tracemalloc
+from interpreter import eval
+from lisptypes import LispNonEmptyList, LispValue
+from parser import parse
+from scope import Scope
+from screen import Screen
+
+
+class NullScreen(Screen):
+    def print(self, contents: str) -> None:
+        pass
+
+
+def make_large_program(functions: int) -> str:
+    """Many small functions over a handful of variable names, with lots of repeated symbols and small numbers"""
+    code = "(let acc 0)\n"
+    for i in range(functions):
+        code += f"(defun f{i} (x y) (let z (+ x y 1 2 3)) (= acc (+ acc (* z 2) (- z 1) (/ z 3))))\n"
+    for i in range(functions):
+        code += f"(f{i} {i % 100} {i % 7})\n"
+    return code
+
+
+def count_nodes(ast: list[LispValue]) -> int:
+    count = 0
+    pending = list(ast)
+    while pending:
+        node = pending.pop()
+        count += 1
+        if isinstance(node, LispNonEmptyList):
+            items = node.to_python_list()
+            pending.extend(items)
+            count += len(items)
+    return count
+
+
+def main():
+    code = make_large_program(5_000)
+    print(f"source size: {len(code) / 1024:.0f} KiB")
+
+    start = time.perf_counter()
+    ast = parse(code)
+    parse_time = time.perf_counter() - start
+    del ast
+
+    # Measured on a separate parse, tracemalloc slows allocation down
+    tracemalloc.start()
+    ast = parse(code)
+    ast_memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    nodes = count_nodes(ast)
+    print(f"parse:  {parse_time*1000:9.2f} ms")
+    print(f"AST:    {nodes} nodes, {ast_memory / 1024 / 1024:.2f} MiB, {ast_memory / nodes:.1f} bytes/node")
+
+    start = time.perf_counter()
+    eval(ast, Scope(), NullScreen())
+    print(f"eval:   {(time.perf_counter() - start)*1000:9.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import time
+from typing import Callable, TypeVar
+from lisptypes import LispEmptyList, LispList, LispNonEmptyList, LispNumber, LispValue
+from scope import Scope
+from screen import Screen
+from compiler import eval_compiled
+from parser import parse
+
+T = TypeVar("T")
+
+
+def timed(name: str, action: Callable[[], T]) -> T:
+    start = time.perf_counter()
+    result = action()
+    print(f"{name:<40} {(time.perf_counter() - start)*1000:9.2f} ms")
+    return result
+
+
+def build_consed(count: int) -> LispList:
+    consed: LispList = LispEmptyList()
+    for i in reversed(range(count)):
+        consed = LispNonEmptyList(LispNumber(i), consed)
+    return consed
+
+
+def main():
+    count = 1_000_000
+    numbers: list[LispValue] = [LispNumber(i) for i in range(count)]
+
+    built = timed("from_list, 1M items", lambda: LispList.from_list(numbers))
+    assert isinstance(built, LispNonEmptyList)
+    timed("str, 1M items", lambda: str(built))
+    timed("to_python_list, 1M items", lambda: built.to_python_list())
+    timed("index every 1000th item", lambda: [built[i] for i in range(0, count, 1000)])
+
+    consed = timed("cons, 1M items", lambda: build_consed(count))
+    timed("str, 1M consed items", lambda: str(consed))
+    timed("compare both", lambda: built == consed)
+
+    code = "(list " + " ".join(map(str, range(100_000))) + ")"
+    ast = timed("parse (list ...), 100k items", lambda: parse(code))
+    timed("eval (list ...), 100k items", lambda: eval_compiled(ast, Scope(), Screen()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+import time
+from benchmarks.bench_engines import NullScreen, make_call_heavy_program
+from interpreter import Interpreter
+from memo import MemoizingInterpreter
+from parser import parse
+from scope import Scope
+
+
+def main():
+    for levels in [4, 6, 8, 10]:
+        ast = parse(make_call_heavy_program(levels))
+        timings: list[float] = []
+        for interpreter in [Interpreter(), MemoizingInterpreter()]:
+            start = time.perf_counter()
+            interpreter.eval(ast, Scope(), NullScreen())
+            timings.append(time.perf_counter() - start)
+        plain, memoized = timings
+        print(f"3^{levels:<3} calls   plain {plain*1000:9.2f} ms   memoized {memoized*1000:7.2f} ms   {plain / memoized:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
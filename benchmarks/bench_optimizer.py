@@ -0,0 +1,30 @@
+import time
+from benchmarks.bench_engines import NullScreen
+from benchmarks.bench_limits import best_of
+from benchmarks.workloads import nested_arithmetic
+from interpreter import eval
+from optimizer import optimize
+from parser import parse
+from scope import Scope
+
+
+def make_helper_heavy_program(calls: int) -> str:
+    code = "(defun sq (x) (* x x)) (defun add (a b) (+ a b)) (defun unused (n) (print n)) (let y 7)\n"
+    return code + "".join(f"(add (sq y) (+ {i} (* 2 (+ y 3))))\n" for i in range(calls))
+
+
+def main():
+    for name, code in [("nested arithmetic", nested_arithmetic(200)), ("small helpers", make_helper_heavy_program(20_000))]:
+        ast = parse(code)
+        start = time.perf_counter()
+        optimized, changes = optimize(ast)
+        optimize_time = time.perf_counter() - start
+
+        plain = best_of(3, lambda: eval(ast, Scope(), NullScreen()))
+        faster = best_of(3, lambda: eval(optimized, Scope(), NullScreen()))
+        print(f"{name:<18} {len(changes):6} changes in {optimize_time*1000:8.2f} ms   "
+              f"eval {plain*1000:8.2f} ms -> {faster*1000:8.2f} ms   {plain / faster:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import time
+from parser import parse
+from source import Source
+
+
+def make_flat_source(size: int) -> str:
+    """Many short top-level forms, one per line"""
+    line = "(let some_variable_name (+ 12345 -678 (* counter 9)))\n"
+    return line * (size // len(line))
+
+
+def make_wide_source(size: int) -> str:
+    """A single list with a very large number of atoms"""
+    items = " ".join(f"item{i % 1000} {i}" for i in range(size // 12))
+    return f"(list {items})"
+
+
+def make_nested_source(depth: int, repeat: int) -> str:
+    """Forms nested `depth` levels deep"""
+    form = "(+ 1 " * depth + "2" + ")" * depth + "\n"
+    return form * repeat
+
+
+def throughput(name: str, code: str):
+    start = time.perf_counter()
+    parse(code)
+    elapsed = time.perf_counter() - start
+    megabytes = len(code) / 1024 / 1024
+    print(f"{name:<30} {megabytes:6.2f} MiB   {elapsed*1000:9.2f} ms   {megabytes / elapsed:6.2f} MiB/s")
+
+
+def locations(code: str, count: int):
+    start = time.perf_counter()
+    source = Source(None, code)
+    index_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    step = len(code) // count
+    for position in range(0, len(code), step):
+        source.describe(position)
+    lookup_time = time.perf_counter() - start
+    print(f"line index of {len(code) / 1024 / 1024:.2f} MiB: built in {index_time*1000:.2f} ms, "
+          f"{count} locations in {lookup_time*1000:.2f} ms")
+
+
+def main():
+    throughput("flat", make_flat_source(4 * 1024 * 1024))
+    throughput("wide", make_wide_source(4 * 1024 * 1024))
+    throughput("nested, depth 500", make_nested_source(500, 1000))
+    throughput("nested, depth 100000", make_nested_source(100_000, 5))
+    locations(make_flat_source(4 * 1024 * 1024), 10_000)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+from benchmarks.bench_engines import NullScreen, make_call_heavy_program
+from benchmarks.bench_limits import best_of
+from interpreter import Interpreter
+from parser import parse
+from profiler import Profiler, profile
+from scope import Scope
+
+
+def main():
+    ast = parse(make_call_heavy_program(8))
+
+    plain = best_of(3, lambda: Interpreter().eval(ast, Scope(), NullScreen()))
+    profiled = best_of(3, lambda: Interpreter(Profiler()).eval(ast, Scope(), NullScreen()))
+    print(f"not profiled  {plain*1000:9.2f} ms")
+    print(f"profiled      {profiled*1000:9.2f} ms   {profiled / plain:.2f}x")
+    print()
+    print(profile(ast, Scope(), NullScreen())[1].report())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import time
+from interpreter import eval
+from lisptypes import LispNumber, LispSymbol
+from parser import parse
+from scope import DeepScope, Scope, SymbolType
+from screen import Screen
+
+
+class NullScreen(Screen):
+    def print(self, contents: str) -> None:
+        pass
+
+
+def make_globals_program(globals_count: int, reads: int) -> str:
+    """Binds `globals_count` globals, then reads the first one (the deepest binding) `reads` times"""
+    code = "".join(f"(let g{i} {i})\n" for i in range(globals_count))
+    code += "(defun touch () (+ g0 g0 g0 g0))\n"
+    code += "(touch)\n" * reads
+    return code
+
+
+def bench_lookups(scope: Scope, globals_count: int, lookups: int) -> float:
+    symbols = [LispSymbol(f"g{i}") for i in range(globals_count)]
+    for i, symbol in enumerate(symbols):
+        scope.create_symbol(symbol, LispNumber(i), SymbolType.VARIABLE)
+
+    start = time.perf_counter()
+    for i in range(lookups):
+        scope.read_symbol(symbols[i % globals_count])
+    return time.perf_counter() - start
+
+
+def bench_blocks(scope: Scope, depth: int, bindings_per_block: int) -> float:
+    symbols = [LispSymbol(f"v{i}") for i in range(bindings_per_block)]
+
+    start = time.perf_counter()
+    for i in range(depth):
+        scope.begin_block(f"block{i}")
+        for symbol in symbols:
+            scope.create_symbol(symbol, LispNumber(i), SymbolType.VARIABLE)
+            scope.read_symbol(symbol)
+    for _ in range(depth):
+        scope.end_block()
+    return time.perf_counter() - start
+
+
+def bench_program(scope: Scope, code: str) -> float:
+    ast = parse(code)
+    start = time.perf_counter()
+    eval(ast, scope, NullScreen())
+    return time.perf_counter() - start
+
+
+def report(name: str, deep: float, shallow: float):
+    print(f"{name:<40} deep {deep*1000:9.2f} ms   shallow {shallow*1000:9.2f} ms   speedup {deep/shallow:6.1f}x")
+
+
+def main():
+    for globals_count in [10, 100, 1000]:
+        report(f"lookups, {globals_count} globals",
+               bench_lookups(DeepScope(), globals_count, 100_000),
+               bench_lookups(Scope(), globals_count, 100_000))
+
+    report("200 nested blocks, 20 bindings each",
+           bench_blocks(DeepScope(), 200, 20),
+           bench_blocks(Scope(), 200, 20))
+
+    code = make_globals_program(500, 2_000)
+    report("program, 500 globals",
+           bench_program(DeepScope(), code),
+           bench_program(Scope(), code))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import os
+import time
+from typing import IO
+from compiler import compile_program
+from parser import parse
+from scope import Scope
+from screen import FileSink, ListSink, RingSink, Screen
+
+
+class ConcatenatingScreen(Screen):
+    """How `TestScreen` used to keep its contents"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.contents = ""
+
+    def print(self, contents: str) -> None:
+        self.contents += contents + "\n"
+
+
+class PrintScreen(Screen):
+    """How `Screen` used to write: one print() call per line"""
+
+    def __init__(self, file: IO[str]) -> None:
+        super().__init__()
+        self.file = file
+
+    def print(self, contents: str) -> None:
+        print(contents, file=self.file)
+
+
+def main():
+    lines = 40_000
+    program = compile_program(parse(f"""(defun chatty (n) (let m (* n 2)) (print n m n m) n)
+                    {"(chatty 123456789)" * (lines // 4)}"""))
+
+    with open(os.devnull, "w") as devnull:
+        screens = {
+            "string concatenation": ConcatenatingScreen(),
+            "list sink": Screen(ListSink()),
+            "ring sink, 100 lines": Screen(RingSink(100)),
+            "print() per line": PrintScreen(devnull),
+            "file sink, 1 line": Screen(FileSink(devnull, 1)),
+            "file sink, 4096 lines": Screen(FileSink(devnull, 4096)),
+        }
+        for name, screen in screens.items():
+            start = time.perf_counter()
+            program(Scope(), screen)
+            screen.flush()
+            print(f"{name:<22} {(time.perf_counter() - start)*1000:9.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
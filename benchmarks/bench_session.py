@@ -0,0 +1,32 @@
+import time
+from benchmarks.bench_engines import NullScreen
+from benchmarks.workloads import many_defuns
+from cli import Session
+from interpreter import eval
+from parser import parse
+from scope import Scope
+
+
+def main():
+    library = many_defuns(500)
+    snippets = [f"(f{i % 500} {i} 1)" for i in range(100)]
+
+    # Running every snippet together with the library it needs, as glue code calling `parse` and `eval` does
+    start = time.perf_counter()
+    for snippet in snippets:
+        eval(parse(library + snippet), Scope(), NullScreen())
+    glue = time.perf_counter() - start
+
+    session = Session(screen=NullScreen())
+    session.run(library)
+    start = time.perf_counter()
+    for snippet in snippets:
+        session.run(snippet)
+    live = time.perf_counter() - start
+
+    print(f"{len(snippets)} snippets   re-running the library {glue*1000:9.2f} ms   "
+          f"live session {live*1000:7.2f} ms   {glue / live:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+import time
+from engines import ENGINES
+from parser import parse
+from scope import Scope
+from screen import Screen
+
+
+def make_call_chain(count: int, tail: bool) -> str:
+    """`count` functions each calling the next one, in tail position or not"""
+    call = "(f{next} (+ n 1))" if tail else "(+ 1 (f{next} n))"
+    code = "".join(f"(defun f{i} (n) {call.format(next=i + 1)})\n" for i in range(count))
+    return code + f"(defun f{count} (n) n)\n(f0 0)\n"
+
+
+def make_nested_arithmetic(depth: int) -> str:
+    return "(+ 1 " * depth + "0" + ")" * depth
+
+
+def run(name: str, engine: str, code: str):
+    ast = parse(code)
+    start = time.perf_counter()
+    try:
+        ENGINES[engine](ast, Scope(), Screen())
+        outcome = f"{(time.perf_counter() - start)*1000:9.2f} ms"
+    except Exception as error:
+        outcome = f"failed: {type(error.__context__ or error).__name__}"
+    print(f"{name:<35} {engine:<8} {outcome}")
+
+
+def main():
+    for depth in [200, 2_000, 50_000]:
+        for engine in ENGINES:
+            run(f"tail call chain, {depth}", engine, make_call_chain(depth, tail=True))
+        for engine in ENGINES:
+            run(f"non-tail call chain, {depth}", engine, make_call_chain(depth, tail=False))
+        for engine in ENGINES:
+            run(f"nested arithmetic, depth {depth}", engine, make_nested_arithmetic(depth))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import os
+import tempfile
+import time
+import tracemalloc
+from typing import Callable
+from interpreter import eval, eval_stream
+from parser import parse, parse_stream
+from scope import Scope
+from screen import Screen
+
+
+class FirstOutputScreen(Screen):
+    def __init__(self, start: float) -> None:
+        super().__init__()
+        self.start = start
+        self.first_output: float | None = None
+
+    def print(self, contents: str) -> None:
+        if self.first_output is None:
+            self.first_output = time.perf_counter() - self.start
+
+
+def write_program(path: str, forms: int):
+    with open(path, "w") as f:
+        f.write("(let total 0)\n(defun add (n) (= total (+ total n)))\n")
+        for i in range(forms):
+            f.write(f"(add (+ {i} (* 2 (- {i} 1)) (/ {i} 3)))\n")
+            if i % 1000 == 0:
+                f.write("(print total)\n")
+
+
+def run_whole(path: str) -> FirstOutputScreen:
+    start = time.perf_counter()
+    screen = FirstOutputScreen(start)
+    with open(path) as f:
+        eval(parse(f.read()), Scope(), screen)
+    return screen
+
+
+def run_stream(path: str) -> FirstOutputScreen:
+    start = time.perf_counter()
+    screen = FirstOutputScreen(start)
+    with open(path, "rb") as f:
+        eval_stream(parse_stream(f), Scope(), screen)
+    return screen
+
+
+def measure(name: str, run: Callable[[str], FirstOutputScreen], path: str):
+    tracemalloc.start()
+    start = time.perf_counter()
+    screen = run(path)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<20} total {elapsed*1000:9.2f} ms   first output {(screen.first_output or 0)*1000:9.2f} ms   "
+          f"peak {peak / 1024 / 1024:7.2f} MiB")
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "program.lisp")
+        write_program(path, 100_000)
+        print(f"source size: {os.path.getsize(path) / 1024 / 1024:.2f} MiB")
+
+        measure("parse + eval", run_whole, path)
+        measure("stream", run_stream, path)
+
+
+if __name__ == "__main__":
+    main()
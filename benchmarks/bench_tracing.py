@@ -0,0 +1,20 @@
+from benchmarks.bench_engines import NullScreen, make_call_heavy_program
+from benchmarks.bench_limits import best_of
+from interpreter import Interpreter
+from parser import parse
+from scope import Scope
+from tracing import RecordingTracer, Tracer
+
+
+def main():
+    ast = parse(make_call_heavy_program(8))
+
+    untraced = best_of(3, lambda: Interpreter().eval(ast, Scope(), NullScreen()))
+    print(f"no tracer             {untraced*1000:9.2f} ms")
+    for name, make_tracer in [("empty tracer", Tracer), ("recording tracer", RecordingTracer)]:
+        traced = best_of(3, lambda: Interpreter(make_tracer()).eval(ast, Scope(), NullScreen()))
+        print(f"{name:<21} {traced*1000:9.2f} ms   {(traced / untraced - 1)*100:+6.1f}%")
+
+
+if __name__ == "__main__":
+    main()
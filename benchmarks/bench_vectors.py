@@ -0,0 +1,33 @@
+import time
+from benchmarks.bench_engines import NullScreen
+from engines import ENGINES
+from parser import parse
+from scope import Scope
+from vectors import numpy
+
+
+def run(name: str, engine: str, code: str) -> float:
+    ast = parse(code)
+    start = time.perf_counter()
+    result = ENGINES[engine](ast, Scope(), NullScreen())
+    elapsed = time.perf_counter() - start
+    print(f"{name:<36} {engine:<8} {elapsed*1000:9.2f} ms   {result}")
+    return elapsed
+
+
+def main():
+    if numpy is None:
+        print("NumPy is not installed")
+        return
+
+    for count in [10_000, 100_000, 1_000_000]:
+        numbers = " ".join(map(str, range(count)))
+        for engine in ["tree", "vm"]:
+            scalar = run(f"(+ ...), {count}", engine, f"(+ {numbers})")
+            run(f"(list->vector (list ...)), {count}", engine, f"(vector-sum (list->vector (list {numbers})))")
+            vectorized = run(f"(vector-range 0 n), {count}", engine, f"(vector-sum (vector-range 0 {count}))")
+            print(f"{'':<36} {'':<8} {scalar / vectorized:9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
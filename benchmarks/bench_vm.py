@@ -0,0 +1,31 @@
+import time
+from benchmarks.bench_engines import NullScreen, make_call_heavy_program
+from interpreter import eval
+from parser import parse
+from scope import Scope
+from vm import compile_program, run
+
+
+def main():
+    ast = parse(make_call_heavy_program(9))
+
+    start = time.perf_counter()
+    program = compile_program(ast)
+    compile_time = time.perf_counter() - start
+    size = program.code.itemsize * (len(program.code) + sum(len(f.code.code) for f in program.functions))
+    print(f"compile    {compile_time*1000:9.2f} ms   {size} bytes of bytecode")
+
+    start = time.perf_counter()
+    result = eval(ast, Scope(), NullScreen())
+    tree_time = time.perf_counter() - start
+    print(f"tree       {tree_time*1000:9.2f} ms   result {result}")
+
+    start = time.perf_counter()
+    result = run(program, Scope(), NullScreen())
+    vm_time = time.perf_counter() - start
+    print(f"vm         {vm_time*1000:9.2f} ms   result {result}")
+    print(f"vm speedup over tree: {tree_time / vm_time:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import argparse
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+from typing import Any, Callable
+from benchmarks.bench_engines import NullScreen
+from benchmarks.workloads import WORKLOADS
+from engines import ENGINES, evaluate
+from lisptypes import LispValue
+from parser import parse
+from scope import Scope, bind_to_static_scope
+
+
+def measure(run: Callable[[], Any], repeat: int) -> dict[str, float]:
+    """Best time of `repeat` runs, then the peak memory of one more run under tracemalloc"""
+    timings: list[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": min(timings), "peak_bytes": peak}
+
+
+def run_workload(code: str, engine: str, repeat: int) -> dict[str, Any]:
+    ast: list[LispValue] = parse(code)
+    bound = bind_to_static_scope(ast, Scope())
+    return {
+        "source_bytes": len(code.encode()),
+        "parse": measure(lambda: parse(code), repeat),
+        "bind_to_static_scope": measure(lambda: bind_to_static_scope(ast, Scope()), repeat),
+        "eval": measure(lambda: evaluate(ast, Scope(), NullScreen(), engine), repeat),
+        "eval_static": measure(lambda: evaluate(bound, Scope(), NullScreen(), engine), repeat),
+    }
+
+
+def current_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict[str, Any], baseline: dict[str, Any]):
+    """Prints the time of every phase relative to `baseline`, above 1 meaning slower"""
+    print(f"\ncompared to {baseline.get('commit') or 'baseline'}:")
+    for workload, phases in results["workloads"].items():
+        old_phases = baseline["workloads"].get(workload)
+        if old_phases is None:
+            continue
+        ratios = [f"{phase} {phases[phase]['seconds'] / old_phases[phase]['seconds']:5.2f}x"
+                  for phase in phases if isinstance(phases[phase], dict) and phase in old_phases]
+        print(f"{workload:<26} " + "   ".join(ratios))
+
+
+def main():
+    arguments = argparse.ArgumentParser(description="Times parse, bind_to_static_scope and eval on synthetic workloads")
+    arguments.add_argument("--scale", type=int, default=1, help="multiplies the size of every workload")
+    arguments.add_argument("--repeat", type=int, default=3, help="runs per phase, the best one is kept")
+    arguments.add_argument("--engine", default="tree", choices=list(ENGINES))
+    arguments.add_argument("--only", action="append", choices=list(WORKLOADS), help="workloads to run, all by default")
+    arguments.add_argument("--output", help="file to save the results to, as JSON")
+    arguments.add_argument("--compare", help="results saved by an earlier run, to compare against")
+    options = arguments.parse_args()
+
+    results: dict[str, Any] = {
+        "commit": current_commit(),
+        "python": platform.python_version(),
+        "engine": options.engine,
+        "scale": options.scale,
+        "workloads": {},
+    }
+    print(f"{'workload':<26} {'phase':<22} {'ms':>10} {'peak KiB':>10}")
+    for workload in options.only or WORKLOADS:
+        phases = run_workload(WORKLOADS[workload](options.scale), options.engine, options.repeat)
+        results["workloads"][workload] = phases
+        for phase, measured in phases.items():
+            if isinstance(measured, dict):
+                print(f"{workload:<26} {phase:<22} {measured['seconds']*1000:10.2f} {measured['peak_bytes'] / 1024:10.0f}")
+
+    if options.output is not None:
+        with open(options.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if options.compare is not None:
+        with open(options.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
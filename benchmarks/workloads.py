@@ -0,0 +1,55 @@
+"""Synthetic programs for the benchmark suite, each generator scaled by a size parameter"""
+
+from typing import Callable
+
+# Nesting the tree-walker can evaluate without hitting Python's recursion limit
+SAFE_DEPTH = 100
+
+
+def nested_arithmetic(forms: int, depth: int = SAFE_DEPTH) -> str:
+    """`forms` expressions nested `depth` levels deep"""
+    form = "(+ 1 (* 1 " * (depth // 2) + "0" + "))" * (depth // 2) + "\n"
+    return form * forms
+
+
+def long_list(items: int) -> str:
+    """One `list` application with `items` arguments, then a list built one `cons` at a time"""
+    code = "(let numbers (list " + " ".join(str(i) for i in range(items)) + "))\n"
+    code += "(let chain ())\n"
+    code += "".join(f"(= chain (cons {i} chain))\n" for i in range(items))
+    return code + "(cons numbers chain)\n"
+
+
+def many_defuns(count: int) -> str:
+    """`count` small functions, each called once"""
+    code = "".join(f"(defun f{i} (a b) (+ (* a {i}) b))\n" for i in range(count))
+    return code + "".join(f"(f{i} {i} 1)\n" for i in range(count))
+
+
+def dynamic_scope_chain(repeat: int, depth: int = SAFE_DEPTH // 5) -> str:
+    """`example.lisp` scaled up: a chain of `depth` functions, each shadowing the variables the last
+    one reads and updates, run `repeat` times"""
+    code = "(let x 8)\n(let y 8)\n(defun step0 () (= x (- x 1)) (= y (+ y x)) y)\n"
+    for i in range(1, depth):
+        code += f"(defun step{i} () (let x {i}) (let y (+ x 1)) (step{i - 1}) (= x (+ x y)))\n"
+    return code + f"(step{depth - 1})\n" * repeat
+
+
+def large_source(size: int) -> str:
+    """About `size` characters of varied top-level forms, for the parser"""
+    lines = [
+        "(let some_variable_name (+ 12345 -678 (* counter 9)))\n",
+        "(defun helper (first second) (list first (cons second ())))\n",
+        "(print (helper (/ 100 7) (- 3 some_variable_name)))\n",
+    ]
+    block = "".join(lines)
+    return "(let counter 3)\n" + block * (size // len(block))
+
+
+WORKLOADS: dict[str, Callable[[int], str]] = {
+    "nested arithmetic": lambda scale: nested_arithmetic(200 * scale),
+    "long list and cons chain": lambda scale: long_list(5_000 * scale),
+    "many defuns": lambda scale: many_defuns(2_000 * scale),
+    "dynamic scope chain": lambda scale: dynamic_scope_chain(300 * scale),
+    "large source": lambda scale: large_source(500_000 * scale),
+}
@@ -0,0 +1,200 @@
+import argparse
+import importlib
+import io
+import sys
+import time
+from typing import Callable, NamedTuple
+from astcache import ASTCache
+from engines import ENGINES, evaluate
+from interpreter import Interpreter
+from lisptypes import LispValue
+from parser import parse, parse_stream
+from scope import Scope, bind_to_static_scope
+from screen import BufferScreen, Screen
+from tracing import StepTracer
+
+try:
+    # Gives `input` line editing and history
+    importlib.import_module("readline")
+except ImportError:
+    pass
+
+HELP = """Enter Lisp forms, they are evaluated as soon as their parentheses are balanced.
+Commands:
+  :time   report the parse and eval time of every form, or stop reporting it
+  :scope  show the symbols defined so far
+  :help   show this help
+  :quit   leave, like end of input"""
+
+
+class FormResult(NamedTuple):
+    value: LispValue
+    parse_seconds: float
+    eval_seconds: float
+
+
+class Session():
+    """A live interpreter session: every input is evaluated in the same `scope`, so what earlier inputs
+    defined is there without parsing or evaluating them again.
+
+    With `static`, inputs are bound to static scope with a single `binding_scope`, which keeps the
+    variables of earlier inputs and numbers new ones after all of theirs"""
+
+    def __init__(self, engine: str = "tree", static: bool = False, screen: Screen | None = None) -> None:
+        if engine not in ENGINES:
+            raise Exception(
+                f"unknown engine {engine}, available engines are: {', '.join(ENGINES)}")
+        self.engine = engine
+        self.static = static
+        self.screen = screen if screen is not None else Screen()
+        self.scope = Scope()
+        self.binding_scope = Scope()
+
+    def run(self, code: str) -> list[FormResult]:
+        """Parses and evaluates the forms of `code` one by one. When one fails, the blocks it left open
+        are ended, its static renames forgotten and the error raised, the forms before it keep their effects"""
+        results: list[FormResult] = []
+        forms = parse_stream(io.StringIO(code))
+        while True:
+            start = time.perf_counter()
+            form = next(forms, None)
+            if form is None:
+                return results
+            ast = [form]
+            depth, renamed = len(self.scope.names), self.binding_scope.mark()
+            try:
+                if self.static:
+                    ast = bind_to_static_scope(ast, self.binding_scope)
+                parsed = time.perf_counter()
+                value = evaluate(ast, self.scope, self.screen, self.engine)
+            except BaseException:
+                while len(self.scope.names) > depth:
+                    self.scope.end_block()
+                # Global variables renamed by the failed form, later forms would read them under names
+                # that may never have been bound
+                self.binding_scope.rollback(renamed)
+                raise
+            results.append(FormResult(value, parsed - start, time.perf_counter() - parsed))
+
+
+def is_complete(code: str) -> bool:
+    """Whether every list opened in `code` was closed. The language has no strings or comments, so
+    counting parentheses is enough"""
+    return code.count("(") <= code.count(")")
+
+
+def repl(session: Session, timing: bool = False, read: Callable[[str], str] = input,
+         write: Callable[[str], None] = print) -> None:
+    """Reads inputs with `read` until its end (EOFError) or `:quit`, writing values and errors with `write`.
+    With `timing`, the parse and eval time of every form is written after its value"""
+    while True:
+        try:
+            code = read("> ")
+            while not is_complete(code):
+                code += "\n" + read("... ")
+        except EOFError:
+            return
+        except KeyboardInterrupt:
+            write("")
+            continue
+
+        command = code.strip()
+        if command == ":quit":
+            return
+        if command == ":help":
+            write(HELP)
+            continue
+        if command == ":time":
+            timing = not timing
+            write(f"timing {'on' if timing else 'off'}")
+            continue
+        if command == ":scope":
+            write(str(session.scope))
+            continue
+        if command.startswith(":"):
+            write(f"unknown command {command}, see :help")
+            continue
+
+        try:
+            for result in session.run(code):
+                write(str(result.value))
+                if timing:
+                    write(f"  parse {result.parse_seconds*1000:.3f} ms, eval {result.eval_seconds*1000:.3f} ms")
+        except KeyboardInterrupt:
+            write("interrupted")
+        except Exception as error:
+            write(f"error: {error}")
+        finally:
+            session.screen.flush()
+
+
+def run_file(path: str, engine: str, static: bool, timing: bool, trace: bool, cache: str | None) -> LispValue:
+    """Runs the program at `path`, reporting how long each phase took on standard error when `timing`"""
+    times: list[tuple[str, float]] = []
+    start = time.perf_counter()
+    if cache is not None:
+        ast = ASTCache(cache).parse_file(path, static)
+        times.append(("load" if not static else "load and bind", time.perf_counter() - start))
+    else:
+        with open(path) as f:
+            ast = parse(f.read(), path)
+        times.append(("parse", time.perf_counter() - start))
+        if static:
+            start = time.perf_counter()
+            ast = bind_to_static_scope(ast, Scope())
+            times.append(("bind", time.perf_counter() - start))
+
+    start = time.perf_counter()
+    if trace:
+        # The stepper shows the output next to the program, so it is only written once the program ends
+        screen = BufferScreen()
+        try:
+            value = Interpreter(StepTracer(screen)).eval(ast, Scope(), screen)
+        finally:
+            sys.stdout.write(screen.get_contents())
+    else:
+        screen = Screen()
+        try:
+            value = evaluate(ast, Scope(), screen, engine)
+        finally:
+            screen.flush()
+    times.append(("eval", time.perf_counter() - start))
+
+    if timing:
+        for phase, seconds in times:
+            print(f"{phase:<14} {seconds*1000:10.3f} ms", file=sys.stderr)
+    return value
+
+
+def main(argv: list[str] | None = None) -> int:
+    arguments = argparse.ArgumentParser(description="Runs a Lisp program, or starts a REPL without one")
+    arguments.add_argument("program", nargs="?", help="the .lisp file to run")
+    arguments.add_argument("--static", action="store_true", help="use static scope instead of dynamic scope")
+    arguments.add_argument("--engine", default="tree", choices=list(ENGINES))
+    arguments.add_argument("--time", action="store_true",
+                           help="report how long parsing and evaluation took on standard error")
+    arguments.add_argument("--trace", action="store_true",
+                           help="step through the program, waiting for enter before every function application")
+    arguments.add_argument("--cache", help="directory to cache the parsed program in, see astcache")
+    options = arguments.parse_args(argv)
+
+    if options.program is None:
+        if options.trace or options.cache is not None:
+            arguments.error("--trace and --cache need a program")
+        print("Lisp REPL, :help for commands")
+        session = Session(options.engine, options.static)
+        repl(session, options.time)
+        return 0
+
+    if options.trace and options.engine != "tree":
+        arguments.error("--trace only works with the tree engine")
+    try:
+        run_file(options.program, options.engine, options.static, options.time, options.trace, options.cache)
+    except Exception as error:
+        print(f"error: {error}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,363 @@
+from typing import Callable, cast
+from lisptypes import LispAddress, LispEmptyList, LispFunction, LispList, LispNonEmptyList, LispNumber, LispSymbol, LispValue
+from primitives import ARITHMETIC, ARITHMETIC_OPERATIONS, arity_error, cons, divide, number_operand
+from scope import Frame, Scope, SymbolType, frame_size, is_lexically_addressed
+from screen import Screen
+from source import Span, located
+from vectors import VECTOR_BUILTINS
+
+# A compiled expression: evaluates one AST node against a scope, printing to a screen
+Closure = Callable[[Scope, Screen], LispValue]
+
+
+class CompiledFunction(LispValue):
+    """What `defun` binds in the scope when running compiled code: the parameters and the body
+    closure, compiled once together with the rest of the program.
+
+    Functions with lexically addressed parameters run in a `Frame` of `frame_size` slots, whose parent
+    is `frame`, the frame the function was defined in"""
+    __slots__ = ("definition", "params", "arity", "body", "frame_size", "frame")
+
+    def __init__(self, definition: LispList, params: tuple[LispSymbol | LispAddress, ...], body: Closure,
+                 frame_size: int | None = None) -> None:
+        super().__init__()
+        self.definition = definition
+        self.params = params
+        self.arity = len(params)
+        self.body = body
+        self.frame_size = frame_size
+        self.frame: Frame | None = None
+
+    def bind(self, frame: Frame) -> 'CompiledFunction':
+        """The same function, closing over `frame`"""
+        function = CompiledFunction(self.definition, self.params, self.body, self.frame_size)
+        function.frame = frame
+        return function
+
+    def __str__(self) -> str:
+        return str(self.definition)
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+def eval_compiled(ast: list[LispValue], scope: Scope, screen: Screen) -> LispValue:
+    return compile_program(ast)(scope, screen)
+
+
+def compile_program(ast: list[LispValue]) -> Closure:
+    if len(ast) == 0:
+        raise Exception("can't evaluate an empty program")
+    body = compile_body(ast)
+
+    size = frame_size(ast)
+    if size == 0:
+        return body
+
+    def run_program(scope: Scope, screen: Screen) -> LispValue:
+        # Lexically addressed globals live in the outermost frame
+        missing = size - len(scope.frame.values)
+        if missing > 0:
+            scope.frame.values.extend([None] * missing)
+        return body(scope, screen)
+    return run_program
+
+
+def compile_body(body: list[LispValue]) -> Closure:
+    closures = tuple(compile_expression(expr) for expr in body)
+    if len(closures) == 1:
+        return closures[0]
+
+    def run_body(scope: Scope, screen: Screen) -> LispValue:
+        last_value: LispValue = LispEmptyList()
+        for closure in closures:
+            last_value = closure(scope, screen)
+        return last_value
+    return run_body
+
+
+def compile_expression(expr: LispValue) -> Closure:
+    if isinstance(expr, (LispNumber, LispEmptyList)):
+        return lambda scope, screen: expr  # Numbers and the empty list eval to themselves
+
+    if isinstance(expr, LispSymbol):
+        def read_symbol(scope: Scope, screen: Screen) -> LispValue:
+            value = scope.read_symbol(expr)
+            if value is None:
+                raise Exception(f"unknown symbol {expr}")
+            return value
+        return read_symbol
+
+    if isinstance(expr, LispAddress):
+        return compile_address(expr)
+
+    if isinstance(expr, LispNonEmptyList):
+        if not isinstance(expr.first, LispSymbol):
+            return raising(located(Exception(
+                f"can't perform function application using '{expr.first}' as a function"), expr.span))
+
+        closure = compile_function_application(expr.first, expr.rest.to_python_list())
+        if expr.span is None:
+            return closure
+        return with_location(closure, expr.span)
+
+    raise Exception(f"unexpected value {expr}")
+
+
+def compile_address(address: LispAddress) -> Closure:
+    index = address.index
+    level = -1 - address.depth
+
+    def read_address(scope: Scope, screen: Screen) -> LispValue:
+        value = scope.frame.display[level][index]
+        if value is None:
+            raise Exception(f"unknown symbol {address}")
+        return value
+
+    def read_local(scope: Scope, screen: Screen) -> LispValue:
+        value = scope.frame.values[index]
+        if value is None:
+            raise Exception(f"unknown symbol {address}")
+        return value
+
+    return read_local if address.depth == 0 else read_address
+
+
+def with_location(closure: Closure, span: Span) -> Closure:
+    """Errors raised by `closure` are reported at `span`, unless a nested expression already did"""
+    def located_closure(scope: Scope, screen: Screen) -> LispValue:
+        try:
+            return closure(scope, screen)
+        except Exception as error:
+            raise located(error, span)
+    return located_closure
+
+
+def raising(exception: Exception) -> Closure:
+    """Errors found while compiling are only raised if the faulty expression is evaluated"""
+    def raise_exception(scope: Scope, screen: Screen) -> LispValue:
+        raise exception
+    return raise_exception
+
+
+def compile_function_application(name: LispSymbol, args: list[LispValue]) -> Closure:
+    match name.symbolName:
+        case "+" | "-" | "*":
+            return compile_arithmetic(name.symbolName, args)
+
+        case "/":
+            if len(args) != 2:
+                return raising(arity_error("division", "two", args))
+            dividend, divisor = compile_expression(args[0]), compile_expression(args[1])
+            return lambda scope, screen: divide(dividend(scope, screen), divisor(scope, screen))
+
+        case "defun":
+            return compile_defun(args)
+
+        case "let" | "=":
+            form = name.symbolName
+            if len(args) != 2:
+                return raising(arity_error(form, "two", args))
+            symbol = args[0]
+            value = compile_expression(args[1])
+            if isinstance(symbol, LispAddress):
+                return compile_address_attribution(form, symbol, value)
+            if not isinstance(symbol, LispSymbol):
+                return raising(Exception(
+                    f"can't perform attribution using '{symbol}' as a variable"))
+
+            if form == "let":
+                def let(scope: Scope, screen: Screen) -> LispValue:
+                    result = value(scope, screen)
+                    scope.create_symbol(symbol, result, SymbolType.VARIABLE)
+                    return result
+                return let
+
+            def assign(scope: Scope, screen: Screen) -> LispValue:
+                result = value(scope, screen)
+                scope.set_symbol(symbol, result, SymbolType.VARIABLE)
+                return result
+            return assign
+
+        case "cons":
+            if len(args) != 2:
+                return raising(arity_error("cons", "two", args))
+            first, rest = compile_expression(args[0]), compile_expression(args[1])
+            return lambda scope, screen: cons(first(scope, screen), rest(scope, screen))
+
+        case "list":
+            items = tuple(compile_expression(arg) for arg in args)
+            return lambda scope, screen: LispList.from_list([item(scope, screen) for item in items])
+
+        case "print":
+            # Like in the tree-walker, lines are written together unless an argument may print too
+            printed = tuple((compile_expression(arg), isinstance(arg, LispNonEmptyList)) for arg in args)
+
+            def print_values(scope: Scope, screen: Screen) -> LispValue:
+                lines: list[str] = []
+                try:
+                    for value, may_print in printed:
+                        if lines and may_print:
+                            screen.print_lines(lines)
+                            lines = []
+                        lines.append(str(value(scope, screen)))
+                finally:
+                    if lines:
+                        screen.print_lines(lines)
+                return LispEmptyList()
+            return print_values
+
+        case builtin if builtin in VECTOR_BUILTINS:
+            function = VECTOR_BUILTINS[builtin]
+            operands = tuple(compile_expression(arg) for arg in args)
+            return lambda scope, screen: function([operand(scope, screen) for operand in operands])
+
+        case _:
+            return compile_call(name, args)
+
+
+def compile_address_attribution(form: str, address: LispAddress, value: Closure) -> Closure:
+    if form == "let":
+        # Declarations always live in the current frame
+        index = address.index
+
+        def let(scope: Scope, screen: Screen) -> LispValue:
+            result = value(scope, screen)
+            scope.frame.values[index] = result
+            return result
+        return let
+
+    def assign(scope: Scope, screen: Screen) -> LispValue:
+        result = value(scope, screen)
+        if scope.frame.lookup(address) is None:
+            raise Exception(f"unknown symbol {address}")
+        scope.frame.assign(address, result)
+        return result
+    return assign
+
+
+def compile_arithmetic(operator: str, args: list[LispValue]) -> Closure:
+    operation = ARITHMETIC_OPERATIONS[operator]
+    combine = ARITHMETIC[operator]
+    operands = tuple(compile_expression(arg) for arg in args)
+
+    if len(operands) == 2:
+        left, right = operands
+        match operator:
+            case "+":
+                return lambda scope, screen: LispNumber(
+                    number_operand(operation, left(scope, screen)) + number_operand(operation, right(scope, screen)))
+            case "-":
+                return lambda scope, screen: LispNumber(
+                    number_operand(operation, left(scope, screen)) - number_operand(operation, right(scope, screen)))
+            case _:
+                return lambda scope, screen: LispNumber(
+                    number_operand(operation, left(scope, screen)) * number_operand(operation, right(scope, screen)))
+
+    return lambda scope, screen: combine([number_operand(operation, operand(scope, screen)) for operand in operands])
+
+
+def compile_defun(args: list[LispValue]) -> Closure:
+    # Not dealing with duplicated function names
+    if len(args) < 3:
+        return raising(Exception(
+            f"function definition expects at least three arguments (foo_name, arguments, body), given {args}"))
+
+    [foo_name, *foo_body] = args
+    if not isinstance(foo_name, LispSymbol):
+        return raising(Exception(
+            f"function name must be a symbol, given {foo_name}"))
+
+    try:
+        function = compile_function(foo_name, LispList.from_list(foo_body))
+    except Exception as error:
+        # Malformed definitions fail when they are evaluated, like in the tree-walker
+        return raising(error)
+
+    if function.frame_size is not None:
+        def defun_closure(scope: Scope, screen: Screen) -> LispValue:
+            scope.create_symbol(foo_name, function.bind(scope.frame), SymbolType.FUNCTION)
+            return LispEmptyList()
+        return defun_closure
+
+    def defun(scope: Scope, screen: Screen) -> LispValue:
+        scope.create_symbol(foo_name, function, SymbolType.FUNCTION)
+        return LispEmptyList()
+    return defun
+
+
+def compile_function(name: LispSymbol, definition: LispList) -> CompiledFunction:
+    """Compiles a function definition `((parameter-list) body...)`, as stored by `defun`, raising if it
+    is malformed"""
+    foo_args, *foo_body = definition.to_python_list()
+    if not isinstance(foo_args, LispList):
+        raise Exception(
+            f"Bad definition of function {name}, the syntax for defun is: (defun name (parameter-list) body)")
+
+    params: list[LispSymbol | LispAddress] = []
+    for arg in foo_args.to_python_list():
+        if not isinstance(arg, (LispSymbol, LispAddress)):
+            raise Exception(
+                f"Bad argument {arg} from function {name}, all arguments must be symbols")
+        params.append(arg)
+
+    size = None
+    if is_lexically_addressed([foo_args] + foo_body):
+        size = frame_size([foo_args] + foo_body)
+    return CompiledFunction(definition, tuple(params), compile_body(foo_body), size)
+
+
+def compile_call(name: LispSymbol, args: list[LispValue]) -> Closure:
+    block_name = name.symbolName
+    given_args = tuple(compile_expression(arg) for arg in args)
+    given_count = len(given_args)
+    # Functions defined by the tree-walker are compiled on their first call
+    compiled_definitions: dict[int, tuple[LispFunction, CompiledFunction]] = {}
+
+    def call(scope: Scope, screen: Screen) -> LispValue:
+        foo = scope.read_symbol(name)
+        scope.begin_block(block_name)
+
+        if isinstance(foo, CompiledFunction):
+            function = foo
+        elif isinstance(foo, LispFunction):
+            cached = compiled_definitions.get(id(foo))
+            if cached is None or cached[0] is not foo:
+                cached = (foo, compile_function(name, foo.definition))
+                compiled_definitions[id(foo)] = cached
+            function = cached[1]
+        else:
+            raise Exception(
+                f"Function {name} not defined")
+
+        # Check if user passed the needed number of parameters
+        if function.arity != given_count:
+            raise Exception(
+                f"{name} expects {function.arity} arguments, were given {given_count}")
+
+        if function.frame_size is not None:
+            # Lexically addressed parameters take the first slots of the new frame
+            values: list[LispValue | None] = [arg(scope, screen) for arg in given_args]
+            if function.frame_size > given_count:
+                values.extend([None] * (function.frame_size - given_count))
+            frame = Frame(values, function.frame)
+            caller = scope.frame
+            scope.frame = frame
+            try:
+                result = function.body(scope, screen)
+            finally:
+                # Whatever runs after an error still reads the caller's frame
+                scope.frame = caller
+            scope.end_block()
+            return result
+
+        # Each argument is bound as soon as it is evaluated, so later arguments already see it
+        for param, arg in zip(function.params, given_args):
+            # Parameters are only addresses in lexically addressed functions
+            scope.create_symbol(cast(LispSymbol, param), arg(scope, screen), SymbolType.VARIABLE)
+
+        result = function.body(scope, screen)
+        scope.end_block()
+        return result
+
+    return call
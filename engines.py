@@ -0,0 +1,26 @@
+from typing import Callable
+from compiler import eval_compiled
+from interpreter import eval
+from lisptypes import LispValue
+from scope import Scope
+from screen import Screen
+from stackeval import eval_stack
+from vm import eval_vm
+
+Engine = Callable[[list[LispValue], Scope, Screen], LispValue]
+
+# Every engine runs a parsed (and optionally statically bound) program with the same semantics. Programs
+# after `scope.resolve_lexical_addresses` only run on "closure", the others reject them
+ENGINES: dict[str, Engine] = {
+    "tree": eval,
+    "closure": eval_compiled,
+    "stack": eval_stack,
+    "vm": eval_vm,
+}
+
+
+def evaluate(ast: list[LispValue], scope: Scope, screen: Screen, engine: str = "tree") -> LispValue:
+    if engine not in ENGINES:
+        raise Exception(
+            f"unknown engine {engine}, available engines are: {', '.join(ENGINES)}")
+    return ENGINES[engine](ast, scope, screen)
@@ -0,0 +1,192 @@
+from typing import Any, Iterator, Sequence, overload
+from hamt import HAMT
+from lisptypes import LispSymbol, LispValue
+from scope import Frame, Scope, SymbolType
+
+# A binding, one link of the stack of live bindings of a name: (value, symbol type, the binding it shadows)
+Binding = tuple[LispValue, SymbolType, Any]
+
+
+class Environment():
+    """An immutable dynamic scope. Every change returns a new environment sharing all it can with
+    this one, so keeping an environment around is a snapshot of the scope.
+
+    Like `Scope`, it uses shallow binding: `bindings` maps every name to the stack of its live
+    bindings, as a persistent `HAMT` of linked `Binding`s. `blocks` is a linked stack of
+    (name, names of the bindings the block created, enclosing blocks)"""
+    __slots__ = ("bindings", "blocks", "depth")
+
+    def __init__(self, bindings: HAMT = HAMT(), blocks: tuple[Any, ...] = ("global", None, None), depth: int = 1) -> None:
+        self.bindings = bindings
+        self.blocks = blocks
+        # Number of blocks, the global one included
+        self.depth = depth
+
+    def read(self, symbol: LispSymbol) -> LispValue | None:
+        binding = self.bindings.get(symbol.symbolName)
+        return None if binding is None else binding[0]
+
+    def create(self, symbol: LispSymbol, value: LispValue, symbol_type: SymbolType) -> 'Environment':
+        name = symbol.symbolName
+        block_name, created, enclosing = self.blocks
+        return Environment(self.bindings.set(name, (value, symbol_type, self.bindings.get(name))),
+                           (block_name, (name, created), enclosing), self.depth)
+
+    def set(self, symbol: LispSymbol, value: LispValue, symbol_type: SymbolType) -> 'Environment':
+        name = symbol.symbolName
+        binding = self.bindings.get(name)
+        if binding is None:
+            raise Exception(f"unknown symbol {symbol}")
+        return Environment(self.bindings.set(name, (value, symbol_type, binding[2])), self.blocks, self.depth)
+
+    def begin(self, block_name: str) -> 'Environment':
+        return Environment(self.bindings, (block_name, None, self.blocks), self.depth + 1)
+
+    def end(self) -> 'Environment':
+        _, created, enclosing = self.blocks
+        bindings = self.bindings
+        while created is not None:
+            name, created = created
+            shadowed = bindings.get(name)[2]
+            bindings = bindings.delete(name) if shadowed is None else bindings.set(name, shadowed)
+        return Environment(bindings, enclosing, self.depth - 1)
+
+    def mark(self) -> tuple[int, Any]:
+        """The depth and the global bindings of this environment, see `rollback`"""
+        blocks = self.blocks
+        while blocks[2] is not None:
+            blocks = blocks[2]
+        return self.depth, blocks[1]
+
+    def rollback(self, mark: tuple[int, Any]) -> 'Environment':
+        """This environment without the blocks begun and the global bindings created since `mark`, like
+        `Scope.rollback`"""
+        depth, kept = mark
+        environment = self
+        while environment.depth > depth:
+            environment = environment.end()
+        block_name, created, _ = environment.blocks
+        bindings = environment.bindings
+        while created is not kept:
+            name, created = created
+            shadowed = bindings.get(name)[2]
+            bindings = bindings.delete(name) if shadowed is None else bindings.set(name, shadowed)
+        return Environment(bindings, (block_name, kept, None), depth)
+
+    def block_names(self) -> 'BlockNames':
+        """Names of the blocks, outermost first"""
+        return BlockNames(self)
+
+    def __str__(self) -> str:
+        """The blocks and their bindings, formatted like `Scope.__str__`"""
+        blocks: list[list[str]] = []
+        node = self.blocks
+        while node is not None:
+            names: list[str] = []
+            created = node[1]
+            while created is not None:
+                names.append(created[0])
+                created = created[1]
+            names.reverse()
+            blocks.append(names)
+            node = node[2]
+        blocks.reverse()
+
+        # The bindings of a name were created block after block, so they are matched in the same order
+        stacks: dict[str, list[Binding]] = {}
+        result = ""
+        for names in blocks:
+            for name in names:
+                if name not in stacks:
+                    stack: list[Binding] = []
+                    binding = self.bindings.get(name)
+                    while binding is not None:
+                        stack.append(binding)
+                        binding = binding[2]
+                    stacks[name] = stack
+                value, symbol_type, _ = stacks[name].pop()
+                result += f"{name}" + (f" = {value}" if symbol_type ==
+                                       SymbolType.VARIABLE else "()") + "\n"
+            result += "-----------------------------\n"
+        return result.removesuffix("-----------------------------\n")
+
+
+class BlockNames(Sequence[str]):
+    """The names of the blocks of an `Environment`, outermost first. They are read from its blocks,
+    so the names of any version of a scope come with it at no cost"""
+    __slots__ = ("environment",)
+
+    def __init__(self, environment: Environment) -> None:
+        self.environment = environment
+
+    def __len__(self) -> int:
+        return self.environment.depth
+
+    def __iter__(self) -> Iterator[str]:
+        names: list[str] = []
+        blocks = self.environment.blocks
+        while blocks is not None:
+            names.append(blocks[0])
+            blocks = blocks[2]
+        return reversed(names)
+
+    @overload
+    def __getitem__(self, index: int) -> str: ...
+    @overload
+    def __getitem__(self, index: slice) -> list[str]: ...
+
+    def __getitem__(self, index: int | slice) -> str | list[str]:
+        return list(self)[index]
+
+    def __str__(self) -> str:
+        return str(list(self))
+
+
+class PersistentScope(Scope):
+    """A `Scope` keeping its state in an `Environment`, so any engine can run on it. `snapshot` takes
+    O(1) time and memory, and so does `restore`: `names` are read from the environment too. Versions
+    of the scope only differ in the bindings that changed between them. Reading a symbol walks the
+    trie, which makes lookups 4-7 times slower than with `Scope` (see `benchmarks/bench_environment.py`),
+    so only use it when snapshots are needed.
+
+    Snapshots hold the bindings and blocks. The frames of lexically addressed programs, see
+    `resolve_lexical_addresses`, are mutable and not part of them"""
+
+    def __init__(self, environment: Environment | None = None) -> None:
+        self.environment = environment if environment is not None else Environment()
+        self.frame = Frame([], None)
+
+    def snapshot(self) -> Environment:
+        return self.environment
+
+    def restore(self, snapshot: Environment) -> None:
+        self.environment = snapshot
+
+    @property
+    def names(self) -> Sequence[str]:
+        return self.environment.block_names()
+
+    def read_symbol(self, symbol: LispSymbol) -> LispValue | None:
+        binding = self.environment.bindings.get(symbol.symbolName)
+        return None if binding is None else binding[0]
+
+    def create_symbol(self, symbol: LispSymbol, value: LispValue, symbol_type: SymbolType):
+        self.environment = self.environment.create(symbol, value, symbol_type)
+
+    def set_symbol(self, symbol: LispSymbol, value: LispValue, symbol_type: SymbolType):
+        self.environment = self.environment.set(symbol, value, symbol_type)
+
+    def begin_block(self, block_name: str) -> None:
+        self.environment = self.environment.begin(block_name)
+
+    def end_block(self) -> None:
+        self.environment = self.environment.end()
+
+    def mark(self) -> Any:
+        return self.environment.mark()
+
+    def rollback(self, mark: Any) -> None:
+        self.environment = self.environment.rollback(mark)
+
+    def __str__(self) -> str:
+        return str(self.environment)
@@ -0,0 +1,178 @@
+from typing import Any, Iterator
+
+# A hash array mapped trie: a persistent map whose versions share every node they have in common.
+# Each level of the trie consumes `BITS` bits of the hash of a key. A node only stores the children
+# it has, in a tuple indexed by the popcount of its bitmap below the child's bit. Updating a key
+# copies the nodes on the path to it, at most `HASH_BITS / BITS` of them, and nothing else. Deleting a
+# key folds the nodes left with a single entry back into their parent, so a map doesn't keep the shape
+# of the keys it once held.
+#
+# Entries are `(key, value)` tuples, or nodes for the keys sharing a prefix of their hash. Keys whose
+# whole hash collides end up together in a `CollisionNode`.
+BITS = 5
+MASK = (1 << BITS) - 1
+HASH_BITS = 64
+HASH_MASK = (1 << HASH_BITS) - 1
+
+
+class BitmapNode():
+    __slots__ = ("bitmap", "entries")
+
+    def __init__(self, bitmap: int, entries: tuple[Any, ...]) -> None:
+        self.bitmap = bitmap
+        self.entries = entries
+
+
+class CollisionNode():
+    __slots__ = ("entries",)
+
+    def __init__(self, entries: tuple[tuple[Any, Any], ...]) -> None:
+        self.entries = entries
+
+
+EMPTY_NODE = BitmapNode(0, ())
+
+# What a `BitmapNode` holds for each of its bits
+Entry = tuple[Any, Any] | BitmapNode | CollisionNode
+
+
+class HAMT():
+    """An immutable map: `set` and `delete` return a new map, leaving this one as it was"""
+    __slots__ = ("root", "count")
+
+    def __init__(self, root: BitmapNode = EMPTY_NODE, count: int = 0) -> None:
+        self.root = root
+        self.count = count
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        hash_code = hash(key) & HASH_MASK
+        node: Any = self.root
+        shift = 0
+        while True:
+            if type(node) is CollisionNode:
+                for entry in node.entries:
+                    if entry[0] == key:
+                        return entry[1]
+                return default
+
+            bit = 1 << ((hash_code >> shift) & MASK)
+            if not node.bitmap & bit:
+                return default
+            entry: Entry = node.entries[(node.bitmap & (bit - 1)).bit_count()]
+            if type(entry) is tuple:
+                return entry[1] if entry[0] == key else default
+            node = entry
+            shift += BITS
+
+    def set(self, key: Any, value: Any) -> 'HAMT':
+        root, added = insert(self.root, 0, hash(key) & HASH_MASK, key, value)
+        if root is self.root:
+            return self
+        return HAMT(root, self.count + added)
+
+    def delete(self, key: Any) -> 'HAMT':
+        root = remove(self.root, 0, hash(key) & HASH_MASK, key)
+        if root is self.root:
+            return self
+        return HAMT(root if root is not None else EMPTY_NODE, self.count - 1)
+
+    def __contains__(self, key: Any) -> bool:
+        missing = object()
+        return self.get(key, missing) is not missing
+
+    def __len__(self) -> int:
+        return self.count
+
+    def items(self) -> Iterator[tuple[Any, Any]]:
+        pending: list[Any] = [self.root]
+        while pending:
+            for entry in pending.pop().entries:
+                if type(entry) is tuple:
+                    yield entry
+                else:
+                    pending.append(entry)
+
+
+def insert(node: Any, shift: int, hash_code: int, key: Any, value: Any) -> tuple[Any, bool]:
+    """`node` with `key` set to `value`, and whether the key is new. The same node if nothing changed"""
+    if type(node) is CollisionNode:
+        for i, entry in enumerate(node.entries):
+            if entry[0] == key:
+                if entry[1] is value:
+                    return node, False
+                return CollisionNode(node.entries[:i] + ((key, value),) + node.entries[i + 1:]), False
+        return CollisionNode(node.entries + ((key, value),)), True
+
+    bit = 1 << ((hash_code >> shift) & MASK)
+    index = (node.bitmap & (bit - 1)).bit_count()
+    entries = node.entries
+    if not node.bitmap & bit:
+        return BitmapNode(node.bitmap | bit, entries[:index] + ((key, value),) + entries[index:]), True
+
+    entry: Entry = entries[index]
+    added = False
+    if type(entry) is tuple:
+        if entry[0] == key:
+            if entry[1] is value:
+                return node, False
+            new_entry: Any = (key, value)
+        else:
+            new_entry = merge(shift + BITS, hash(entry[0]) & HASH_MASK, entry, hash_code, (key, value))
+            added = True
+    else:
+        new_entry, added = insert(entry, shift + BITS, hash_code, key, value)
+        if new_entry is entry:
+            return node, False
+    return BitmapNode(node.bitmap, entries[:index] + (new_entry,) + entries[index + 1:]), added
+
+
+def remove(node: Any, shift: int, hash_code: int, key: Any) -> Any:
+    """`node` without `key`: the same node if the key isn't there, None if nothing is left, and the
+    remaining entry itself if only one is left below the root, for the parent to hold it directly"""
+    if type(node) is CollisionNode:
+        for i, entry in enumerate(node.entries):
+            if entry[0] == key:
+                entries = node.entries[:i] + node.entries[i + 1:]
+                return entries[0] if len(entries) == 1 else CollisionNode(entries)
+        return node
+
+    bit = 1 << ((hash_code >> shift) & MASK)
+    if not node.bitmap & bit:
+        return node
+    index = (node.bitmap & (bit - 1)).bit_count()
+    entries = node.entries
+    entry: Entry = entries[index]
+    if type(entry) is tuple:
+        if entry[0] != key:
+            return node
+        new_entry: Entry | None = None
+    else:
+        new_entry = remove(entry, shift + BITS, hash_code, key)
+        if new_entry is entry:
+            return node
+
+    if new_entry is None:
+        bitmap, entries = node.bitmap & ~bit, entries[:index] + entries[index + 1:]
+        if not bitmap:
+            return None
+        if shift and len(entries) == 1:
+            remaining: Entry = entries[0]
+            if type(remaining) is tuple:
+                return remaining
+        return BitmapNode(bitmap, entries)
+    if shift and len(entries) == 1 and type(new_entry) is tuple:
+        return new_entry
+    return BitmapNode(node.bitmap, entries[:index] + (new_entry,) + entries[index + 1:])
+
+
+def merge(shift: int, first_hash: int, first: tuple[Any, Any], second_hash: int, second: tuple[Any, Any]) -> Any:
+    """The smallest node holding two entries whose hashes agree below `shift`"""
+    if shift >= HASH_BITS:
+        return CollisionNode((first, second))
+    first_index = (first_hash >> shift) & MASK
+    second_index = (second_hash >> shift) & MASK
+    if first_index == second_index:
+        return BitmapNode(1 << first_index, (merge(shift + BITS, first_hash, first, second_hash, second),))
+    if first_index > second_index:
+        first, second = second, first
+    return BitmapNode((1 << first_index) | (1 << second_index), (first, second))
@@ -0,0 +1,98 @@
+from typing import NamedTuple
+from interpreter import Interpreter
+from lisptypes import LispList, LispSymbol, LispValue
+from scope import Scope
+from screen import Screen
+from source import LispError
+from vectors import VECTOR_BUILTINS, allocated_cells
+
+
+# Applications the interpreter evaluates in the caller's block, any other name calls a user function
+BUILTINS = {"+", "-", "*", "/", "defun", "let", "=", "cons", "list", "print"}
+
+
+class Limits(NamedTuple):
+    """Quotas for running untrusted programs, None meaning unlimited.
+    `max_steps` counts function applications, `max_depth` nested blocks of the scope (function calls in
+    progress) and `max_cells` the list cells created by `cons`, `list` and `vector->list` and the vector
+    elements created by the other vector builtins"""
+    max_steps: int | None = None
+    max_depth: int | None = None
+    max_cells: int | None = None
+
+
+class Usage():
+    __slots__ = ("steps", "depth", "cells")
+
+    def __init__(self, steps: int = 0, depth: int = 0, cells: int = 0) -> None:
+        self.steps = steps
+        # Deepest nesting of blocks reached
+        self.depth = depth
+        self.cells = cells
+
+    def copy(self) -> 'Usage':
+        return Usage(self.steps, self.depth, self.cells)
+
+    def __str__(self) -> str:
+        return f"{self.steps} steps, depth {self.depth}, {self.cells} cells"
+
+
+class QuotaExceeded(LispError):
+    """Raised when a program goes over one of its `Limits`, with the resources it used until then"""
+
+    def __init__(self, quota: str, limit: int, usage: Usage) -> None:
+        super().__init__(f"{quota} quota of {limit} exceeded, used {usage}", None)
+        self.quota = quota
+        self.limit = limit
+        self.usage = usage
+
+
+class LimitedInterpreter(Interpreter):
+    """An `Interpreter` enforcing `limits`. Programs without limits should run on a plain `Interpreter`,
+    which does no accounting at all"""
+
+    def __init__(self, limits: Limits) -> None:
+        super().__init__()
+        self.limits = limits
+        self.usage = Usage()
+
+    def eval_function_application(self, name: LispSymbol, arguments: LispList, scope: Scope, screen: Screen) -> LispValue:
+        limits, usage = self.limits, self.usage
+
+        usage.steps += 1
+        if limits.max_steps is not None and usage.steps > limits.max_steps:
+            raise QuotaExceeded("steps", limits.max_steps, usage.copy())
+
+        # The global block doesn't count, a call to a user function is charged for the block it's about to begin
+        depth = len(scope.names) - 1
+        if name.symbolName not in BUILTINS and name.symbolName not in VECTOR_BUILTINS:
+            depth += 1
+        if depth > usage.depth:
+            usage.depth = depth
+            if limits.max_depth is not None and depth > limits.max_depth:
+                raise QuotaExceeded("depth", limits.max_depth, usage.copy())
+
+        # Cells are charged before the arguments are evaluated, so going over the quota allocates nothing
+        if name.symbolName == "cons":
+            usage.cells += 1
+        elif name.symbolName == "list":
+            usage.cells += len(arguments)
+        if limits.max_cells is not None and usage.cells > limits.max_cells:
+            raise QuotaExceeded("cells", limits.max_cells, usage.copy())
+
+        if name.symbolName in VECTOR_BUILTINS:
+            # The sizes of vectors are only known once the arguments are evaluated, they are charged before
+            # the builtin allocates anything
+            values = [self.eval_expression(arg, scope, screen) for arg in arguments]
+            usage.cells += allocated_cells(name.symbolName, values)
+            if limits.max_cells is not None and usage.cells > limits.max_cells:
+                raise QuotaExceeded("cells", limits.max_cells, usage.copy())
+            return VECTOR_BUILTINS[name.symbolName](values)
+
+        return super().eval_function_application(name, arguments, scope, screen)
+
+
+def eval_limited(ast: list[LispValue], scope: Scope, screen: Screen, limits: Limits) -> LispValue:
+    if limits == Limits():
+        return Interpreter().eval(ast, scope, screen)
+    return LimitedInterpreter(limits).eval(ast, scope, screen)
@@ -1,14 +1,46 @@
+import threading
+import weakref
+from typing import Iterator
+from source import Span
+
+
 class LispValue():
-    pass
+    __slots__ = ()
 
 
 class LispSymbol(LispValue):
-    def __init__(self, symbolName: str) -> None:
-        super().__init__()
-        self.symbolName = symbolName
+    """Symbols are interned: `LispSymbol(name)` always returns the same object for the same name,
+    so two symbols are equal only if they are the same object.
+
+    The intern table holds its symbols weakly, so the names nothing uses anymore, like the renames of
+    `bind_to_static_scope` in a long-lived process, are freed"""
+    __slots__ = ("symbolName", "__weakref__")
+
+    symbolName: str
+    interned: 'weakref.WeakValueDictionary[str, LispSymbol]' = weakref.WeakValueDictionary()
+    # Taken to intern a new name, so threads interning the same name at once still share one symbol
+    interning = threading.Lock()
+
+    def __new__(cls, symbolName: str) -> 'LispSymbol':
+        symbol = LispSymbol.interned.get(symbolName)
+        if symbol is None:
+            with LispSymbol.interning:
+                symbol = LispSymbol.interned.get(symbolName)
+                if symbol is None:
+                    symbol = super().__new__(cls)
+                    symbol.symbolName = symbolName
+                    LispSymbol.interned[symbolName] = symbol
+        return symbol
 
     def __eq__(self, value: object) -> bool:
-        return isinstance(value, LispSymbol) and value.symbolName == self.symbolName
+        return value is self
+
+    def __hash__(self) -> int:
+        return id(self)
+
+    def __reduce__(self):
+        # Unpickled symbols must go through the intern table as well
+        return (LispSymbol, (self.symbolName,))
 
     def __str__(self) -> str:
         return self.symbolName
@@ -18,12 +50,30 @@ class LispSymbol(LispValue):
 
 
 class LispNumber(LispValue):
-    def __init__(self, numberValue: int) -> None:
-        super().__init__()
-        self.numberValue = numberValue
+    """Numbers between `SMALL_MIN` and `SMALL_MAX` are preallocated, `LispNumber(n)` returns the cached object for them"""
+    __slots__ = ("numberValue",)
+
+    SMALL_MIN = -128
+    SMALL_MAX = 1024
+
+    numberValue: int
+    small: list['LispNumber'] = []
+
+    def __new__(cls, numberValue: int) -> 'LispNumber':
+        if LispNumber.SMALL_MIN <= numberValue <= LispNumber.SMALL_MAX and LispNumber.small:
+            return LispNumber.small[numberValue - LispNumber.SMALL_MIN]
+        number = super().__new__(cls)
+        number.numberValue = numberValue
+        return number
 
     def __eq__(self, value: object) -> bool:
-        return isinstance(value, LispNumber) and value.numberValue == self.numberValue
+        return value is self or (isinstance(value, LispNumber) and value.numberValue == self.numberValue)
+
+    def __hash__(self) -> int:
+        return hash(self.numberValue)
+
+    def __reduce__(self):
+        return (LispNumber, (self.numberValue,))
 
     def __str__(self) -> str:
         return self.numberValue.__str__()
@@ -32,26 +82,58 @@ class LispNumber(LispValue):
         return self.__str__()
 
 
+LispNumber.small = [LispNumber(n) for n in range(LispNumber.SMALL_MIN, LispNumber.SMALL_MAX + 1)]
+
+
 class LispList(LispValue):
+    __slots__ = ()
+
     @staticmethod
     def from_list(value: list[LispValue]) -> 'LispList':
         if len(value) == 0:
             return LispEmptyList()
 
-        first, rest = value[0], value[1:]
-        return LispNonEmptyList(first, LispList.from_list(rest))
+        return LispNonEmptyList.view(tuple(value), 0, LispEmptyList())
 
     def to_python_list(self) -> list[LispValue]:
         raise Exception("not implemented")
 
+    def __len__(self) -> int:
+        raise Exception("not implemented")
+
+    def __iter__(self) -> Iterator[LispValue]:
+        raise Exception("not implemented")
+
 
 class LispEmptyList(LispList):
+    """There is a single empty list, `LispEmptyList()` always returns it"""
+    __slots__ = ()
+
+    instance: 'LispEmptyList | None' = None
+
+    def __new__(cls) -> 'LispEmptyList':
+        if LispEmptyList.instance is None:
+            LispEmptyList.instance = super().__new__(cls)
+        return LispEmptyList.instance
+
+    def __reduce__(self):
+        return (LispEmptyList, ())
+
     def to_python_list(self) -> list[LispValue]:
         return []
 
+    def __len__(self) -> int:
+        return 0
+
+    def __iter__(self) -> Iterator[LispValue]:
+        return iter(())
+
     def __eq__(self, value: object) -> bool:
         return isinstance(value, LispEmptyList)
 
+    def __hash__(self) -> int:
+        return 0
+
     def __str__(self) -> str:
         return "()"
 
@@ -60,28 +142,169 @@ class LispEmptyList(LispList):
 
 
 class LispNonEmptyList(LispList):
+    """A run of `items`, from position `start` onwards, followed by the list `tail`.
+
+    Runs are never modified, so lists share them freely: `rest` is a view one position further along
+    the same run, and `LispNonEmptyList(first, rest)` (cons) adds a run of one item in front of `rest`.
+    `LispList.from_list` stores every item in a single run, which gives O(1) indexing. Indexing a list
+    made of several runs, as cons builds, first copies them into `joined`, a single run cached beside
+    them: O(n) once, then O(1). It is published with one assignment, so threads sharing the list never
+    see it half built.
+
+    Lists compare by value but aren't hashable, like Python lists"""
+    __slots__ = ("items", "start", "tail", "length", "joined", "span")
+
+    items: tuple[LispValue, ...]
+    start: int
+    tail: LispList
+    length: int
+    # Every item of the list in one run, once indexing needed it
+    joined: tuple[LispValue, ...] | None
+    # Where the parser read this list from
+    span: Span | None
+
     def __init__(self, first: LispValue, rest: LispList) -> None:
-        super().__init__()
-        self.first = first
-        self.rest = rest
+        self.items = (first,)
+        self.start = 0
+        self.tail = rest
+        self.length = 1 + len(rest)
+        self.joined = None
+        self.span = None
+
+    @staticmethod
+    def view(items: tuple[LispValue, ...], start: int, tail: LispList) -> 'LispNonEmptyList':
+        node = LispNonEmptyList.__new__(LispNonEmptyList)
+        node.items = items
+        node.start = start
+        node.tail = tail
+        node.length = len(items) - start + len(tail)
+        node.joined = None
+        node.span = None
+        return node
+
+    def with_items(self, items: list[LispValue]) -> 'LispNonEmptyList':
+        """A list of `items`, which can't be empty, located where this list was parsed from"""
+        node = LispNonEmptyList.view(tuple(items), 0, LispEmptyList())
+        node.span = self.span
+        return node
+
+    @property
+    def first(self) -> LispValue:
+        return self.items[self.start]
+
+    @property
+    def rest(self) -> LispList:
+        if self.start + 1 < len(self.items):
+            return LispNonEmptyList.view(self.items, self.start + 1, self.tail)
+        return self.tail
+
+    def runs(self) -> Iterator[tuple[tuple[LispValue, ...], int]]:
+        """Every run of the list in order, as (items, start)"""
+        node: LispList = self
+        while isinstance(node, LispNonEmptyList):
+            yield node.items, node.start
+            node = node.tail
 
     def to_python_list(self) -> list[LispValue]:
-        values = [self.first]
-        values.extend(self.rest.to_python_list())
+        if isinstance(self.tail, LispEmptyList):
+            return list(self.items[self.start:])
+
+        values: list[LispValue] = []
+        for items, start in self.runs():
+            values.extend(items[start:])
         return values
 
+    def __len__(self) -> int:
+        return self.length
+
+    def __iter__(self) -> Iterator[LispValue]:
+        for items, start in self.runs():
+            yield from items[start:]
+
+    def __getitem__(self, index: int) -> LispValue:
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError(f"list index {index} out of range")
+
+        if isinstance(self.tail, LispEmptyList):
+            return self.items[self.start + index]
+        joined = self.joined
+        if joined is None:
+            # Other lists may share the runs, so they are copied rather than joined in place
+            joined = self.joined = tuple(self.to_python_list())
+        return joined[index]
+
+    def __reduce__(self):
+        return (LispList.from_list, (self.to_python_list(),))
+
     def __eq__(self, value: object) -> bool:
-        return isinstance(value, LispNonEmptyList) and value.first == self.first and value.rest == self.rest
+        if value is self:
+            return True
+        if not isinstance(value, LispNonEmptyList) or value.length != self.length:
+            return False
+        return all(mine == theirs for mine, theirs in zip(self, value))
+
+    def __hash__(self) -> int:
+        raise TypeError("unhashable type: 'list'")
 
     def __str__(self) -> str:
-        items = self.to_python_list()
+        return "(" + " ".join(map(str, self)) + ")"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
 
-        result = "("
-        for item in items:
-            result += str(item) + " "
-        result = result.strip() + ")"
+class LispAddress(LispValue):
+    """A variable resolved to its lexical address by `scope.resolve_lexical_addresses`: the value lives
+    `depth` frames up from the current one, at position `index`"""
+    __slots__ = ("symbol", "depth", "index")
 
-        return result
+    def __init__(self, symbol: LispSymbol, depth: int, index: int) -> None:
+        super().__init__()
+        self.symbol = symbol
+        self.depth = depth
+        self.index = index
+
+    def __eq__(self, value: object) -> bool:
+        return isinstance(value, LispAddress) and value.symbol is self.symbol and value.depth == self.depth and value.index == self.index
+
+    def __hash__(self) -> int:
+        return hash((self.symbol, self.depth, self.index))
+
+    def __str__(self) -> str:
+        return self.symbol.__str__()
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class LispFunction(LispValue):
+    """What `defun` binds in the scope: a function whose definition was checked once, when it was
+    defined, so calls only evaluate and bind their arguments. `definition` is `((parameter-list) body...)`,
+    as written after the name of the function"""
+    __slots__ = ("definition", "params", "arity", "body")
+
+    def __init__(self, name: LispSymbol, definition: LispList) -> None:
+        super().__init__()
+        foo_args, *foo_body = definition.to_python_list()
+        if not isinstance(foo_args, LispList):
+            raise Exception(
+                f"Bad definition of function {name}, the syntax for defun is: (defun name (parameter-list) body)")
+        params: list[LispSymbol] = []
+        for param in foo_args.to_python_list():
+            if not isinstance(param, LispSymbol):
+                raise Exception(
+                    f"Bad argument {param} from function {name}, all arguments must be symbols")
+            params.append(param)
+
+        self.definition = definition
+        self.params = tuple(params)
+        self.arity = len(params)
+        self.body: tuple[LispValue, ...] = tuple(foo_body)
+
+    def __str__(self) -> str:
+        return str(self.definition)
 
     def __repr__(self) -> str:
         return self.__str__()
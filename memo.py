@@ -0,0 +1,145 @@
+from collections import OrderedDict
+from interpreter import Interpreter
+from lisptypes import LispEmptyList, LispFunction, LispNonEmptyList, LispNumber, LispSymbol, LispValue
+from scope import Scope
+from screen import Screen
+
+# Builtins whose value only depends on their arguments. `let` is included since pure functions only
+# declare variables of their own block
+PURE_BUILTINS = {"+", "-", "*", "/", "cons", "list", "let"}
+
+
+class PurityAnalysis():
+    """Decides if a function is pure: it never prints, assigns with `=`, defines functions or reads
+    variables other than its parameters and its own `let`s, directly or through the functions it calls.
+
+    Functions are looked up by name at call time, so the analysis holds only while the names it
+    looked up, kept in `callees`, still refer to the same definitions"""
+
+    def __init__(self, scope: Scope) -> None:
+        self.scope = scope
+        self.callees: dict[LispSymbol, LispValue | None] = {}
+        self.results: dict[LispSymbol, bool] = {}
+
+    def is_pure_function(self, name: LispSymbol) -> bool:
+        if name in self.results:
+            # Recursive calls are pure if the rest of the function is
+            return self.results[name]
+        function = self.scope.read_symbol(name)
+        self.callees[name] = function
+        if not isinstance(function, LispFunction):
+            return False
+
+        self.results[name] = True
+        pure = self.is_pure_body(list(function.body), set(function.params))
+        self.results[name] = pure
+        return pure
+
+    def is_pure_body(self, body: list[LispValue], bound: set[LispValue]) -> bool:
+        return all(self.is_pure_expression(expr, bound) for expr in body)
+
+    def is_pure_expression(self, expr: LispValue, bound: set[LispValue]) -> bool:
+        """`bound` holds the variables of the block `expr` runs in, `let`s add to it in evaluation order"""
+        if isinstance(expr, LispSymbol):
+            return expr in bound
+        if isinstance(expr, (LispNumber, LispEmptyList)):
+            return True
+        if not isinstance(expr, LispNonEmptyList) or not isinstance(expr.first, LispSymbol):
+            return False
+
+        name = expr.first
+        args = expr.rest.to_python_list()
+        if name.symbolName not in PURE_BUILTINS:
+            if name.symbolName in ("print", "=", "defun") or name in bound:
+                return False
+            # Arguments are evaluated in the block of the callee, their `let`s don't reach this one
+            return self.is_pure_body(args, set(bound)) and self.is_pure_function(name)
+
+        if name.symbolName == "let":
+            if len(args) != 2 or not isinstance(args[0], LispSymbol):
+                return False
+            pure = self.is_pure_expression(args[1], bound)
+            bound.add(args[0])
+            return pure
+        return self.is_pure_body(args, bound)
+
+
+class CacheStats():
+    __slots__ = ("hits", "misses")
+
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+
+    def __str__(self) -> str:
+        return f"{self.hits} hits, {self.misses} misses"
+
+
+class FunctionCache():
+    """Results of one definition of a function, valid while the functions it calls keep their definitions"""
+    __slots__ = ("function", "callees", "results", "stats")
+
+    def __init__(self, function: LispFunction, callees: dict[LispSymbol, LispValue | None], pure: bool) -> None:
+        self.function = function
+        self.callees = callees
+        # Argument values -> result, least recently used first. None for impure functions
+        self.results: OrderedDict[tuple[LispValue | None, ...], LispValue] | None = OrderedDict() if pure else None
+        self.stats = CacheStats()
+
+    def is_valid(self, function: LispFunction, scope: Scope) -> bool:
+        if function is not self.function:
+            return False
+        return all(scope.read_symbol(name) is callee for name, callee in self.callees.items())
+
+
+class MemoizingInterpreter(Interpreter):
+    """An `Interpreter` caching the results of pure functions, keyed by the values of their arguments,
+    in a LRU of at most `max_size` entries per function.
+
+    Arguments are still evaluated and bound as usual, only the body is skipped on a hit. Results are only
+    cached for hashable arguments (numbers and empty lists), and a function stops using its cache as soon
+    as it or any function it calls is redefined"""
+
+    def __init__(self, max_size: int = 1024) -> None:
+        super().__init__()
+        self.max_size = max_size
+        self.caches: dict[str, FunctionCache] = {}
+
+    def eval_function_body(self, name: LispSymbol, function: LispFunction, scope: Scope, screen: Screen) -> LispValue:
+        cache = self.caches.get(name.symbolName)
+        if cache is None or not cache.is_valid(function, scope):
+            analysis = PurityAnalysis(scope)
+            pure = analysis.is_pure_function(name)
+            cache = self.caches[name.symbolName] = FunctionCache(function, analysis.callees, pure)
+
+        body = function.body
+        results = cache.results
+        if results is None:
+            return self.eval_recursive(body, scope, screen)
+
+        key = tuple(scope.read_symbol(param) for param in function.params)
+        try:
+            result = results.get(key)
+        except TypeError:
+            # Lists aren't hashable
+            return self.eval_recursive(body, scope, screen)
+
+        if result is not None:
+            cache.stats.hits += 1
+            results.move_to_end(key)
+            return result
+
+        cache.stats.misses += 1
+        result = self.eval_recursive(body, scope, screen)
+        results[key] = result
+        if len(results) > self.max_size:
+            results.popitem(last=False)
+        return result
+
+    def stats(self) -> dict[str, CacheStats]:
+        """Statistics of the pure functions called so far"""
+        return {name: cache.stats for name, cache in self.caches.items() if cache.results is not None}
+
+
+def eval_memoized(ast: list[LispValue], scope: Scope, screen: Screen, max_size: int = 1024) -> LispValue:
+    return MemoizingInterpreter(max_size).eval(ast, scope, screen)
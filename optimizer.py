@@ -0,0 +1,283 @@
+from functools import reduce
+from typing import Callable, Iterable
+from lisptypes import LispEmptyList, LispList, LispNonEmptyList, LispNumber, LispSymbol, LispValue
+from source import Span
+
+# An optimization pass: the rewritten program, and a description of every change it made
+Pass = Callable[[list[LispValue]], tuple[list[LispValue], list[str]]]
+
+# Largest body, in nodes, of the functions `inline_functions` copies into call sites
+INLINE_SIZE = 20
+
+# Builtins that can't print, assign or call user functions
+SIMPLE_BUILTINS = {"+", "-", "*", "/", "cons", "list"}
+
+
+def head_name(node: LispValue) -> str | None:
+    if isinstance(node, LispNonEmptyList) and isinstance(node.first, LispSymbol):
+        return node.first.symbolName
+    return None
+
+
+def first_expression(items: list[LispValue]) -> int:
+    """Index of the first item of an application that is evaluated as an expression"""
+    if not isinstance(items[0], LispSymbol):
+        return len(items)
+    match items[0].symbolName:
+        case "defun":
+            return 3
+        case "let" | "=":
+            return 2
+        case _:
+            return 1
+
+
+def rebuild(node: LispNonEmptyList, items: list[LispValue]) -> LispNonEmptyList:
+    """A copy of `node` with `items`, keeping its location"""
+    return node.with_items(items)
+
+
+def transform(expr: LispValue, rule: Callable[[LispNonEmptyList], LispValue]) -> LispValue:
+    """Applies `rule` to every application in `expr`, innermost first"""
+    if not isinstance(expr, LispNonEmptyList):
+        return expr
+    items = expr.to_python_list()
+    start = first_expression(items)
+    new_items = items[:start] + [transform(item, rule) for item in items[start:]]
+    if any(new is not old for new, old in zip(new_items, items)):
+        expr = rebuild(expr, new_items)
+    return rule(expr)
+
+
+def fold_constants(ast: list[LispValue]) -> tuple[list[LispValue], list[str]]:
+    """Evaluates arithmetic over constants. Additions and multiplications with some constant operands
+    have them combined into one. Divisions by zero are left for the program to fail on"""
+    changes: list[str] = []
+
+    def fold(node: LispNonEmptyList) -> LispValue:
+        name = head_name(node)
+        args = node.rest.to_python_list()
+        if name not in ("+", "-", "*", "/") or len(args) == 0:
+            return node
+        numbers = [arg.numberValue for arg in args if isinstance(arg, LispNumber)]
+
+        folded: LispValue = node
+        if len(numbers) == len(args):
+            if name == "+":
+                folded = LispNumber(sum(numbers))
+            elif name == "-":
+                folded = LispNumber(reduce(lambda x, y: x - y, numbers))
+            elif name == "*":
+                folded = LispNumber(reduce(lambda x, y: x * y, numbers))
+            elif len(numbers) == 2 and numbers[1] != 0:
+                folded = LispNumber(numbers[0] // numbers[1])
+        elif name in ("+", "*") and len(numbers) >= 2:
+            combined = sum(numbers) if name == "+" else reduce(lambda x, y: x * y, numbers)
+            others = [arg for arg in args if not isinstance(arg, LispNumber)]
+            folded = rebuild(node, [node.first] + others + [LispNumber(combined)])
+
+        if folded is not node:
+            changes.append(f"fold: {node} => {folded}")
+        return folded
+
+    return [transform(form, fold) for form in ast], changes
+
+
+def flatten_arithmetic(ast: list[LispValue]) -> tuple[list[LispValue], list[str]]:
+    """Turns `(+ a (+ b c))` into `(+ a b c)`, and the same for `*`"""
+    changes: list[str] = []
+
+    def flatten(node: LispNonEmptyList) -> LispValue:
+        name = head_name(node)
+        if name not in ("+", "*"):
+            return node
+        args = node.rest.to_python_list()
+        # (*) fails, so applications without arguments are kept
+        if not any(isinstance(arg, LispNonEmptyList) and head_name(arg) == name and len(arg) > 1 for arg in args):
+            return node
+
+        items: list[LispValue] = [node.first]
+        for arg in args:
+            if isinstance(arg, LispNonEmptyList) and head_name(arg) == name and len(arg) > 1:
+                items.extend(arg.rest.to_python_list())
+            else:
+                items.append(arg)
+        flattened = rebuild(node, items)
+        changes.append(f"flatten: {node} => {flattened}")
+        return flattened
+
+    return [transform(form, flatten) for form in ast], changes
+
+
+def collect_symbols(expr: LispValue, symbols: set[LispSymbol]):
+    if isinstance(expr, LispSymbol):
+        symbols.add(expr)
+    elif isinstance(expr, LispNonEmptyList):
+        for item in expr:
+            collect_symbols(item, symbols)
+
+
+def count_definitions(expr: LispValue, definitions: dict[LispSymbol, int], variables: set[LispSymbol]):
+    """Counts the `defun`s of every name in `expr`, and collects the names bound as variables"""
+    if not isinstance(expr, LispNonEmptyList):
+        return
+    items = expr.to_python_list()
+    name = head_name(expr)
+    if name == "defun" and len(items) > 2:
+        if isinstance(items[1], LispSymbol):
+            definitions[items[1]] = definitions.get(items[1], 0) + 1
+        if isinstance(items[2], LispList):
+            variables.update(param for param in items[2] if isinstance(param, LispSymbol))
+    elif name in ("let", "=") and len(items) > 1 and isinstance(items[1], LispSymbol):
+        variables.add(items[1])
+    for item in items:
+        count_definitions(item, definitions, variables)
+
+
+def inlinable_body(definition: list[LispValue]) -> tuple[list[LispSymbol], LispValue] | None:
+    """The parameters and body of `(defun name (params) body)` when calls to it can be replaced by its
+    body: a single expression of simple builtins over the parameters, each of them used"""
+    if len(definition) != 4 or not isinstance(definition[2], LispList):
+        return None
+    params = [param for param in definition[2] if isinstance(param, LispSymbol)]
+    body = definition[3]
+    if len(params) != len(definition[2]) or len(set(params)) != len(params):
+        return None
+
+    size = 0
+
+    def simple(expr: LispValue) -> bool:
+        nonlocal size
+        size += 1
+        if isinstance(expr, (LispNumber, LispEmptyList)):
+            return True
+        if isinstance(expr, LispSymbol):
+            return expr in params
+        return isinstance(expr, LispNonEmptyList) and head_name(expr) in SIMPLE_BUILTINS \
+            and all(simple(arg) for arg in expr.rest)
+
+    used: set[LispSymbol] = set()
+    collect_symbols(body, used)
+    if not simple(body) or size > INLINE_SIZE or not set(params) <= used:
+        return None
+    return params, body
+
+
+def substitute(expr: LispValue, values: dict[LispSymbol, LispValue], span: Span | None) -> LispValue:
+    """Copies `expr` replacing symbols with their `values`, errors in the copy are located at `span`"""
+    if isinstance(expr, LispSymbol):
+        return values.get(expr, expr)
+    if isinstance(expr, LispNonEmptyList):
+        node = expr.with_items([expr.first] + [substitute(arg, values, span) for arg in expr.rest])
+        node.span = span
+        return node
+    return expr
+
+
+def inline_functions(ast: list[LispValue]) -> tuple[list[LispValue], list[str]]:
+    """Replaces calls to small functions of simple builtins with their bodies.
+
+    With dynamic scope a call binds its parameters where everything it calls can see them, so only
+    functions that call nothing are inlined, and only where calling them is known to reach their single
+    top-level definition: in the forms after it. Arguments must be constants or symbols other than the
+    parameters, which give the same value however many times and in whatever order they are read"""
+    definitions: dict[LispSymbol, int] = {}
+    variables: set[LispSymbol] = set()
+    for form in ast:
+        count_definitions(form, definitions, variables)
+
+    changes: list[str] = []
+    inlinable: dict[LispSymbol, tuple[list[LispSymbol], LispValue]] = {}
+
+    def inline(node: LispNonEmptyList) -> LispValue:
+        function = inlinable.get(node.first) if isinstance(node.first, LispSymbol) else None
+        if function is None:
+            return node
+        params, body = function
+        args = node.rest.to_python_list()
+        if len(args) != len(params):
+            return node
+        for arg in args:
+            if not isinstance(arg, (LispNumber, LispEmptyList, LispSymbol)) or arg in params:
+                return node
+        inlined = substitute(body, dict(zip(params, args)), node.span)
+        changes.append(f"inline: {node} => {inlined}")
+        return inlined
+
+    result: list[LispValue] = []
+    for form in ast:
+        result.append(transform(form, inline) if inlinable else form)
+        if isinstance(form, LispNonEmptyList) and head_name(form) == "defun":
+            items = form.to_python_list()
+            name = items[1] if len(items) > 1 else None
+            function = inlinable_body(items)
+            if isinstance(name, LispSymbol) and function is not None and definitions[name] == 1 and name not in variables:
+                inlinable[name] = function
+    return result, changes
+
+
+def defined_name(form: LispValue) -> LispSymbol | None:
+    """The name a well-formed `(defun name (params) body)` defines, None for any other form. Well-formed
+    means `defun` and `LispFunction` accept it, so removing it can't remove an error"""
+    if not isinstance(form, LispNonEmptyList) or head_name(form) != "defun":
+        return None
+    items = form.to_python_list()
+    if len(items) >= 4 and isinstance(items[1], LispSymbol) and isinstance(items[2], LispList) \
+            and all(isinstance(param, LispSymbol) for param in items[2]):
+        return items[1]
+    return None
+
+
+def remove_dead_defuns(ast: list[LispValue]) -> tuple[list[LispValue], list[str]]:
+    """Drops top-level `defun`s of names the rest of the program never mentions, directly or through the
+    functions it uses. The last form is always kept, since it is the value of the program"""
+    defuns: dict[LispSymbol, list[LispValue]] = {}
+    reachable: set[LispSymbol] = set()
+    for i, form in enumerate(ast):
+        name = defined_name(form)
+        if name is not None and i != len(ast) - 1:
+            defuns.setdefault(name, []).append(form)
+        else:
+            collect_symbols(form, reachable)
+
+    pending = list(reachable)
+    while pending:
+        for definition in defuns.get(pending.pop(), []):
+            used: set[LispSymbol] = set()
+            collect_symbols(definition, used)
+            pending.extend(used - reachable)
+            reachable.update(used)
+
+    result: list[LispValue] = []
+    changes: list[str] = []
+    for i, form in enumerate(ast):
+        name = defined_name(form)
+        if name is not None and i != len(ast) - 1 and name not in reachable:
+            changes.append(f"dead-defuns: removed {name}")
+        else:
+            result.append(form)
+    return result, changes
+
+
+PASSES: dict[str, Pass] = {
+    "fold": fold_constants,
+    "flatten": flatten_arithmetic,
+    "inline": inline_functions,
+    "dead-defuns": remove_dead_defuns,
+}
+
+# Inlining leaves constants to fold and functions nobody calls anymore
+DEFAULT_PIPELINE = ["flatten", "fold", "inline", "fold", "dead-defuns"]
+
+
+def optimize(ast: list[LispValue], passes: Iterable[str] = DEFAULT_PIPELINE) -> tuple[list[LispValue], list[str]]:
+    """Runs `passes` in order over a parsed (and optionally statically bound) program, which prints the
+    same and evaluates to the same value afterwards. Returns the new program and the changes made"""
+    changes: list[str] = []
+    for name in passes:
+        if name not in PASSES:
+            raise Exception(
+                f"unknown optimization pass {name}, available passes are: {', '.join(PASSES)}")
+        ast, pass_changes = PASSES[name](ast)
+        changes.extend(pass_changes)
+    return ast, changes
@@ -1,46 +1,137 @@
+import codecs
+from itertools import chain
+from typing import Iterable, Iterator, Protocol
+from lisptypes import LispEmptyList, LispList, LispNonEmptyList, LispNumber, LispSymbol, LispValue
+from source import Source, Span
+from stringreader import CLOSE, NUMBER_TOKEN, OPEN, TOKEN, WORD_TOKEN, StringReader
 
-from lisptypes import LispList, LispNumber, LispSymbol, LispValue
-from stringreader import StringReader
+# Characters that end a token, a chunk is only tokenized up to the last one of them
+DELIMITERS = " \t\n()"
+CHUNK_SIZE = 1 << 16
 
 
-def parse(code: str) -> list[LispValue]:
-    reader = StringReader(code)
-    result: list[LispValue] = []
+def parse(code: str, name: str | None = None) -> list[LispValue]:
+    return list(parse_chunks((code,), Source(name)))
+
+
+class Readable(Protocol):
+    """What `parse_stream` reads from: text or binary files, `mmap.mmap`, `io.StringIO`..."""
+
+    def read(self, size: int, /) -> str | bytes: ...
+
+
+def parse_stream(source: Readable, chunk_size: int = CHUNK_SIZE, name: str | None = None) -> Iterator[LispValue]:
+    """Parses a file object (text or binary, e.g. a `mmap.mmap`), yielding each top-level form as soon
+    as it has been read. Only the form being parsed and one chunk of the source are kept in memory"""
+    return parse_chunks(read_chunks(source, chunk_size), Source(name))
+
+
+def read_chunks(source: Readable, chunk_size: int = CHUNK_SIZE) -> Iterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8")()
     while True:
-        reader.skip_whitespaces()
-        if reader.size() > 0:
-            result.append(parse_single_expression(reader))
-        else:
+        chunk = source.read(chunk_size)
+        if not chunk:
             break
+        yield decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+
+    rest = decoder.decode(b"", final=True)
+    if rest:
+        yield rest
+
 
-    return result
+def parse_chunks(chunks: Iterable[str | None], source: Source) -> Iterator[LispValue]:
+    """Scans the source with one regex, building the AST without any per-character work.
+    Tokens may be split between chunks: the text after the last delimiter of a chunk waits for the next one.
+
+    Every parsed list gets the `Span` it was read from, and `source` indexes the lines as they go by"""
+    # Items of the lists still open, innermost last, and where each of them started
+    open_lists: list[list[LispValue]] = []
+    open_starts: list[int] = []
+
+    # Symbols of this parse by name, a plain dict in front of the weak intern table of `LispSymbol`
+    symbols: dict[str, LispSymbol] = {}
+    small_numbers, small_min, small_max = LispNumber.small, LispNumber.SMALL_MIN, LispNumber.SMALL_MAX
+    empty = LispEmptyList()
+    view = LispNonEmptyList.view
+
+    # Position of the start of `text` in the source
+    offset = 0
+    pending = ""
+    for chunk in chain(chunks, (None,)):
+        if chunk is None:
+            # End of the source, whatever is left is a whole token
+            text, cut, pending = pending, len(pending), ""
+        else:
+            text = pending + chunk if pending else chunk
+            cut = max(map(text.rfind, DELIMITERS)) + 1
+            pending = text[cut:]
+            if cut == 0:
+                continue
+        source.add_text(text, 0, cut, offset)
+
+        value: LispValue
+        for match in TOKEN.finditer(text, 0, cut):
+            kind = match.lastindex
+            if kind == OPEN:
+                open_lists.append([])
+                open_starts.append(offset + match.end() - 1)
+                continue
+
+            if kind == CLOSE:
+                if not open_lists:
+                    raise source.error(offset + match.end() - 1, "unexpected ')'")
+                items = open_lists.pop()
+                start = open_starts.pop()
+                if items:
+                    value = view(tuple(items), 0, empty)
+                    value.span = Span(source, start, offset + match.end())
+                else:
+                    value = empty
+            elif kind == NUMBER_TOKEN:
+                number = int(match.group(NUMBER_TOKEN))
+                value = small_numbers[number - small_min] if small_min <= number <= small_max else LispNumber(number)
+            else:
+                word = match.group(WORD_TOKEN)
+                value = symbols.get(word) or symbols.setdefault(word, LispSymbol(word))
+
+            if open_lists:
+                open_lists[-1].append(value)
+            else:
+                yield value
+
+        offset += cut
+
+    if open_lists:
+        raise source.error(offset, "expected ')'")
 
 
 def parse_single_expression(reader: StringReader) -> LispValue:
-    reader.skip_whitespaces()
-
-    if reader.peek() == "(":
-        expression_list: list[LispValue] = []
-        reader.advance()
-        reader.skip_whitespaces()
-        while True:
-            char = reader.peek()
-            if char is None:
+    # Items of the lists still open, innermost last
+    open_lists: list[list[LispValue]] = []
+
+    while True:
+        token = reader.next_token()
+        if token is None:
+            if open_lists:
                 raise reader.with_location(Exception("expected ')'"))
-            if char == ")":
-                break
-            expression_list.append(parse_single_expression(reader))
-            reader.skip_whitespaces()
-        reader.advance()
-        return LispList.from_list(expression_list)
-
-    if reader.peek() == ")":
-        raise reader.with_location(Exception("unexpected ')'"))
-
-    if (number := reader.next_number()) is not None:
-        return LispNumber(number)
-
-    if (symbol := reader.next_word()) is not None:
-        return LispSymbol(symbol)
-    else:
-        raise reader.with_location(Exception("expected symbol"))
+            raise reader.with_location(Exception("expected symbol"))
+
+        kind, text = token
+        if kind == OPEN:
+            open_lists.append([])
+            continue
+
+        value: LispValue
+        if kind == CLOSE:
+            if not open_lists:
+                reader.retreat()
+                raise reader.with_location(Exception("unexpected ')'"))
+            value = LispList.from_list(open_lists.pop())
+        elif kind == NUMBER_TOKEN:
+            value = LispNumber(int(text))
+        else:
+            value = LispSymbol(text)
+
+        if not open_lists:
+            return value
+        open_lists[-1].append(value)
@@ -0,0 +1,60 @@
+from functools import reduce
+from lisptypes import LispList, LispNonEmptyList, LispNumber, LispValue
+
+# Value-level semantics of the builtins in `interpreter.eval_function_application`, for the engines
+# that evaluate the arguments themselves. Error messages match the ones raised by the tree-walker.
+
+ARITHMETIC_OPERATIONS: dict[str, str] = {
+    "+": "addition",
+    "-": "subtraction",
+    "*": "multiplication",
+}
+
+
+def number_operand(operation: str, value: LispValue) -> int:
+    if not isinstance(value, LispNumber):
+        raise Exception(
+            f"tried to perform {operation} with a non num types: {value}")
+    return value.numberValue
+
+
+def add(operators: list[int]) -> LispNumber:
+    return LispNumber(sum(operators))
+
+
+def subtract(operators: list[int]) -> LispNumber:
+    return LispNumber(reduce((lambda x, y: x - y), operators))
+
+
+def multiply(operators: list[int]) -> LispNumber:
+    return LispNumber(reduce((lambda x, y: x * y), operators))
+
+
+ARITHMETIC = {
+    "+": add,
+    "-": subtract,
+    "*": multiply,
+}
+
+
+def divide(dividend: LispValue, divisor: LispValue) -> LispNumber:
+    if not isinstance(dividend, LispNumber) or not isinstance(divisor, LispNumber):
+        raise Exception(
+            f"can't perform division using non num values, attempted: {dividend}/{divisor}")
+    if divisor.numberValue == 0:
+        raise Exception(
+            f"can't divide a number by zero")
+    # Implementing only integer division
+    return LispNumber(dividend.numberValue//divisor.numberValue)
+
+
+def cons(first: LispValue, rest: LispValue) -> LispNonEmptyList:
+    if not isinstance(rest, LispList):
+        raise Exception(
+            f"cons expects the second argument to be a list, found {rest}")
+
+    return LispNonEmptyList(first, rest)
+
+
+def arity_error(form: str, expected: str, args: list[LispValue]) -> Exception:
+    return Exception(f"{form} needs exactly {expected} arguments, but was called with {args}")
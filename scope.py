@@ -1,5 +1,7 @@
-from lisptypes import LispSymbol, LispValue, LispList, LispNonEmptyList, LispNumber, LispEmptyList
+from lisptypes import LispAddress, LispSymbol, LispValue, LispList, LispNonEmptyList, LispNumber, LispEmptyList
 from enum import Enum
+import itertools
+from typing import Any, Iterable, Iterator, Sequence
 
 
 class SymbolType(Enum):
@@ -7,52 +9,169 @@ class SymbolType(Enum):
     FUNCTION = 1
 
 
+class Frame:
+    """A fixed-size frame of variables for lexically addressed programs, see `resolve_lexical_addresses`.
+    `parent` is the frame the function was defined in (its static link). `display` holds the values of
+    every frame in the static chain, outermost first, so any address is found with two index operations"""
+    __slots__ = ("values", "parent", "display")
+
+    def __init__(self, values: list[LispValue | None], parent: 'Frame | None') -> None:
+        self.values = values
+        self.parent = parent
+        self.display: tuple[list[LispValue | None], ...] = (
+            values,) if parent is None else parent.display + (values,)
+
+    def lookup(self, address: LispAddress) -> LispValue | None:
+        return self.display[-1 - address.depth][address.index]
+
+    def assign(self, address: LispAddress, value: LispValue) -> None:
+        self.display[-1 - address.depth][address.index] = value
+
+
 class Scope:
-    """Represents a Dynamic Scope. In order to use the language with a static scope, see `bind_to_static_scope`"""
+    """Represents a Dynamic Scope. In order to use the language with a static scope, see `bind_to_static_scope`
+
+    Uses shallow binding: every symbol name maps to a stack of its live bindings, so reading and
+    setting a symbol only looks at the top of that stack. Each block keeps an undo list of the
+    bindings it created, which `end_block` pops."""
+
+    def __init__(self) -> None:
+        # name -> stack of live bindings, most specific last
+        self.bindings: dict[str, list[list[Any]]] = {}
+        # Already begins in one level
+        # Each block remembers the bindings it created, in creation order: (name, [value, symbol_type])
+        self.scopes: list[list[tuple[str, list[Any]]]] = [
+            []
+        ]
+        self.block_names: list[str] = ["global"]
+        # Current frame for lexically addressed variables, functions are still looked up by name. Only
+        # the closure engine runs lexically addressed programs
+        self.frame = Frame([], None)
+
+    def read_symbol(self, symbol: LispSymbol) -> LispValue | None:
+        stack = self.bindings.get(symbol.symbolName)
+        if not stack:
+            return None
+        return stack[-1][0]
+
+    @property
+    def names(self) -> Sequence[str]:
+        """Names of the open blocks, outermost first"""
+        return self.block_names
+
+    def create_symbol(self, symbol: LispSymbol, value: LispValue, symbol_type: SymbolType):
+        binding = [value, symbol_type]
+        name = symbol.symbolName
+        stack = self.bindings.get(name)
+        if stack is None:
+            self.bindings[name] = [binding]
+        else:
+            stack.append(binding)
+        self.scopes[-1].append((name, binding))
+
+    def set_symbol(self, symbol: LispSymbol, value: LispValue, symbol_type: SymbolType):
+        stack = self.bindings.get(symbol.symbolName)
+        if not stack:
+            raise Exception(f"unknown symbol {symbol}")
+
+        binding = stack[-1]
+        binding[0] = value
+        binding[1] = symbol_type
+
+    def begin_block(self, block_name: str) -> None:
+        self.scopes.append([])
+        self.block_names.append(block_name)
+
+    def end_block(self) -> None:
+        bindings = self.bindings
+        for name, _ in self.scopes.pop():
+            bindings[name].pop()
+        self.block_names.pop()
+
+    def mark(self) -> Any:
+        """An opaque mark of the open blocks and global bindings, see `rollback`"""
+        return len(self.block_names), len(self.scopes[0])
+
+    def rollback(self, mark: Any) -> None:
+        """Ends the blocks begun since `mark` was taken and forgets the global bindings created since,
+        uncovering the ones they shadowed. Values set since in older bindings are kept"""
+        depth, created = mark
+        while len(self.block_names) > depth:
+            self.end_block()
+        bindings, scope = self.bindings, self.scopes[0]
+        while len(scope) > created:
+            name, _ = scope.pop()
+            bindings[name].pop()
+
+    def __str__(self) -> str:
+        result = ""
+        for scope in self.scopes:
+            for var, (value, symbol_type) in scope:
+                result += f"{var}" + (f" = {value}" if symbol_type ==
+                                      SymbolType.VARIABLE else "()") + "\n"
+            result += "-----------------------------\n"
+        return result.removesuffix("-----------------------------\n")
+
+
+class DeepScope(Scope):
+    """Deep-binding Dynamic Scope, keeping every block as a list of bindings that is searched linearly.
+
+    This is the original implementation of `Scope`, kept as a reference for tests and benchmarks"""
 
     def __init__(self) -> None:
         # Already begins in one level
-        self.scopes: list[list[tuple[LispSymbol, LispValue, SymbolType]]] = [
+        self.frames: list[list[tuple[LispSymbol, LispValue, SymbolType]]] = [
             []
         ]
-        self.names: list[str] = ["global"]
+        self.block_names: list[str] = ["global"]
+        self.frame = Frame([], None)
 
     def read_symbol(self, symbol: LispSymbol) -> LispValue | None:
         # From most specific scope to least specific
-        for scope in reversed(self.scopes):
-            for (name, value, _) in scope:
+        for frame in reversed(self.frames):
+            for (name, value, _) in frame:
                 if symbol == name:
                     return value
         return None
 
     def create_symbol(self, symbol: LispSymbol, value: LispValue, symbol_type: SymbolType):
-        self.scopes[-1].insert(0, (symbol, value, symbol_type))
+        self.frames[-1].insert(0, (symbol, value, symbol_type))
 
     def set_symbol(self, symbol: LispSymbol, value: LispValue, symbol_type: SymbolType):
         # From most specific scope to least specific
-        for scope in reversed(self.scopes):
-            for i in range(len(scope)):
-                (name, _, _) = scope[i]
+        for frame in reversed(self.frames):
+            for i in range(len(frame)):
+                (name, _, _) = frame[i]
                 if symbol == name:
-                    scope[i] = (symbol, value, symbol_type)
+                    frame[i] = (symbol, value, symbol_type)
                     return
 
         raise Exception(f"unknown symbol {symbol}")
 
     def begin_block(self, block_name: str) -> None:
-        self.scopes.append([])
-        self.names.append(block_name)
+        self.frames.append([])
+        self.block_names.append(block_name)
 
     def end_block(self) -> None:
-        self.scopes.pop()
-        self.names.pop()
+        self.frames.pop()
+        self.block_names.pop()
+
+    def mark(self) -> Any:
+        return len(self.block_names), len(self.frames[0])
+
+    def rollback(self, mark: Any) -> None:
+        depth, created = mark
+        while len(self.block_names) > depth:
+            self.end_block()
+        # Blocks keep their newest binding first
+        del self.frames[0][:len(self.frames[0]) - created]
 
     def __str__(self) -> str:
         i: int = 0
         result = ""  # + "---------- SCOPE: ----------\n"
-        for scope in self.scopes:
+        for frame in self.frames:
             # result += f"LEVEL {i}\n"
-            for var, value, symbol_type in reversed(scope):
+            for var, value, symbol_type in reversed(frame):
                 result += f"{var}" + (f" = {value}" if symbol_type ==
                                       SymbolType.VARIABLE else "()") + "\n"
             result += "-----------------------------\n"
@@ -60,14 +179,19 @@ class Scope:
         return result.removesuffix("-----------------------------\n")
 
 
-var_count: int = 0
+# Shared by every binding so that programs bound separately and run in one scope never reuse a name.
+# next() on a count is atomic, so interpreters on other threads can bind at the same time
+var_count = itertools.count()
 
 
 def make_var_name(var: LispSymbol):
-    global var_count
-    new_var_name = var.symbolName + "_" + str(var_count)
-    var_count += 1
-    return LispSymbol(new_var_name)
+    return LispSymbol(var.symbolName + "_" + str(next(var_count)))
+
+
+def bind_stream_to_static_scope(forms: Iterable[LispValue], scope: Scope) -> Iterator[LispValue]:
+    """`bind_to_static_scope` for top-level forms that arrive one by one, e.g. from `parser.parse_stream`"""
+    for form in forms:
+        yield from bind_to_static_scope([form], scope)
 
 
 def bind_to_static_scope(ast: list[LispValue], scope: Scope) -> list[LispValue]:
@@ -92,7 +216,7 @@ def bind_to_static_scope(ast: list[LispValue], scope: Scope) -> list[LispValue]:
             scope.create_symbol(var, new_var, SymbolType.VARIABLE)
 
             # Replace the node by the new modified one
-            new_node = LispList.from_list(
+            new_node = node.with_items(
                 [operator, new_var] + bind_to_static_scope([expr], scope))
             result_ast.append(new_node)
 
@@ -117,7 +241,7 @@ def bind_to_static_scope(ast: list[LispValue], scope: Scope) -> list[LispValue]:
                 new_args_list.append(new_var)
                 scope.create_symbol(function_arg, new_var, SymbolType.VARIABLE)
 
-            new_node = LispList.from_list([operator, function_name, LispList.from_list(
+            new_node = node.with_items([operator, function_name, LispList.from_list(
                 new_args_list)] + bind_to_static_scope(function_body, scope))
             result_ast.append(new_node)
             scope.end_block()
@@ -130,7 +254,7 @@ def bind_to_static_scope(ast: list[LispValue], scope: Scope) -> list[LispValue]:
             renamed_application = [function_name]
 
             renamed_application.extend(bind_to_static_scope(args_list, scope))
-            result_ast.append(LispList.from_list(renamed_application))
+            result_ast.append(node.with_items(renamed_application))
 
         elif isinstance(node, LispSymbol):
             replaced_name = scope.read_symbol(node)
@@ -148,3 +272,103 @@ def bind_to_static_scope(ast: list[LispValue], scope: Scope) -> list[LispValue]:
             raise Exception(f"unexpected syntax {node}")
 
     return result_ast
+
+
+def resolve_lexical_addresses(ast: list[LispValue], globals: dict[LispSymbol, int] | None = None) -> list[LispValue]:
+    """Replaces every variable of a program bound by `bind_to_static_scope` by its `LispAddress`.
+    The global frame and each function frame get one slot per parameter and `let` they declare.
+
+    `globals` maps the variables of the global frame to their slots. Programs that run one after another
+    in the same scope must share it, so that each one numbers its globals after those of the others
+    and sees them. Only the closure engine (`compiler.eval_compiled`) runs the result, the other engines
+    reject it"""
+    return resolve_frame(ast, [globals if globals is not None else {}])
+
+
+def resolve_frame(ast: list[LispValue], frames: list[dict[LispSymbol, int]]) -> list[LispValue]:
+    result_ast: list[LispValue] = []
+
+    for node in ast:
+        if isinstance(node, LispNonEmptyList) and isinstance(node.first, LispSymbol) and node.first.symbolName == "let":
+            [operator, var, *expr] = node.to_python_list()
+            # The value is resolved before the variable exists, so it sees the previous binding
+            new_expr = resolve_frame(expr, frames)
+            if isinstance(var, LispSymbol):
+                frames[-1][var] = len(frames[-1])
+                var = LispAddress(var, 0, frames[-1][var])
+            result_ast.append(node.with_items([operator, var] + new_expr))
+
+        elif isinstance(node, LispNonEmptyList) and isinstance(node.first, LispSymbol) and node.first.symbolName == "defun":
+            [operator, function_name, args_list, *function_body] = node.to_python_list()
+            if not isinstance(args_list, LispList):
+                raise Exception(
+                    f"function declaration expects list of arguments, given {args_list}")
+
+            frame: dict[LispSymbol, int] = {}
+            new_args_list: list[LispValue] = []
+            for function_arg in args_list.to_python_list():
+                if not isinstance(function_arg, LispSymbol):
+                    raise Exception(
+                        f"bad argument {function_arg} from function {function_name}, all arguments must be symbols")
+                frame[function_arg] = len(frame)
+                new_args_list.append(LispAddress(function_arg, 0, frame[function_arg]))
+
+            new_body = resolve_frame(function_body, frames + [frame])
+            result_ast.append(node.with_items(
+                [operator, function_name, LispList.from_list(new_args_list)] + new_body))
+
+        elif isinstance(node, LispNonEmptyList):
+            [function_name, *args_list] = node.to_python_list()
+            result_ast.append(node.with_items(
+                [function_name] + resolve_frame(args_list, frames)))
+
+        elif isinstance(node, LispSymbol):
+            # Innermost declaration wins
+            for depth, frame in enumerate(reversed(frames)):
+                if node in frame:
+                    result_ast.append(LispAddress(node, depth, frame[node]))
+                    break
+            else:
+                # Not declared yet, left for the runtime to complain about
+                result_ast.append(node)
+
+        else:
+            result_ast.append(node)
+
+    return result_ast
+
+
+def frame_size(body: list[LispValue]) -> int:
+    """Number of slots needed by the frame running `body`, a program or a function's parameter list and body
+    after `resolve_lexical_addresses`. Nested function definitions have frames of their own"""
+    size = 0
+    pending = list(body)
+    while pending:
+        node = pending.pop()
+        if isinstance(node, LispAddress):
+            if node.depth == 0:
+                size = max(size, node.index + 1)
+        elif isinstance(node, LispNonEmptyList):
+            if isinstance(node.first, LispSymbol) and node.first.symbolName == "defun":
+                continue
+            pending.extend(node.to_python_list())
+    return size
+
+
+def reject_lexical_addresses(ast: Iterable[LispValue], engine: str) -> None:
+    """Raises if `ast` went through `resolve_lexical_addresses`, which only the closure engine runs"""
+    if is_lexically_addressed(list(ast)):
+        raise Exception(
+            f"the {engine} engine can't run lexically addressed programs, only the closure engine does")
+
+
+def is_lexically_addressed(body: list[LispValue]) -> bool:
+    """Whether `body` uses any variable resolved by `resolve_lexical_addresses`, including in nested functions"""
+    pending = list(body)
+    while pending:
+        node = pending.pop()
+        if isinstance(node, LispAddress):
+            return True
+        if isinstance(node, LispNonEmptyList):
+            pending.extend(node.to_python_list())
+    return False
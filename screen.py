@@ -1,15 +1,128 @@
+import asyncio
+import sys
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import IO, AsyncIterator, Sequence
+
+
+class Sink(ABC):
+    """Where a `Screen` writes the lines printed by a program"""
+
+    @abstractmethod
+    def write_lines(self, lines: Sequence[str]) -> None:
+        ...
+
+    def flush(self) -> None:
+        pass
+
+
+class ListSink(Sink):
+    """Keeps every line in memory, joining them only when the contents are asked for"""
+
+    def __init__(self) -> None:
+        self.lines: list[str] = []
+
+    def write_lines(self, lines: Sequence[str]) -> None:
+        self.lines.extend(lines)
+
+    def contents(self) -> str:
+        return "".join(line + "\n" for line in self.lines)
+
+
+class FileSink(Sink):
+    """Writes to a text file (standard output when None) once `flush_lines` lines are buffered, or when
+    flushed. Use it as a context manager to flush what is left at the end"""
+
+    def __init__(self, file: IO[str] | None = None, flush_lines: int = 1024) -> None:
+        self.file = file
+        self.flush_lines = flush_lines
+        self.buffer: list[str] = []
+
+    def write_lines(self, lines: Sequence[str]) -> None:
+        self.buffer.extend(lines)
+        if len(self.buffer) >= self.flush_lines:
+            self.write_buffer()
+
+    def write_buffer(self) -> None:
+        file = self.file if self.file is not None else sys.stdout
+        file.write("".join(line + "\n" for line in self.buffer))
+        self.buffer.clear()
+
+    def flush(self) -> None:
+        self.write_buffer()
+        (self.file if self.file is not None else sys.stdout).flush()
+
+    def __enter__(self) -> 'FileSink':
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.flush()
+
+
+class RingSink(Sink):
+    """Keeps only the last `capacity` lines"""
+
+    def __init__(self, capacity: int) -> None:
+        self.lines: deque[str] = deque(maxlen=capacity)
+
+    def write_lines(self, lines: Sequence[str]) -> None:
+        self.lines.extend(lines)
+
+    def contents(self) -> str:
+        return "".join(line + "\n" for line in self.lines)
+
+
 class Screen():
+    """Output of a program, written to `sink`, standard output by default"""
+
+    def __init__(self, sink: Sink | None = None) -> None:
+        # Writing right away keeps the output interleaved with anything else printed to standard output
+        self.sink = sink if sink is not None else FileSink(None, 1)
+
     def print(self, contents: str) -> None:
-        print(contents)
+        self.sink.write_lines((contents,))
+
+    def print_lines(self, lines: Sequence[str]) -> None:
+        """Prints several lines with a single write. Screens that only override `print` still get every line"""
+        if type(self).print is not Screen.print:
+            for line in lines:
+                self.print(line)
+        else:
+            self.sink.write_lines(lines)
+
+    def flush(self) -> None:
+        self.sink.flush()
+
+
+class BufferScreen(Screen):
+    """Keeps the printed lines in memory"""
 
+    def __init__(self) -> None:
+        self.lines = ListSink()
+        super().__init__(self.lines)
+
+    def get_contents(self) -> str:
+        return self.lines.contents()
+
+
+class TestScreen(BufferScreen):
+    """The screen used by the tests"""
+
+
+class AsyncScreen(Screen):
+    """Exposes printed lines as an async stream: `async for line in screen`, which ends once the
+    screen is closed. Lines are queued, so printing never blocks the program"""
 
-class TestScreen(Screen):
     def __init__(self) -> None:
         super().__init__()
-        self.contents = ""
+        self.queue: asyncio.Queue[str | None] = asyncio.Queue()
 
-    def print(self, contents: str):
-        self.contents += contents + "\n"
+    def print(self, contents: str) -> None:
+        self.queue.put_nowait(contents)
 
-    def get_contents(self) -> str:
-        return self.contents
+    def close(self) -> None:
+        self.queue.put_nowait(None)
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        while (line := await self.queue.get()) is not None:
+            yield line
@@ -0,0 +1,70 @@
+from array import array
+from bisect import bisect_right
+
+
+class Source():
+    """A program being parsed: its name (if it came from a file) and an index of where each line starts,
+    so positions are turned into line and character with a binary search"""
+    __slots__ = ("name", "line_starts")
+
+    def __init__(self, name: str | None = None, text: str = "") -> None:
+        self.name = name
+        self.line_starts = array("q", [0])
+        self.add_text(text, 0, len(text), 0)
+
+    def add_text(self, text: str, start: int, end: int, offset: int):
+        """Indexes the lines of `text[start:end]`, which begins at position `offset` of the source"""
+        position = text.find("\n", start, end)
+        while position != -1:
+            self.line_starts.append(offset + position - start + 1)
+            position = text.find("\n", position + 1, end)
+
+    def location(self, position: int) -> tuple[int, int]:
+        line = bisect_right(self.line_starts, position)
+        return line, position - self.line_starts[line - 1] + 1
+
+    def describe(self, position: int) -> str:
+        line, char = self.location(position)
+        if self.name is None:
+            return f"line {line}, character {char}"
+        return f"{self.name}, line {line}, character {char}"
+
+    def error(self, position: int, exception: Exception | str) -> Exception:
+        return Exception(f"{self.describe(position)}: {exception}")
+
+
+class Span():
+    """Where a parsed list starts and ends in its source"""
+    __slots__ = ("source", "start", "end")
+
+    def __init__(self, source: Source, start: int, end: int) -> None:
+        self.source = source
+        self.start = start
+        self.end = end
+
+    def __str__(self) -> str:
+        return self.source.describe(self.start)
+
+    def __repr__(self) -> str:
+        return f"Span({self.start}, {self.end})"
+
+
+class LispError(Exception):
+    """An error raised while evaluating an expression, located at the innermost list with a known span.
+    Errors that aren't about a particular expression have no span"""
+
+    def __init__(self, message: str, span: Span | None) -> None:
+        super().__init__(message if span is None else f"{span}: {message}")
+        self.message = message
+        self.span = span
+
+
+def located(error: Exception, span: Span | None) -> Exception:
+    """`error` as a `LispError` with the location of `span`, unless it has a location already.
+    Only errors raised by the interpreters, plain `Exception`s, are located: Python errors such as
+    `OSError` or `RecursionError` aren't about the program and are left as they are"""
+    if type(error) is Exception:
+        return LispError(str(error), span)
+    if type(error) is LispError and error.span is None and span is not None:
+        return LispError(error.message, span)
+    return error
@@ -0,0 +1,246 @@
+from typing import Sequence, cast
+from lisptypes import LispEmptyList, LispFunction, LispList, LispNonEmptyList, LispNumber, LispSymbol, LispValue
+from primitives import ARITHMETIC, ARITHMETIC_OPERATIONS, arity_error, cons, divide, number_operand
+from scope import Scope, SymbolType, reject_lexical_addresses
+from screen import Screen
+from source import located
+from vectors import VECTOR_BUILTINS, Builtin
+
+# Work items of the explicit-stack evaluator, each one a tuple (opcode, node, data).
+# `node` is the list being evaluated that the item belongs to, used to locate errors
+
+EVAL = 0        # evaluate `node`, pushing its value
+DROP = 1        # discard the top value (all but the last expression of a body)
+CHECK = 2       # the top value must be a number, replaced by its int, `data` is the operation name
+ARITH = 3       # combine the `data` = (operator, count) ints on top
+DIVIDE = 4      # divide the two values on top
+CONS = 5        # cons the two values on top
+LIST = 6        # build a list from the `data` values on top
+PRINT = 7       # print the top value, leaving nothing
+LET = 8         # create the symbol `data` with the top value, leaving it
+ASSIGN = 9      # set the symbol `data` to the top value, leaving it
+BIND = 10       # bind the parameter `data` to the top value, leaving nothing
+END_BLOCK = 11  # end `data` blocks of the scope, leaving the top value in place
+BUILTIN = 12    # apply the vector builtin `data` = (function, count) to the values on top
+
+# `data` of every opcode: the operation name of CHECK, (operator, count) of ARITH, counts of LIST and
+# END_BLOCK, symbols of LET, ASSIGN and BIND, (function, count) of BUILTIN
+WorkData = str | int | LispSymbol | tuple[str, int] | tuple[Builtin, int] | None
+WorkItem = tuple[int, LispValue | None, WorkData]
+
+
+def eval_stack(ast: list[LispValue], scope: Scope, screen: Screen) -> LispValue:
+    """Evaluates a program with the semantics of `interpreter.eval`, keeping pending work on explicit
+    stacks instead of Python frames, so deep programs run in constant Python stack space.
+
+    A call in tail position (the last expression of a function body) adds no work item: the block of
+    the caller is ended together with the block of the callee. Blocks themselves still nest in `scope`,
+    since callees can see the variables of their callers"""
+    reject_lexical_addresses(ast, "stack")
+    work, values = start(ast)
+    run(work, values, scope, screen)
+    return values[-1]
+
+
+def start(ast: list[LispValue]) -> tuple[list[WorkItem], list[LispValue]]:
+    """The work and value stacks to evaluate a program with `run`"""
+    if len(ast) == 0:
+        raise Exception("can't evaluate an empty program")
+    work: list[WorkItem] = []
+    push_body(work, ast)
+    return work, []
+
+
+def run(work: list[WorkItem], values: list[LispValue], scope: Scope, screen: Screen, steps: int = -1) -> bool:
+    """Runs at most `steps` work items (all of them if negative), returning whether the program is done.
+    Once it is, its value is the last one of `values`"""
+    item: WorkItem = (EVAL, LispEmptyList(), None)
+    try:
+        while work and steps != 0:
+            steps -= 1
+            item = work.pop()
+            opcode, node, data = item
+            if opcode == EVAL:
+                if isinstance(node, LispNonEmptyList):
+                    expand_application(node, work, values, scope)
+                elif isinstance(node, LispSymbol):
+                    value = scope.read_symbol(node)
+                    if value is None:
+                        raise Exception(f"unknown symbol {node}")
+                    values.append(value)
+                elif isinstance(node, (LispNumber, LispEmptyList)):
+                    values.append(node)
+                else:
+                    raise Exception(f"unexpected value {node}")
+
+            elif opcode == DROP:
+                values.pop()
+
+            elif opcode == CHECK:
+                # The int only stays on the value stack until ARITH combines it
+                values.append(cast(LispValue, number_operand(cast(str, data), values.pop())))
+
+            elif opcode == ARITH:
+                operator, count = cast(tuple[str, int], data)
+                operators = cast(list[int], values[len(values) - count:])
+                del values[len(values) - count:]
+                values.append(ARITHMETIC[operator](operators))
+
+            elif opcode == DIVIDE:
+                divisor = values.pop()
+                values.append(divide(values.pop(), divisor))
+
+            elif opcode == CONS:
+                rest = values.pop()
+                values.append(cons(values.pop(), rest))
+
+            elif opcode == LIST:
+                count = cast(int, data)
+                items = values[len(values) - count:]
+                del values[len(values) - count:]
+                values.append(LispList.from_list(items))
+
+            elif opcode == PRINT:
+                screen.print(str(values.pop()))
+
+            elif opcode == LET:
+                scope.create_symbol(cast(LispSymbol, data), values[-1], SymbolType.VARIABLE)
+
+            elif opcode == ASSIGN:
+                scope.set_symbol(cast(LispSymbol, data), values[-1], SymbolType.VARIABLE)
+
+            elif opcode == BIND:
+                scope.create_symbol(cast(LispSymbol, data), values.pop(), SymbolType.VARIABLE)
+
+            elif opcode == END_BLOCK:
+                for _ in range(cast(int, data)):
+                    scope.end_block()
+
+            elif opcode == BUILTIN:
+                function, count = cast(tuple[Builtin, int], data)
+                args = values[len(values) - count:]
+                del values[len(values) - count:]
+                values.append(function(args))
+
+    except Exception as error:
+        raise located(error, innermost_span(item, work))
+
+    return not work
+
+
+def innermost_span(item: WorkItem, work: list[WorkItem]):
+    """Span of the innermost list being evaluated when `item` failed. Pending EVAL items haven't started yet"""
+    if isinstance(item[1], LispNonEmptyList):
+        return item[1].span
+    for opcode, node, _ in reversed(work):
+        if opcode != EVAL and isinstance(node, LispNonEmptyList):
+            return node.span
+    return None
+
+
+def push_body(work: list[WorkItem], body: Sequence[LispValue]):
+    """Evaluates every expression of `body` in order, leaving the value of the last one"""
+    work.append((EVAL, body[-1], None))
+    for expr in reversed(body[:-1]):
+        work.append((DROP, None, None))
+        work.append((EVAL, expr, None))
+
+
+def push_arguments(work: list[WorkItem], args: list[LispValue], after: WorkItem | None = None):
+    """Evaluates `args` in order, pushing `after` once each of them is done"""
+    for arg in reversed(args):
+        if after is not None:
+            work.append(after)
+        work.append((EVAL, arg, None))
+
+
+def expand_application(node: LispNonEmptyList, work: list[WorkItem], values: list[LispValue], scope: Scope):
+    name = node.first
+    if not isinstance(name, LispSymbol):
+        raise Exception(
+            f"can't perform function application using '{name}' as a function")
+    args = node.rest.to_python_list()
+
+    match name.symbolName:
+        case "+" | "-" | "*":
+            work.append((ARITH, node, (name.symbolName, len(args))))
+            push_arguments(work, args, (CHECK, node, ARITHMETIC_OPERATIONS[name.symbolName]))
+
+        case "/":
+            if len(args) != 2:
+                raise arity_error("division", "two", args)
+            work.append((DIVIDE, node, None))
+            push_arguments(work, args)
+
+        case "defun":
+            # Not dealing with duplicated function names
+            if len(args) < 3:
+                raise Exception(
+                    f"function definition expects at least three arguments (foo_name, arguments, body), given {args}")
+
+            [foo_name, *foo_body] = args
+            if not isinstance(foo_name, LispSymbol):
+                raise Exception(
+                    f"function name must be a symbol, given {foo_name}")
+
+            scope.create_symbol(foo_name, LispFunction(foo_name, LispList.from_list(
+                foo_body)), SymbolType.FUNCTION)
+            values.append(LispEmptyList())
+
+        case "let" | "=":
+            if len(args) != 2:
+                raise arity_error(name.symbolName, "two", args)
+            [symbol, value] = args
+            if not isinstance(symbol, LispSymbol):
+                raise Exception(
+                    f"can't perform attribution using '{symbol}' as a variable")
+            work.append((LET if name.symbolName == "let" else ASSIGN, node, symbol))
+            work.append((EVAL, value, None))
+
+        case "cons":
+            if len(args) != 2:
+                raise arity_error("cons", "two", args)
+            work.append((CONS, node, None))
+            push_arguments(work, args)
+
+        case "list":
+            work.append((LIST, node, len(args)))
+            push_arguments(work, args)
+
+        case "print":
+            work.append((EVAL, LispEmptyList(), None))
+            push_arguments(work, args, (PRINT, node, None))
+
+        case builtin if builtin in VECTOR_BUILTINS:
+            work.append((BUILTIN, node, (VECTOR_BUILTINS[builtin], len(args))))
+            push_arguments(work, args)
+
+        case _:
+            expand_call(node, name, args, work, scope)
+
+
+def expand_call(node: LispNonEmptyList, name: LispSymbol, given_args: list[LispValue], work: list[WorkItem], scope: Scope):
+    foo = scope.read_symbol(name)
+    scope.begin_block(name.symbolName)
+
+    if not isinstance(foo, LispFunction):
+        raise Exception(
+            f"Function {name} not defined")
+
+    # Check if user passed the needed number of parameters
+    if foo.arity != len(given_args):
+        raise Exception(
+            f"{name} expects {foo.arity} arguments, were given {len(given_args)}")
+
+    # A call in tail position shares the END_BLOCK of its caller
+    if work and work[-1][0] == END_BLOCK:
+        blocks = cast(int, work.pop()[2])
+        work.append((END_BLOCK, None, blocks + 1))
+    else:
+        work.append((END_BLOCK, None, 1))
+    push_body(work, foo.body)
+
+    # Each argument is bound as soon as it is evaluated, so later arguments already see it
+    for param, arg in reversed(list(zip(foo.params, given_args))):
+        work.append((BIND, node, param))
+        work.append((EVAL, arg, None))
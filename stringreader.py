@@ -1,48 +1,61 @@
+import re
+from typing import cast
+from source import Source
+
+# Whitespace and delimiters are the same ones the reader has always used: ' ', '\t', '\n', '(' and ')'.
+# A number is an optional minus sign followed by digits, anything else up to a delimiter is a word
+WHITESPACE = re.compile(r"[ \t\n]*")
+NUMBER = re.compile(r"-?[0-9]+")
+WORD = re.compile(r"[^ \t\n()]+")
+
+# Token kinds, the group of `TOKEN` that matched
+OPEN = 1
+CLOSE = 2
+NUMBER_TOKEN = 3
+WORD_TOKEN = 4
+TOKEN = re.compile(r"[ \t\n]*(?:(\()|(\))|(-?[0-9]+)|([^ \t\n()]+))")
+
+
 class StringReader():
     def __init__(self, string: str) -> None:
         self.string = string
         self.position = 0
         self.end = len(string)
+        # Line index, only built if an error has to be reported
+        self.source: Source | None = None
 
     def next_number(self) -> int | None:
-        signal = 1
-        value = 0
-        found_at_least_one_digit = False
-
-        if self.compare_advance('-'):
-            signal = -1
-        while True:
-            char = self.peek()
-            if char in ["0", "1", "2", "3", "4", "5", "6", "7", "8", "9"]:
-                found_at_least_one_digit = True
-                value = value*10 + int(char)
-                self.advance()
-            else:
-                break
-
-        if not found_at_least_one_digit:
-            if signal == -1:  # Give back the minus sign
-                self.retreat()
+        match = NUMBER.match(self.string, self.position, self.end)
+        if match is None:
             return None
 
-        return value * signal
+        self.position = match.end()
+        return int(match.group())
 
     def next_word(self) -> str | None:
-        word = ''
-        while True:
-            match self.peek():
-                case " " | "(" | ")" | "\n" | "\t":
-                    return None if word == '' else word
-
-                case character:
-                    if character is None:
-                        return None if word == '' else word
-                    self.advance()
-                    word += character
+        match = WORD.match(self.string, self.position, self.end)
+        if match is None:
+            return None
+
+        self.position = match.end()
+        return match.group()
+
+    def next_token(self) -> tuple[int, str] | None:
+        """Skips whitespace and reads the next whole token, returning its kind (`OPEN`, `CLOSE`,
+        `NUMBER_TOKEN` or `WORD_TOKEN`) and text, or None at the end of the string"""
+        match = TOKEN.match(self.string, self.position, self.end)
+        if match is None:
+            self.position = self.end
+            return None
+
+        self.position = match.end()
+        # Exactly one of the groups of `TOKEN` matched
+        kind = cast(int, match.lastindex)
+        return kind, match.group(kind)
 
     def skip_whitespaces(self):
-        while self.size() > 0 and self.peek() in [' ', '\t', '\n']:
-            self.advance()
+        # `WHITESPACE` matches the empty string, so it always matches
+        self.position = cast(re.Match[str], WHITESPACE.match(self.string, self.position, self.end)).end()
 
     def peek(self) -> str | None:
         if self.size() <= 0:
@@ -70,14 +83,6 @@ class StringReader():
         return self.end - self.position
 
     def with_location(self, exception: Exception) -> Exception:
-        line = 1
-        char = 1
-
-        for token in self.string[:self.position]:
-            if token == '\n':
-                line += 1
-                char = 1
-            else:
-                char += 1
-
-        return Exception(f"line {line}, character {char}: {exception}")
+        if self.source is None:
+            self.source = Source(None, self.string)
+        return self.source.error(self.position, exception)
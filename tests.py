@@ -1,9 +1,40 @@
+import asyncio
+import astcache
+import contextlib
+import gc
+import io
+import math
+import mmap
+import os
+import tempfile
 import unittest
-from interpreter import eval
-from lisptypes import LispEmptyList, LispList, LispNumber, LispSymbol
-from parser import parse
-from scope import Scope, bind_to_static_scope
-from screen import Screen, TestScreen
+import warnings
+from typing import cast
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+from astcache import ASTCache, deserialize, serialize
+from asynceval import eval_async
+from batch import find_sources, run_batch
+from cli import Session, main, repl
+from compiler import eval_compiled
+from engines import ENGINES, evaluate
+from environment import PersistentScope
+from hamt import HAMT
+from interpreter import Interpreter, eval, eval_stream
+from limits import LimitedInterpreter, Limits, QuotaExceeded, eval_limited
+from lisptypes import LispAddress, LispEmptyList, LispFunction, LispList, LispNonEmptyList, LispNumber, LispSymbol, LispValue
+from memo import MemoizingInterpreter
+from optimizer import optimize
+from parser import parse, parse_single_expression, parse_stream
+from profiler import Profiler, profile
+from scope import DeepScope, Scope, SymbolType, bind_stream_to_static_scope, bind_to_static_scope, resolve_lexical_addresses
+from screen import AsyncScreen, BufferScreen, FileSink, ListSink, RingSink, Screen, TestScreen
+from stackeval import eval_stack
+from source import LispError, Source
+from stringreader import StringReader
+from tracing import CALL, DEFINE, ENTER, LEAVE, OUTPUT, RETURN, BIND, START, RecordingTracer, load, replay
+from vectors import LispVector, numpy
+from vm import compile_program, disassemble, eval_vm, run
 
 
 class ParserTests(unittest.TestCase):
@@ -66,6 +97,39 @@ class ParserTests(unittest.TestCase):
         ast = parse(program)[0]
         self.assertEqual(ast, LispEmptyList())
 
+    def test_tokens(self):
+        self.assertEqual(parse("-5abc --5 a-5 - 007"), [
+            LispNumber(-5),
+            LispSymbol("abc"),
+            LispSymbol("--5"),
+            LispSymbol("a-5"),
+            LispSymbol("-"),
+            LispNumber(7),
+        ])
+
+    def test_reader_parses_one_expression_at_a_time(self):
+        reader = StringReader("(a (b 1))\n  c")
+        self.assertEqual(parse_single_expression(reader), parse("(a (b 1))")[0])
+        self.assertEqual(parse_single_expression(reader), LispSymbol("c"))
+
+    def test_error_locations(self):
+        for program, message in [
+            ("(a", "line 1, character 3: expected ')'"),
+            ("(a))", "line 1, character 4: unexpected ')'"),
+            ("(\n  (b c)\n  d e", "line 3, character 6: expected ')'"),
+        ]:
+            with self.assertRaises(Exception) as raised:
+                parse(program)
+            self.assertEqual(str(raised.exception), message)
+
+    def test_deeply_nested(self):
+        depth = 50_000
+        ast = parse("(" * depth + ")" * depth)[0]
+        for _ in range(depth - 1):
+            assert isinstance(ast, LispNonEmptyList)
+            ast = ast.first
+        self.assertEqual(ast, LispEmptyList())
+
 
 class InterpreterTests(unittest.TestCase):
     def test_list_is_created(self):
@@ -185,6 +249,1347 @@ class InterpreterTests(unittest.TestCase):
         self.assertEqual(result, LispNumber(4))
 
 
+class LispTypesTests(unittest.TestCase):
+    def test_symbols_are_interned(self):
+        self.assertIs(LispSymbol("x"), LispSymbol("x"))
+        self.assertEqual(LispSymbol("x"), LispSymbol("x"))
+        self.assertNotEqual(LispSymbol("x"), LispSymbol("y"))
+        self.assertIs(parse("x")[0], LispSymbol("x"))
+
+    def test_unused_symbols_are_freed(self):
+        before = len(LispSymbol.interned)
+        names = [str(LispSymbol(f"unused_{i}")) for i in range(1000)]
+        gc.collect()
+        self.assertLessEqual(len(LispSymbol.interned), before)
+        self.assertIs(LispSymbol(names[0]), LispSymbol(names[0]))
+
+    def test_small_numbers_are_cached(self):
+        self.assertIs(LispNumber(7), LispNumber(7))
+        self.assertIs(LispNumber(LispNumber.SMALL_MIN), parse(str(LispNumber.SMALL_MIN))[0])
+        self.assertEqual(LispNumber(10**6), LispNumber(10**6))
+        self.assertEqual(LispNumber(10**6).numberValue, 10**6)
+
+    def test_list_indexing_and_length(self):
+        numbers = LispList.from_list([LispNumber(i) for i in range(10)])
+        assert isinstance(numbers, LispNonEmptyList)
+        self.assertEqual(len(numbers), 10)
+        self.assertEqual(numbers[3], LispNumber(3))
+        self.assertEqual(numbers[-1], LispNumber(9))
+        with self.assertRaises(IndexError):
+            numbers[10]
+
+    def test_rest_and_cons_share_items(self):
+        numbers = LispList.from_list([LispNumber(i) for i in range(3)])
+        assert isinstance(numbers, LispNonEmptyList)
+        rest = numbers.rest
+        assert isinstance(rest, LispNonEmptyList)
+        self.assertIs(rest.items, numbers.items)
+        self.assertEqual(rest, LispList.from_list([LispNumber(1), LispNumber(2)]))
+
+        consed = LispNonEmptyList(LispNumber(-1), numbers)
+        self.assertIs(consed.rest, numbers)
+        self.assertEqual(len(consed), 4)
+        self.assertEqual(consed[3], LispNumber(2))
+        self.assertEqual(consed, LispList.from_list([LispNumber(i) for i in range(-1, 3)]))
+        self.assertEqual(str(consed), "(-1 0 1 2)")
+
+    def test_indexing_a_consed_list_joins_its_runs(self):
+        numbers = LispList.from_list([LispNumber(i) for i in range(3)])
+        consed = LispNonEmptyList(LispNumber(-2), LispNonEmptyList(LispNumber(-1), numbers))
+        self.assertEqual(consed[3], LispNumber(1))
+        self.assertEqual(consed.joined, tuple(LispNumber(i) for i in range(-2, 3)))
+        self.assertEqual(consed[-1], LispNumber(2))
+        # Its own runs are left as they were, for readers that are still walking them
+        self.assertEqual((consed.items, consed.start), ((LispNumber(-2),), 0))
+        # The lists it was built from keep their runs
+        self.assertEqual(numbers.to_python_list(), [LispNumber(i) for i in range(3)])
+
+    def test_lists_are_not_hashable(self):
+        with self.assertRaises(TypeError):
+            hash(LispList.from_list([LispNumber(1)]))
+        self.assertEqual(hash(LispEmptyList()), hash(LispEmptyList()))
+
+    def test_long_lists_do_not_recurse(self):
+        count = 100_000
+        numbers = LispList.from_list([LispNumber(i) for i in range(count)])
+        consed: LispList = LispEmptyList()
+        for i in reversed(range(count)):
+            consed = LispNonEmptyList(LispNumber(i), consed)
+
+        self.assertEqual(numbers, consed)
+        self.assertEqual(str(numbers), str(consed))
+        self.assertEqual(consed.to_python_list(), numbers.to_python_list())
+
+        result = eval(parse("(list " + " ".join(map(str, range(count))) + ")"), Scope(), Screen())
+        self.assertEqual(result, numbers)
+
+    def test_values_have_no_dict(self):
+        for value in [LispSymbol("x"), LispNumber(10**6), LispEmptyList(), LispList.from_list([LispNumber(1)])]:
+            self.assertFalse(hasattr(value, "__dict__"))
+
+    def test_functions_are_checked_once(self):
+        [definition] = parse("((a b) (print a) (+ a b))")
+        assert isinstance(definition, LispList)
+        function = LispFunction(LispSymbol("f"), definition)
+        self.assertEqual(function.params, (LispSymbol("a"), LispSymbol("b")))
+        self.assertEqual(function.arity, 2)
+        self.assertEqual(len(function.body), 2)
+        self.assertEqual(str(function), "((a b) (print a) (+ a b))")
+        self.assertFalse(hasattr(function, "__dict__"))
+
+        scope = Scope()
+        eval(parse("(defun f (a b) (+ a b))"), scope, Screen())
+        self.assertIsInstance(scope.read_symbol(LispSymbol("f")), LispFunction)
+        with self.assertRaisesRegex(Exception, "Bad argument 1 from function g"):
+            LispFunction(LispSymbol("g"), LispList.from_list(parse("(a 1) a")))
+
+
+class ScopeTests(unittest.TestCase):
+    def test_inner_block_shadows_and_restores(self):
+        for scope in [Scope(), DeepScope(), PersistentScope()]:
+            x = LispSymbol("x")
+            scope.create_symbol(x, LispNumber(1), SymbolType.VARIABLE)
+            scope.begin_block("foo")
+            scope.create_symbol(x, LispNumber(2), SymbolType.VARIABLE)
+            self.assertEqual(scope.read_symbol(x), LispNumber(2))
+            scope.end_block()
+            self.assertEqual(scope.read_symbol(x), LispNumber(1))
+
+    def test_set_symbol_changes_most_specific_binding(self):
+        for scope in [Scope(), DeepScope(), PersistentScope()]:
+            x = LispSymbol("x")
+            scope.create_symbol(x, LispNumber(1), SymbolType.VARIABLE)
+            scope.begin_block("foo")
+            scope.create_symbol(x, LispNumber(2), SymbolType.VARIABLE)
+            scope.set_symbol(x, LispNumber(3), SymbolType.VARIABLE)
+            scope.end_block()
+            self.assertEqual(scope.read_symbol(x), LispNumber(1))
+            scope.set_symbol(x, LispNumber(4), SymbolType.VARIABLE)
+            self.assertEqual(scope.read_symbol(x), LispNumber(4))
+
+    def test_unknown_symbol(self):
+        for scope in [Scope(), DeepScope(), PersistentScope()]:
+            self.assertIsNone(scope.read_symbol(LispSymbol("x")))
+            scope.begin_block("foo")
+            scope.create_symbol(LispSymbol("x"), LispNumber(1), SymbolType.VARIABLE)
+            scope.end_block()
+            self.assertIsNone(scope.read_symbol(LispSymbol("x")))
+            with self.assertRaises(Exception):
+                scope.set_symbol(LispSymbol("x"), LispNumber(1), SymbolType.VARIABLE)
+
+    def test_rollback_forgets_what_was_created_since_the_mark(self):
+        x, y, z = LispSymbol("x"), LispSymbol("y"), LispSymbol("z")
+        for scope in [Scope(), DeepScope(), PersistentScope()]:
+            scope.create_symbol(x, LispNumber(1), SymbolType.VARIABLE)
+            scope.create_symbol(y, LispNumber(2), SymbolType.VARIABLE)
+            before = str(scope)
+            mark = scope.mark()
+            scope.create_symbol(x, LispNumber(3), SymbolType.VARIABLE)
+            scope.create_symbol(z, LispNumber(4), SymbolType.VARIABLE)
+            scope.begin_block("f")
+            scope.create_symbol(y, LispNumber(5), SymbolType.VARIABLE)
+            scope.rollback(mark)
+            self.assertEqual([scope.read_symbol(symbol) for symbol in [x, y, z]], [LispNumber(1), LispNumber(2), None])
+            self.assertEqual((str(scope), list(scope.names)), (before, ["global"]))
+
+            scope.set_symbol(y, LispNumber(6), SymbolType.VARIABLE)
+            scope.rollback(scope.mark())
+            self.assertEqual(scope.read_symbol(y), LispNumber(6))
+
+    def test_shallow_and_deep_print_the_same(self):
+        shallow, deep, persistent = Scope(), DeepScope(), PersistentScope()
+        for scope in [shallow, deep, persistent]:
+            scope.create_symbol(LispSymbol("x"), LispNumber(1), SymbolType.VARIABLE)
+            scope.create_symbol(LispSymbol("f"), LispEmptyList(), SymbolType.FUNCTION)
+            scope.begin_block("f")
+            scope.create_symbol(LispSymbol("y"), LispNumber(2), SymbolType.VARIABLE)
+            scope.create_symbol(LispSymbol("x"), LispNumber(3), SymbolType.VARIABLE)
+            scope.set_symbol(LispSymbol("x"), LispNumber(4), SymbolType.VARIABLE)
+        self.assertEqual(str(shallow), str(deep))
+        self.assertEqual(str(persistent), str(shallow))
+
+    def test_dynamic_scope_with_deep_binding(self):
+        with open("example.lisp") as f:
+            program = f.read()
+
+        screen = TestScreen()
+        eval(parse(program), DeepScope(), screen, program)
+        self.assertEqual(screen.get_contents(), "1\n3\n5\n8\n")
+
+
+class CollidingKey():
+    """Keys that all have the same hash"""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __eq__(self, value: object) -> bool:
+        return isinstance(value, CollidingKey) and value.name == self.name
+
+    def __hash__(self) -> int:
+        return 42
+
+
+class PersistentScopeTests(unittest.TestCase):
+    def test_hamt(self):
+        versions = [HAMT()]
+        for i in range(2000):
+            versions.append(versions[-1].set(f"k{i}", i))
+        for count in [0, 1, 33, 2000]:
+            version = versions[count]
+            self.assertEqual(len(version), count)
+            self.assertEqual(sorted(value for _, value in version.items()), list(range(count)))
+            self.assertEqual(version.get("k0"), 0 if count else None)
+            self.assertNotIn(f"k{count}", version)
+
+        updated = versions[-1].set("k7", "seven")
+        self.assertEqual((updated.get("k7"), versions[-1].get("k7")), ("seven", 7))
+        self.assertEqual(len(updated), 2000)
+        self.assertIs(updated.set("k7", updated.get("k7")), updated)
+
+    def test_hamt_collisions(self):
+        keys = [CollidingKey(name) for name in "abc"]
+        first = HAMT().set(keys[0], 0).set(keys[1], 1)
+        second = first.set(keys[2], 2).set(keys[0], 10)
+        self.assertEqual([first.get(key) for key in keys], [0, 1, None])
+        self.assertEqual([second.get(key) for key in keys], [10, 1, 2])
+        self.assertEqual(len(second), 3)
+
+        third = second.delete(keys[1]).delete(keys[2])
+        self.assertEqual([third.get(key) for key in keys], [10, None, None])
+        self.assertEqual((len(third), list(third.items())), (1, [(keys[0], 10)]))
+
+    def test_hamt_delete(self):
+        full = HAMT()
+        for i in range(2000):
+            full = full.set(f"k{i}", i)
+        version = full
+        for i in range(0, 2000, 2):
+            version = version.delete(f"k{i}")
+        self.assertEqual(len(version), 1000)
+        self.assertEqual(sorted(value for _, value in version.items()), list(range(1, 2000, 2)))
+        self.assertEqual((version.get("k0"), version.get("k1"), full.get("k0")), (None, 1, 0))
+        self.assertIs(version.delete("k0"), version)
+
+        for i in range(1, 2000, 2):
+            version = version.delete(f"k{i}")
+        self.assertEqual((len(version), list(version.items())), (0, []))
+        self.assertIs(version.root, HAMT().root)
+
+    def test_snapshots_are_unaffected_by_later_changes(self):
+        scope = PersistentScope()
+        x, y = LispSymbol("x"), LispSymbol("y")
+        scope.create_symbol(x, LispNumber(1), SymbolType.VARIABLE)
+        before = scope.snapshot()
+        before_text = str(scope)
+
+        scope.begin_block("f")
+        scope.create_symbol(y, LispNumber(2), SymbolType.VARIABLE)
+        scope.set_symbol(x, LispNumber(3), SymbolType.VARIABLE)
+        inside = scope.snapshot()
+        self.assertEqual(list(scope.names), ["global", "f"])
+
+        scope.restore(before)
+        self.assertEqual((scope.read_symbol(x), scope.read_symbol(y)), (LispNumber(1), None))
+        self.assertEqual((str(scope), list(scope.names)), (before_text, ["global"]))
+        scope.restore(inside)
+        self.assertEqual((len(scope.names), scope.names[-1]), (2, "f"))
+        scope.end_block()
+        self.assertEqual((scope.read_symbol(x), scope.read_symbol(y)), (LispNumber(3), None))
+        self.assertNotIn("y", scope.environment.bindings)
+        self.assertEqual(len(scope.environment.bindings), len(before.bindings))
+
+    def test_rollback_after_a_failed_script(self):
+        scope = PersistentScope()
+        eval(parse("(let x 1) (defun f () x)"), scope, Screen())
+        snapshot = scope.snapshot()
+        with self.assertRaises(Exception):
+            eval(parse("(= x 2) (defun g (n) (h n)) (g 1)"), scope, Screen())
+        self.assertEqual(scope.read_symbol(LispSymbol("x")), LispNumber(2))
+
+        scope.restore(snapshot)
+        self.assertEqual((scope.read_symbol(LispSymbol("g")), list(scope.names)), (None, ["global"]))
+        self.assertEqual(eval(parse("(f)"), scope, Screen()), LispNumber(1))
+
+    def test_engines_run_on_persistent_scopes(self):
+        with open("example.lisp") as f:
+            program = f.read()
+        for engine in ENGINES:
+            for static in [False, True]:
+                with self.subTest(engine=engine, static=static):
+                    ast = parse(program)
+                    if static:
+                        ast = bind_to_static_scope(ast, Scope())
+                    screen = TestScreen()
+                    evaluate(ast, PersistentScope(), screen, engine)
+                    self.assertEqual(screen.get_contents(), "3\n11\n3\n11\n" if static else "1\n3\n5\n8\n")
+
+
+class EngineTests(unittest.TestCase):
+    programs = [
+        "(list 1 2 (list 3 4) 5 6)",
+        "(let x 5) (let y 6) (cons 1 (cons 2 (cons (cons 3 (cons 4 ())) (cons x (cons y ())))))",
+        "(+ (+ 3 5) (+ 1 8) 10) (- (- 20 1) 3 (- 13 9)) (* 1 2 3 4 5)",
+        "(/ (+ 10 20) (- 7 2))",
+        "(defun foo (x) (defun double () (+ x x)) (double)) (foo 7)",
+        "(let x 10) (let y 20) (= x y) x",
+        "(let x (+ 2 2)) (defun foo () (let x 10) (= x 11)) (foo) x",
+        "(defun f (a b) (print a b) (list a b)) (let a 3) (f 1 a)",
+    ]
+
+    def run_program(self, program: str, engine: str, static: bool = False) -> tuple[LispValue, str]:
+        ast = parse(program)
+        if static:
+            ast = bind_to_static_scope(ast, Scope())
+        screen = TestScreen()
+        result = evaluate(ast, Scope(), screen, engine)
+        return result, screen.get_contents()
+
+    def test_engines_agree_with_the_tree_walker(self):
+        for engine in ENGINES:
+            for program in self.programs:
+                with self.subTest(engine=engine, program=program):
+                    ast = parse(program)
+                    expected = eval(ast, Scope(), Screen())
+                    result, _ = self.run_program(program, engine)
+                    self.assertEqual(result, expected)
+
+    def test_engines_print_the_same(self):
+        with open("example.lisp") as f:
+            program = f.read()
+        for engine in ENGINES:
+            with self.subTest(engine=engine):
+                _, output = self.run_program(program, engine)
+                self.assertEqual(output, "1\n3\n5\n8\n")
+                _, output = self.run_program(program, engine, static=True)
+                self.assertEqual(output, "3\n11\n3\n11\n")
+
+    def test_engines_report_the_same_errors(self):
+        for engine in ENGINES:
+            for program in ["(/ 1 0)", "(+ 1 ())", "(foo 1)", "(defun f (x) x) (f)", "y", "(cons 1 2)", "(let 1 2)"]:
+                with self.subTest(engine=engine, program=program):
+                    with self.assertRaises(Exception) as expected:
+                        eval(parse(program), Scope(), Screen())
+                    with self.assertRaises(Exception) as raised:
+                        self.run_program(program, engine)
+                    self.assertEqual(str(raised.exception), str(expected.exception))
+
+    def test_malformed_functions_fail_when_defined(self):
+        for engine in ENGINES:
+            for program in ["(defun f x x) (print 1)", "(defun f (x 1) x) (print 1)"]:
+                with self.subTest(engine=engine, program=program):
+                    with self.assertRaises(Exception) as expected:
+                        eval(parse(program), Scope(), Screen())
+                    screen = TestScreen()
+                    with self.assertRaises(Exception) as raised:
+                        evaluate(parse(program), Scope(), screen, engine)
+                    self.assertEqual(str(raised.exception), str(expected.exception))
+                    self.assertIn("function f", str(raised.exception))
+                    self.assertEqual(screen.get_contents(), "")
+
+    def test_unknown_engine(self):
+        with self.assertRaises(Exception):
+            evaluate(parse("1"), Scope(), Screen(), "unknown")
+
+
+class LexicalAddressTests(unittest.TestCase):
+    def addressed(self, program: str) -> list[LispValue]:
+        return resolve_lexical_addresses(bind_to_static_scope(parse(program), Scope()))
+
+    def test_addresses_are_resolved(self):
+        [let_x, defun_f] = self.addressed("(let x 1) (defun f (a) (let b a) (+ x a b))")
+        assert isinstance(let_x, LispList)
+        x = let_x.to_python_list()[1]
+        assert isinstance(x, LispAddress)
+        self.assertEqual((x.depth, x.index), (0, 0))
+
+        assert isinstance(defun_f, LispList)
+        addition = defun_f.to_python_list()[-1]
+        assert isinstance(addition, LispList)
+        addresses = [(arg.depth, arg.index) for arg in addition.to_python_list()[1:] if isinstance(arg, LispAddress)]
+        self.assertEqual(addresses, [(1, 0), (0, 0), (0, 1)])
+
+    def test_addressed_programs_print_as_renamed_ones(self):
+        program = "(let x 1) (defun f (a) (let b a) (+ x a b))"
+        renamed = bind_to_static_scope(parse(program), Scope())
+        addressed = resolve_lexical_addresses(renamed)
+        self.assertEqual(list(map(str, addressed)), list(map(str, renamed)))
+
+    def test_static_scope(self):
+        with open("example.lisp") as f:
+            program = f.read()
+        screen = TestScreen()
+        eval_compiled(self.addressed(program), Scope(), screen)
+        self.assertEqual(screen.get_contents(), "3\n11\n3\n11\n")
+
+    def test_nested_functions_see_their_definition_frame(self):
+        program = """(defun outer (a)
+                        (defun inner () a)
+                        (defun call-inner (a) (inner))
+                        (call-inner 2))
+                     (outer 1)"""
+        self.assertEqual(eval_compiled(self.addressed(program), Scope(), Screen()), LispNumber(1))
+
+    def test_recursion_gets_fresh_frames(self):
+        program = "(defun f (x) (let y (* x 2)) (defun g () (+ x y)) (g)) (+ (f 1) (f 10))"
+        self.assertEqual(eval_compiled(self.addressed(program), Scope(), Screen()), LispNumber(33))
+
+    def test_errors_restore_the_caller_frame(self):
+        scope = Scope()
+        frame = scope.frame
+        with self.assertRaises(LispError):
+            eval_compiled(self.addressed("(let x 1) (defun f (a) (g a)) (f x)"), scope, Screen())
+        self.assertIs(scope.frame, frame)
+
+    def test_programs_in_one_scope_keep_their_globals_apart(self):
+        binding_scope, scope = Scope(), Scope()
+        globals: dict[LispSymbol, int] = {}
+        for program in ["(let x 1) (defun f () x)", "(let y 2) (+ (f) y)"]:
+            ast = resolve_lexical_addresses(bind_to_static_scope(parse(program), binding_scope), globals)
+            result = eval_compiled(ast, scope, Screen())
+        self.assertEqual(result, LispNumber(3))
+
+    def test_other_engines_reject_addressed_programs(self):
+        for engine in ENGINES:
+            if engine != "closure":
+                with self.subTest(engine=engine):
+                    with self.assertRaisesRegex(Exception, f"the {engine} engine can't run lexically addressed"):
+                        evaluate(self.addressed("(let x 1) x"), Scope(), Screen(), engine)
+
+
+class ScreenRecorder(Screen):
+    def __init__(self) -> None:
+        super().__init__()
+        self.lines: list[str] = []
+
+    def print(self, contents: str) -> None:
+        self.lines.append(contents)
+
+
+class StreamTests(unittest.TestCase):
+    def test_stream_parses_like_parse(self):
+        with open("example.lisp") as f:
+            program = f.read() + " (a b -12 x) 77 word"
+        expected = parse(program)
+        for chunk_size in [1, 2, 3, 7, 4096]:
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(list(parse_stream(io.StringIO(program), chunk_size)), expected)
+                self.assertEqual(list(parse_stream(io.BytesIO(program.encode()), chunk_size)), expected)
+
+    def test_stream_from_mmap(self):
+        program = "(let é 1) (print (+ é 2))"
+        with tempfile.TemporaryFile() as f:
+            f.write(program.encode())
+            f.flush()
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                self.assertEqual(list(parse_stream(mapped, 5)), parse(program))
+
+    def test_stream_errors_have_locations(self):
+        for chunk_size in [1, 4096]:
+            with self.assertRaises(Exception) as raised:
+                list(parse_stream(io.StringIO("(a\n  (b c)\n  d e"), chunk_size))
+            self.assertEqual(str(raised.exception), "line 3, character 6: expected ')'")
+
+    def test_output_appears_before_the_whole_source_is_read(self):
+        source = io.StringIO("(print 1)\n" + "(print 2)\n" * 1000)
+        screen = ScreenRecorder()
+        read_at_first_output: list[int] = []
+
+        def forms():
+            for form in parse_stream(source, 64):
+                yield form
+                if screen.lines and not read_at_first_output:
+                    read_at_first_output.append(source.tell())
+
+        eval_stream(forms(), Scope(), screen)
+        self.assertEqual(len(screen.lines), 1001)
+        self.assertEqual(read_at_first_output, [64])
+
+    def test_static_scope_stream(self):
+        with open("example.lisp", "rb") as f:
+            screen = ScreenRecorder()
+            eval_stream(bind_stream_to_static_scope(parse_stream(f, 16), Scope()), Scope(), screen)
+        self.assertEqual(screen.lines, ["3", "11", "3", "11"])
+
+
+class SourceLocationTests(unittest.TestCase):
+    def test_line_index(self):
+        source = Source("x.lisp", "ab\ncd\n\nef")
+        self.assertEqual(source.location(0), (1, 1))
+        self.assertEqual(source.location(2), (1, 3))
+        self.assertEqual(source.location(3), (2, 1))
+        self.assertEqual(source.location(7), (4, 1))
+        self.assertEqual(source.describe(8), "x.lisp, line 4, character 2")
+
+    def test_lists_have_spans(self):
+        program = "(a\n (b c))"
+        [ast] = parse(program)
+        assert isinstance(ast, LispNonEmptyList) and ast.span is not None
+        self.assertEqual((ast.span.start, ast.span.end), (0, len(program)))
+        inner = ast[1]
+        assert isinstance(inner, LispNonEmptyList) and inner.span is not None
+        self.assertEqual(program[inner.span.start:inner.span.end], "(b c)")
+        self.assertEqual(str(inner.span), "line 2, character 2")
+
+    def test_stream_spans_match(self):
+        program = "(let x 1)\n(defun f (a)\n  (+ a x))\n(f 2)"
+        for chunk_size in [1, 5, 4096]:
+            streamed = list(parse_stream(io.StringIO(program), chunk_size))
+            for expected, node in zip(parse(program), streamed):
+                assert isinstance(expected, LispNonEmptyList) and isinstance(node, LispNonEmptyList)
+                self.assertEqual(str(node.span), str(expected.span))
+
+    def test_parse_errors_name_the_file(self):
+        with self.assertRaises(Exception) as raised:
+            parse("(a\n  b))", "x.lisp")
+        self.assertEqual(str(raised.exception), "x.lisp, line 2, character 5: unexpected ')'")
+
+    def test_runtime_errors_are_located(self):
+        program = "(defun f (x)\n  (+ x\n     (g x)))\n(f 1)"
+        for engine in ENGINES:
+            with self.subTest(engine=engine):
+                with self.assertRaises(LispError) as raised:
+                    evaluate(parse(program, "x.lisp"), Scope(), Screen(), engine)
+                self.assertEqual(str(raised.exception), "x.lisp, line 3, character 6: Function g not defined")
+                self.assertEqual(raised.exception.message, "Function g not defined")
+
+    def test_statically_bound_errors_are_located(self):
+        program = "(defun f (x)\n  (+ x\n     (g x)))\n(f 1)"
+        # Only the closure compiler runs lexically addressed programs
+        for engine, lexical in [(engine, False) for engine in ENGINES] + [("closure", True)]:
+            with self.subTest(engine=engine, lexical=lexical):
+                ast = bind_to_static_scope(parse(program, "x.lisp"), Scope())
+                if lexical:
+                    ast = resolve_lexical_addresses(ast)
+                with self.assertRaises(LispError) as raised:
+                    evaluate(ast, Scope(), Screen(), engine)
+                self.assertEqual(str(raised.exception), "x.lisp, line 3, character 6: Function g not defined")
+
+    def test_python_errors_are_not_located(self):
+        class BrokenScreen(Screen):
+            def print(self, contents: str) -> None:
+                raise BrokenPipeError(32, "Broken pipe")
+
+        for engine in ENGINES:
+            with self.subTest(engine=engine):
+                with self.assertRaises(BrokenPipeError):
+                    evaluate(parse("(defun f (x) (print x)) (f 1)", "x.lisp"), Scope(), BrokenScreen(), engine)
+
+
+class StackEvaluatorTests(unittest.TestCase):
+    def test_deeply_nested_expressions(self):
+        depth = 20_000
+        program = "(+ 1 " * depth + "0" + ")" * depth
+        self.assertEqual(eval_stack(parse(program), Scope(), Screen()), LispNumber(depth))
+
+    def test_compiled_errors_are_raised_anew(self):
+        program = compile_program(parse("(defun f () (let 1 2)) (f)"))
+        errors: list[Exception] = []
+        for _ in range(2):
+            with self.assertRaises(Exception) as raised:
+                run(program, Scope(), Screen())
+            errors.append(raised.exception)
+        self.assertIsNot(errors[0], errors[1])
+        self.assertEqual(str(errors[0]), str(errors[1]))
+
+    def test_long_chains_of_tail_calls(self):
+        count = 20_000
+        program = "".join(f"(defun f{i} (n) (f{i + 1} (+ n 1)))\n" for i in range(count))
+        program += f"(defun f{count} (n) n)\n(f0 0)"
+        self.assertEqual(eval_stack(parse(program), Scope(), Screen()), LispNumber(count))
+
+    def test_deep_calls_outside_tail_position(self):
+        count = 5_000
+        program = "".join(f"(defun f{i} (n) (+ 1 (f{i + 1} n)))\n" for i in range(count))
+        program += f"(defun f{count} (n) n)\n(f0 0)"
+        self.assertEqual(eval_stack(parse(program), Scope(), Screen()), LispNumber(count))
+
+    def test_tail_calls_keep_dynamic_scope(self):
+        program = "(defun g () x) (defun f () (let x 5) (g)) (let x 1) (list (f) x)"
+        self.assertEqual(eval_stack(parse(program), Scope(), Screen()),
+                         LispList.from_list([LispNumber(5), LispNumber(1)]))
+
+    def test_scope_is_restored_after_tail_calls(self):
+        scope = Scope()
+        eval_stack(parse("(defun g (a) a) (defun f (b) (g b)) (f 1)"), scope, Screen())
+        self.assertEqual(scope.names, ["global"])
+        self.assertIsNone(scope.read_symbol(LispSymbol("a")))
+
+
+class VMTests(unittest.TestCase):
+    def test_programs_compile_to_flat_bytecode(self):
+        program = compile_program(parse("(let x 5) (+ x 1)"))
+        self.assertEqual(program.code.typecode, "i")
+        self.assertEqual(program.names, [LispSymbol("x")])
+        self.assertEqual(program.constants, [LispNumber(5), LispNumber(1)])
+
+    def test_disassembler(self):
+        program = compile_program(parse("(defun double (x) (* x 2)) (print (double 4))"))
+        self.assertEqual(disassemble(program), "\n".join([
+            "== program ==",
+            "     0 DEFUN    0 0      (double ((x) (* x 2)))",
+            "     3 POP",
+            "     4 ENTER    0 1      (double)",
+            "     7 CONST    0        (4)",
+            "     9 BIND     0",
+            "    11 CALL",
+            "    12 PRINT",
+            "    13 FLUSH",
+            "    14 CONST    1        (())",
+            "    16 HALT",
+            "",
+            "== double ==",
+            "     0 LOAD     0        (x)",
+            "     2 CONST    0        (2)",
+            "     4 MUL      2",
+            "     6 RETURN",
+        ]))
+
+    def test_operands_are_checked_as_they_are_evaluated(self):
+        for program in ["(+ () (print 1))", "(* 2 (let x ()) (print x) 3)", "(print 1 (+ 1 ()) 2)", "(print 1 x)"]:
+            screens = {engine: TestScreen() for engine in ["tree", "vm"]}
+            errors: dict[str, str] = {}
+            for engine, screen in screens.items():
+                with self.assertRaises(LispError) as raised:
+                    evaluate(parse(program), Scope(), screen, engine)
+                errors[engine] = str(raised.exception)
+            with self.subTest(program=program):
+                self.assertEqual(errors["vm"], errors["tree"])
+                self.assertEqual(screens["vm"].get_contents(), screens["tree"].get_contents())
+
+    def test_print_writes_its_values_together(self):
+        writes: list[list[str]] = []
+        sink = ListSink()
+        sink.write_lines = lambda lines: writes.append(list(lines))
+        eval_vm(parse("(print 1 2 (print 3) 4 5)"), Scope(), Screen(sink))
+        self.assertEqual(writes, [["1", "2"], ["3"], ["()", "4", "5"]])
+
+    def test_functions_defined_by_other_engines(self):
+        scope = Scope()
+        eval(parse("(defun f (a b) (- a b))"), scope, Screen())
+        self.assertEqual(eval_vm(parse("(f 10 3)"), scope, Screen()), LispNumber(7))
+
+    def test_long_chains_of_tail_calls(self):
+        count = 20_000
+        program = "".join(f"(defun f{i} (n) (f{i + 1} (+ n 1)))\n" for i in range(count))
+        program += f"(defun f{count} (n) n)\n(f0 0)"
+        scope = Scope()
+        self.assertEqual(eval_vm(parse(program), scope, Screen()), LispNumber(count))
+        self.assertEqual(scope.names, ["global"])
+
+
+class ConcurrencyTests(unittest.TestCase):
+    def run_program(self, i: int) -> tuple[LispValue, list[str]]:
+        program = f"""(let x {i})
+                      (defun g (n) (+ x n))
+                      (defun f (n) (let x (* n 2)) (print x) (g n))
+                      (print (f x))
+                      (f x)"""
+        ast = parse(program)
+        if i % 2 == 1:
+            ast = bind_to_static_scope(ast, Scope())
+        screen = ScreenRecorder()
+        result = Interpreter().eval(ast, Scope(), screen)
+        return result, screen.lines
+
+    def test_interpreters_on_a_thread_pool_stay_isolated(self):
+        count = 400
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            outcomes = list(pool.map(self.run_program, range(count)))
+        for i, (result, lines) in enumerate(outcomes):
+            with self.subTest(i=i):
+                # g sees the x of f with dynamic scope, the global one with static scope
+                expected = 2 * i + i if i % 2 == 0 else 2 * i
+                self.assertEqual(result, LispNumber(expected))
+                self.assertEqual(lines, [str(2 * i), str(expected), str(2 * i)])
+
+    def test_each_interpreter_keeps_its_own_program(self):
+        first, second = Interpreter(), Interpreter()
+        first_ast, second_ast = parse("(+ 1 2)"), parse("(* 3 4)")
+        first.eval(first_ast, Scope(), Screen())
+        second.eval(second_ast, Scope(), Screen())
+        self.assertIs(first.ast_backup, first_ast)
+        self.assertIs(second.ast_backup, second_ast)
+
+    def test_reused_interpreters_start_every_program(self):
+        tracer = RecordingTracer()
+        interpreter = Interpreter(tracer)
+        first, second = parse("(+ 1 2)"), parse("(+ 3 4)")
+        interpreter.eval(first, Scope(), Screen())
+        self.assertEqual(interpreter.eval(second, Scope(), Screen()), LispNumber(7))
+        interpreter.eval_stream(iter(parse("(let x 1) (print x)")), Scope(), Screen())
+        starts = [str(cast(list[LispValue], ast)[0]) for kind, ast, _ in tracer.events if kind == START]
+        self.assertEqual(starts, ["(+ 1 2)", "(+ 3 4)", "(let x 1)", "(print x)"])
+
+    def test_programs_bound_separately_keep_their_names_apart(self):
+        scope, screen = Scope(), ScreenRecorder()
+        first = bind_to_static_scope(parse("(let x 1) (defun f () x)"), Scope())
+        second = bind_to_static_scope(parse("(let x 5) (print (f))"), Scope())
+        Interpreter().eval(first, scope, screen)
+        Interpreter().eval(second, scope, screen)
+        self.assertEqual(screen.lines, ["1"])
+
+
+class BatchTests(unittest.TestCase):
+    def write_programs(self, directory: str) -> list[str]:
+        sources = {"a.lisp": "(print 1) (+ 1 2)", "b.lisp": "(foo)", "c.lisp": "(let x 4) (defun f () x) (f)"}
+        for name, code in sources.items():
+            with open(os.path.join(directory, name), "w") as f:
+                f.write(code)
+        return [os.path.join(directory, name) for name in sources]
+
+    def test_directory_sources(self):
+        with tempfile.TemporaryDirectory() as directory:
+            paths = self.write_programs(directory)
+            with open(os.path.join(directory, "notes.txt"), "w") as f:
+                f.write("not a program")
+            self.assertEqual(find_sources(directory), paths)
+
+    def test_manifest_sources(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.write_programs(directory)
+            manifest = os.path.join(directory, "manifest")
+            with open(manifest, "w") as f:
+                f.write("# programs to run\nc.lisp\n\na.lisp\n")
+            self.assertEqual(find_sources(manifest), [os.path.join(directory, "c.lisp"), os.path.join(directory, "a.lisp")])
+
+    def test_batch_report(self):
+        with tempfile.TemporaryDirectory() as directory:
+            paths = self.write_programs(directory)
+            reports = run_batch(paths * 3, workers=2, chunk_size=2)
+
+        self.assertEqual([report.path for report in reports], paths * 3)
+        a, b, c = reports[:3]
+        self.assertEqual((a.output, a.result, a.error), ("1\n", "3", None))
+        self.assertEqual(b.result, None)
+        self.assertEqual(b.error, f"{paths[1]}, line 1, character 1: Function foo not defined")
+        self.assertEqual(c.result, "4")
+        self.assertTrue(all(report.seconds >= 0 for report in reports))
+
+    def test_static_batch(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "example.lisp")
+            with open("example.lisp") as source, open(path, "w") as f:
+                f.write(source.read())
+            [report] = run_batch([path], workers=1, static=True)
+        self.assertEqual(report.output, "3\n11\n3\n11\n")
+
+    def test_cached_batch(self):
+        with tempfile.TemporaryDirectory() as directory:
+            paths = self.write_programs(directory)
+            cache = os.path.join(directory, "cache")
+            first = run_batch(paths, workers=1, cache_dir=cache)
+            second = run_batch(paths, workers=1, cache_dir=cache)
+            self.assertEqual(len(os.listdir(cache)), len(paths))
+        self.assertEqual([(report.output, report.result, report.error) for report in first],
+                         [(report.output, report.result, report.error) for report in second])
+        self.assertEqual(second[1].error, f"{paths[1]}, line 1, character 1: Function foo not defined")
+
+
+class ASTCacheTests(unittest.TestCase):
+    programs = [
+        "(let x 5) (defun f (a b) (list a (cons b ()))) (print (f x (/ 100 -7)))",
+        "(+ 99999999999999999999999 -1) ()",
+        "(((nested)) (lists (of (lists)))) first-symbol",
+        "",
+    ]
+
+    def test_round_trip(self):
+        for program in self.programs:
+            for static in [False, True]:
+                with self.subTest(program=program, static=static):
+                    ast = parse(program, "name.lisp")
+                    if static and program.startswith("(let"):
+                        ast = bind_to_static_scope(ast, Scope())
+                    loaded = deserialize(serialize(ast, static))
+                    self.assertEqual(loaded, ast)
+                    self.assertEqual([str(form) for form in loaded], [str(form) for form in ast])
+
+    def test_spans_survive(self):
+        program = "(let x 5)\n(defun f (n)\n  (+ n (g)))\n(f x)"
+        with self.assertRaises(LispError) as expected:
+            eval(parse(program, "spans.lisp"), Scope(), Screen())
+        with self.assertRaises(LispError) as raised:
+            eval(deserialize(serialize(parse(program, "spans.lisp"))), Scope(), Screen())
+        self.assertEqual(str(raised.exception), str(expected.exception))
+        self.assertIn("spans.lisp, line 3", str(raised.exception))
+
+    def test_deep_programs(self):
+        [node] = deserialize(serialize(parse("(+ 1 " * 5000 + "0" + ")" * 5000)))
+        depth = 0
+        while isinstance(node, LispNonEmptyList):
+            node = node[2]
+            depth += 1
+        self.assertEqual((depth, node), (5000, LispNumber(0)))
+
+    def test_cache_hits_skip_parsing(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "example.lisp")
+            with open("example.lisp") as source, open(path, "w") as f:
+                f.write(source.read())
+            cache = ASTCache(os.path.join(directory, "cache"))
+            first = cache.parse_file(path)
+            with mock.patch.object(astcache, "parse", side_effect=AssertionError("parsed again")):
+                self.assertEqual(cache.parse_file(path), first)
+                static = cache.parse_file(path, static=True)
+                again = cache.parse_file(path, static=True)
+            self.assertEqual(len(os.listdir(cache.directory)), 1)
+            self.assertNotEqual(list(map(str, static)), list(map(str, again)))
+
+            screen = TestScreen()
+            eval(static, Scope(), screen)
+            self.assertEqual(screen.get_contents(), "3\n11\n3\n11\n")
+
+    def test_unreadable_entries_are_replaced(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = ASTCache(directory)
+            key = cache.key(b"(+ 1 2)", None)
+            for contents in [b"", b"garbage", serialize(parse("(+ 1 2)"))[:40],
+                             serialize(parse("(+ 1 2)")).replace(b"LISPAST", b"OLDAST!")]:
+                with self.subTest(contents=contents):
+                    with open(cache.path(key), "wb") as f:
+                        f.write(contents)
+                    self.assertIsNone(cache.get(key))
+                    self.assertEqual(cache.parse("(+ 1 2)"), parse("(+ 1 2)"))
+                    self.assertIsNotNone(cache.get(key))
+
+    def test_keys(self):
+        cache = ASTCache("unused")
+        keys = {cache.key(b"(f)", None), cache.key(b"(f)", "f.lisp"), cache.key(b"(g)", None)}
+        self.assertEqual(len(keys), 3)
+        self.assertEqual(cache.key(b"(f)", None), cache.key(b"(f)", None))
+
+
+class CLITests(unittest.TestCase):
+    def run_repl(self, inputs: list[str], session: Session | None = None, timing: bool = False) -> list[str]:
+        pending = iter(inputs)
+        written: list[str] = []
+
+        def read(prompt: str) -> str:
+            line = next(pending, None)
+            if line is None:
+                raise EOFError()
+            return line
+
+        repl(session or Session(screen=TestScreen()), timing, read, written.append)
+        return written
+
+    def test_session_keeps_its_scope(self):
+        for engine in ENGINES:
+            for static in [False, True]:
+                with self.subTest(engine=engine, static=static):
+                    session = Session(engine, static, TestScreen())
+                    session.run("(let x 5) (defun f (n) (+ n x))")
+                    [result] = session.run("(let x 6) (f 1)")[1:]
+                    self.assertEqual(result.value, LispNumber(6 if static else 7))
+                    self.assertTrue(result.parse_seconds >= 0 and result.eval_seconds >= 0)
+
+    def test_failed_forms_leave_no_open_blocks(self):
+        session = Session(screen=TestScreen())
+        with self.assertRaises(Exception):
+            session.run("(let x 1) (defun f () (= x 2) (g)) (f)")
+        self.assertEqual(session.scope.names, ["global"])
+        self.assertEqual(session.run("x")[0].value, LispNumber(2))
+
+    def test_failed_forms_forget_their_renames(self):
+        for engine in ENGINES:
+            with self.subTest(engine=engine):
+                with self.assertRaises(Exception) as expected:
+                    Session(engine, True, TestScreen()).run("x")
+                session = Session(engine, True, TestScreen())
+                session.run("(let y 1)")
+                with self.assertRaises(LispError):
+                    session.run("(let x (g))")
+                # As if x had never been seen, instead of an unknown x_0
+                with self.assertRaises(Exception) as raised:
+                    session.run("x")
+                self.assertEqual(str(raised.exception), str(expected.exception))
+                self.assertEqual(session.run("(let x 2) (+ x y)")[1].value, LispNumber(3))
+
+    def test_repl(self):
+        screen = TestScreen()
+        written = self.run_repl(["(defun sq (x)", "  (* x x))", "(print (sq 3)) (sq 4)", "(sq)", ":nope", ":quit", "5"],
+                                Session(screen=screen))
+        self.assertEqual(written[0], "()")
+        self.assertEqual(written[1:3], ["()", "16"])
+        self.assertTrue(written[3].startswith("error: "))
+        self.assertEqual(written[4], "unknown command :nope, see :help")
+        self.assertEqual(len(written), 5)
+        self.assertEqual(screen.get_contents(), "9\n")
+
+    def test_time_command(self):
+        written = self.run_repl([":time", "(+ 1 2) 4", ":time", "5"])
+        self.assertEqual(written[:2], ["timing on", "3"])
+        self.assertRegex(written[2], r"^  parse \d+\.\d{3} ms, eval \d+\.\d{3} ms$")
+        self.assertEqual(written[3], "4")
+        self.assertEqual(written[5:], ["timing off", "5"])
+
+    def test_running_files(self):
+        for arguments in [[], ["--static"], ["--engine", "vm", "--time"], ["--static", "--engine", "stack"]]:
+            with self.subTest(arguments=arguments):
+                output, errors = io.StringIO(), io.StringIO()
+                with contextlib.redirect_stdout(output), contextlib.redirect_stderr(errors):
+                    self.assertEqual(main(["example.lisp"] + arguments), 0)
+                self.assertEqual(output.getvalue(), "3\n11\n3\n11\n" if "--static" in arguments else "1\n3\n5\n8\n")
+                self.assertEqual("eval" in errors.getvalue(), "--time" in arguments)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "failing.lisp")
+            with open(path, "w") as f:
+                f.write("(print 1)\n(foo)")
+            output, errors = io.StringIO(), io.StringIO()
+            with contextlib.redirect_stdout(output), contextlib.redirect_stderr(errors):
+                self.assertEqual(main([path, "--cache", os.path.join(directory, "cache")]), 1)
+            self.assertEqual(output.getvalue(), "1\n")
+            self.assertEqual(errors.getvalue(), f"error: {path}, line 2, character 1: Function foo not defined\n")
+
+
+class AsyncEvalTests(unittest.TestCase):
+    def test_results_match_the_tree_walker(self):
+        for program in EngineTests.programs:
+            with self.subTest(program=program):
+                expected = eval(parse(program), Scope(), Screen())
+                self.assertEqual(asyncio.run(eval_async(parse(program), Scope(), Screen(), 3)), expected)
+
+    def test_output_is_an_async_stream(self):
+        async def run_and_read() -> list[str]:
+            screen = AsyncScreen()
+
+            async def run():
+                try:
+                    await eval_async(parse("(print 1 2) (defun f (x) (print x)) (f 3)"), Scope(), screen, 1)
+                finally:
+                    screen.close()
+            task = asyncio.create_task(run())
+            lines = [line async for line in screen]
+            await task
+            return lines
+        self.assertEqual(asyncio.run(run_and_read()), ["1", "2", "3"])
+
+    def test_other_tasks_run_during_long_programs(self):
+        program = "(defun count (n) (+ 1 (count2 n))) (defun count2 (n) n)" + " (count 1)" * 2000
+
+        async def run_with_ticker() -> int:
+            ticks = 0
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    ticks += 1
+                    await asyncio.sleep(0)
+            ticking = asyncio.create_task(ticker())
+            await asyncio.gather(*(eval_async(parse(program), Scope(), Screen(), 100) for _ in range(2)))
+            ticking.cancel()
+            return ticks
+        self.assertGreater(asyncio.run(run_with_ticker()), 50)
+
+    def test_errors_are_located(self):
+        with self.assertRaises(LispError) as raised:
+            asyncio.run(eval_async(parse("(+ 1\n  (foo))", "x.lisp"), Scope(), Screen()))
+        self.assertEqual(str(raised.exception), "x.lisp, line 2, character 3: Function foo not defined")
+
+
+class LimitsTests(unittest.TestCase):
+    def test_programs_within_limits_run_normally(self):
+        program = "(defun f (n) (list n n)) (cons 1 (f 2))"
+        limits = Limits(max_steps=10, max_depth=1, max_cells=3)
+        self.assertEqual(eval_limited(parse(program), Scope(), Screen(), limits), eval(parse(program), Scope(), Screen()))
+
+    def test_runaway_recursion_hits_the_depth_quota(self):
+        with self.assertRaises(QuotaExceeded) as raised:
+            eval_limited(parse("(defun f (n) (f (+ n 1))) (f 0)"), Scope(), Screen(), Limits(max_depth=50))
+        self.assertEqual(raised.exception.quota, "depth")
+        self.assertEqual(raised.exception.usage.depth, 51)
+
+    def test_depth_counts_the_block_of_the_pending_call(self):
+        program = "(defun g () 1) (defun f () (g)) (f)"
+        self.assertEqual(eval_limited(parse(program), Scope(), Screen(), Limits(max_depth=2)), LispNumber(1))
+        for max_depth in (0, 1):
+            with self.subTest(max_depth=max_depth):
+                with self.assertRaises(QuotaExceeded) as raised:
+                    eval_limited(parse(program), Scope(), Screen(), Limits(max_depth=max_depth))
+                self.assertEqual(raised.exception.usage.depth, max_depth + 1)
+
+    def test_step_quota(self):
+        interpreter = LimitedInterpreter(Limits(max_steps=4))
+        with self.assertRaises(QuotaExceeded) as raised:
+            interpreter.eval(parse("(+ 1 2) (+ 1 (+ 2 (+ 3 (* 4 5))))"), Scope(), Screen())
+        self.assertEqual(str(raised.exception), "steps quota of 4 exceeded, used 5 steps, depth 0, 0 cells")
+        self.assertEqual(interpreter.usage.steps, 5)
+
+    def test_cell_quota_is_checked_before_allocating(self):
+        screen = ScreenRecorder()
+        with self.assertRaises(QuotaExceeded) as raised:
+            eval_limited(parse("(list 1 2 3) (list (print 4) 5)"), Scope(), screen, Limits(max_cells=4))
+        self.assertEqual((raised.exception.quota, raised.exception.usage.cells), ("cells", 5))
+        self.assertEqual(screen.lines, [])
+
+
+class ScreenTests(unittest.TestCase):
+    def test_file_sink_writes_in_batches(self):
+        file = io.StringIO()
+        screen = Screen(FileSink(file, flush_lines=3))
+        screen.print("1")
+        screen.print_lines(["2"])
+        self.assertEqual(file.getvalue(), "")
+        screen.print_lines(["3", "4"])
+        self.assertEqual(file.getvalue(), "1\n2\n3\n4\n")
+        screen.print("5")
+        screen.flush()
+        self.assertEqual(file.getvalue(), "1\n2\n3\n4\n5\n")
+
+    def test_ring_sink_keeps_the_last_lines(self):
+        sink = RingSink(3)
+        eval(parse("(print 1 2 3) (print 4 5)"), Scope(), Screen(sink))
+        self.assertEqual(sink.contents(), "3\n4\n5\n")
+
+    def test_list_sink(self):
+        sink = ListSink()
+        eval(parse("(print 1 (list 2 3))"), Scope(), Screen(sink))
+        self.assertEqual(sink.lines, ["1", "(2 3)"])
+
+    def test_batched_prints_keep_their_order(self):
+        for engine in ENGINES:
+            with self.subTest(engine=engine):
+                sink = ListSink()
+                with self.assertRaises(Exception):
+                    evaluate(parse("(print 1 (print 2) 3) (print 4 x)"), Scope(), Screen(sink), engine)
+                self.assertEqual(sink.lines, ["1", "2", "()", "3", "4"])
+
+
+class TracingTests(unittest.TestCase):
+    def trace(self, program: str, capacity: int = 1000) -> RecordingTracer:
+        tracer = RecordingTracer(capacity)
+        Interpreter(tracer).eval(parse(program), Scope(), BufferScreen())
+        return tracer
+
+    def test_events_are_recorded(self):
+        tracer = self.trace("(defun f (x) (print x)) (f 2)")
+        kinds = [(kind, str(a)) for kind, a, _ in tracer.events][1:]
+        self.assertEqual(kinds, [
+            (CALL, "defun"), (DEFINE, "f"), (RETURN, "defun"),
+            (CALL, "f"), (ENTER, "f"), (BIND, "x"),
+            (CALL, "print"), (OUTPUT, "('2',)"), (RETURN, "print"),
+            (LEAVE, "f"), (RETURN, "f"),
+        ])
+
+    def test_ring_buffer_keeps_the_last_events(self):
+        tracer = self.trace("(+ 1 2) (+ 3 4) (* 5 6)", capacity=2)
+        self.assertEqual([(kind, str(a), str(b)) for kind, a, b in tracer.events], [(CALL, "*", "(5 6)"), (RETURN, "*", "30")])
+
+    def test_replay_shows_the_scope_and_output(self):
+        with open("example.lisp") as f:
+            tracer = self.trace(f.read())
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "trace")
+            tracer.save(path)
+            events = load(path)
+
+        shown = io.StringIO()
+        with contextlib.redirect_stdout(shown):
+            replay(events)
+        last_view = shown.getvalue().split("Expression:")[-1]
+        self.assertTrue(last_view.startswith("    (print y)"))
+        self.assertIn("Current Scope: global main display", last_view)
+        self.assertIn("| 5       | inc()", last_view)
+        self.assertIn("| Output: | x = 5", last_view)
+
+    def test_untraced_interpreters_have_no_tracer(self):
+        self.assertIsNone(Interpreter().tracer)
+
+
+class ProfilerTests(unittest.TestCase):
+    def test_calls_and_depth(self):
+        result, profiler = profile(parse("(defun f (n) (g n)) (defun g (n) (h (+ n 1))) (defun h (n) n) (f 1) (f (f 2))"),
+                                   Scope(), Screen())
+        self.assertEqual(result, LispNumber(4))
+        self.assertEqual({name: stats.calls for name, stats in profiler.stats.items()},
+                         {"defun": 3, "f": 3, "g": 3, "h": 3, "+": 3})
+        # Arguments are evaluated once the call began, so the inner (f 2) runs inside the outer one
+        self.assertEqual(profiler.stats["f"].max_depth, 2)
+        self.assertEqual(profiler.stats["g"].max_depth, 1)
+
+    def test_recursion(self):
+        program = "(defun sum (n) (/ (* n (+ n 1)) 2)) (defun f (n) (sum (f2 n))) (defun f2 (n) n) (f (f (f 3)))"
+        _, profiler = profile(parse(program), Scope(), Screen())
+        f = profiler.stats["f"]
+        self.assertEqual((f.calls, f.max_depth), (3, 3))
+        self.assertLessEqual(f.self_ns, f.cumulative_ns)
+        total = sum(stats.self_ns for stats in profiler.stats.values())
+        self.assertLessEqual(f.cumulative_ns, total)
+
+    def test_raising_applications_are_unwound(self):
+        profiler, scope = Profiler(), Scope()
+        with self.assertRaises(LispError):
+            Interpreter(profiler).eval(parse("(defun g (n) (+ n y)) (defun f (n) (g n)) (f 1)"), scope, Screen())
+        self.assertEqual((profiler.frames, profiler.depths), ([], {"defun": 0, "f": 0, "g": 0, "+": 0}))
+        Interpreter(profiler).eval(parse("(let y 2) (f 1)"), scope, Screen())
+        self.assertEqual(profiler.stats["f"].max_depth, 1)
+        self.assertIn("f;g;+", profiler.stacks)
+        self.assertNotIn("f;f", "".join(profiler.stacks))
+
+    def test_collapsed_stacks(self):
+        program = "(defun g (n) (+ n 1)) (defun f (n) (g n)) " + "(f 1) " * 2000
+        _, profiler = profile(parse(program), Scope(), Screen())
+        stacks = profiler.collapsed().splitlines()
+        self.assertIn("f;g;+", [line.split(" ")[0] for line in stacks])
+        for line in stacks:
+            stack, microseconds = line.rsplit(" ", 1)
+            self.assertGreater(int(microseconds), 0)
+            self.assertNotIn(" ", stack)
+
+    def test_report(self):
+        _, profiler = profile(parse("(defun f () (+ 1 2)) (f) (f)"), Scope(), Screen())
+        lines = profiler.report("calls").splitlines()
+        self.assertEqual(lines[0].split(), ["function", "calls", "self", "ms", "cumulative", "ms", "max", "depth"])
+        self.assertEqual([line.split()[:2] for line in lines[1:3]], [["f", "2"], ["+", "2"]])
+        with self.assertRaises(Exception):
+            profiler.report("name")
+
+
+class MemoizationTests(unittest.TestCase):
+    def run_memoized(self, program: str, max_size: int = 1024) -> tuple[LispValue, MemoizingInterpreter, list[str]]:
+        interpreter = MemoizingInterpreter(max_size)
+        screen = ScreenRecorder()
+        result = interpreter.eval(parse(program), Scope(), screen)
+        return result, interpreter, screen.lines
+
+    def test_pure_functions_are_cached(self):
+        result, interpreter, _ = self.run_memoized("(defun sq (n) (let m n) (* n m)) (list (sq 3) (sq 4) (sq 3) (sq (+ 1 2)))")
+        self.assertEqual(result, LispList.from_list([LispNumber(9), LispNumber(16), LispNumber(9), LispNumber(9)]))
+        self.assertEqual((interpreter.stats()["sq"].hits, interpreter.stats()["sq"].misses), (2, 2))
+
+    def test_impure_functions_are_not_cached(self):
+        programs = [
+            "(defun f (n) (print n) n) (f 1) (f 1)",
+            "(let k 2) (defun f (n) (* n k)) (f 1) (= k 3) (f 1)",
+            "(let k 2) (defun f (n) (= k n) n) (f 1) (f 1)",
+            "(let k 2) (defun g (n) (* n k)) (defun f (n) (+ (g n) 1)) (f 1) (f 1)",
+            "(defun f (n) (defun g () n) (g)) (f 1) (f 1)",
+        ]
+        for program in programs:
+            with self.subTest(program=program):
+                result, interpreter, _ = self.run_memoized(program)
+                self.assertEqual(result, eval(parse(program), Scope(), Screen()))
+                self.assertNotIn("f", interpreter.stats())
+
+    def test_redefining_invalidates_the_cache(self):
+        program = """(defun g (n) (+ n 1)) (defun f (n) (* 2 (g n)))
+                     (let a (f 1))
+                     (defun g (n) (+ n 10))
+                     (let b (f 1))
+                     (defun f (n) n)
+                     (list a b (f 1))"""
+        result, _, _ = self.run_memoized(program)
+        self.assertEqual(result, LispList.from_list([LispNumber(4), LispNumber(22), LispNumber(1)]))
+
+    def test_exponential_call_trees_become_polynomial(self):
+        levels = 30
+        program = "(defun level0 (n) (* n n))\n"
+        for level in range(1, levels + 1):
+            program += f"(defun level{level} (n) (- (+ (level{level - 1} n) (level{level - 1} (+ n 1))) (level{level - 1} 1)))\n"
+        program += f"(level{levels} 3)"
+        result, interpreter, _ = self.run_memoized(program)
+        self.assertIsInstance(result, LispNumber)
+        misses = sum(stats.misses for stats in interpreter.stats().values())
+        self.assertLess(misses, levels * levels)
+
+    def test_lru_is_bounded(self):
+        _, interpreter, _ = self.run_memoized("(defun f (n) (+ n 1)) (f 1) (f 2) (f 3) (f 1) (f 3)", max_size=2)
+        stats = interpreter.stats()["f"]
+        self.assertEqual((stats.hits, stats.misses), (1, 4))
+        results = interpreter.caches["f"].results
+        assert results is not None
+        self.assertEqual(len(results), 2)
+
+    def test_list_arguments_are_not_cached(self):
+        result, interpreter, _ = self.run_memoized("(defun f (l) (cons 1 l)) (f (list 2)) (f (list 2))")
+        self.assertEqual(result, LispList.from_list([LispNumber(1), LispNumber(2)]))
+        self.assertEqual(interpreter.stats()["f"].hits, 0)
+
+
+class OptimizerTests(unittest.TestCase):
+    def optimized(self, program: str, passes: list[str] | None = None) -> tuple[list[str], list[str]]:
+        ast, changes = optimize(parse(program)) if passes is None else optimize(parse(program), passes)
+        return list(map(str, ast)), changes
+
+    def test_constant_folding(self):
+        self.assertEqual(self.optimized("(+ 1 2 (* 3 4)) (+ x 1 (- 5 2) y) (/ 7 2) (/ 1 0) (- x 1)", ["fold"])[0],
+                         ["15", "(+ x y 4)", "3", "(/ 1 0)", "(- x 1)"])
+
+    def test_flattening(self):
+        ast, changes = self.optimized("(* a (* b (* c d)) (+ e (+ f))) (+ 1 (*))", ["flatten"])
+        self.assertEqual(ast, ["(* a b c d (+ e f))", "(+ 1 (*))"])
+        self.assertEqual(len(changes), 3)
+
+    def test_inlining(self):
+        program = "(sq 2) (defun sq (x) (* x x)) (let y 3) (sq y) (sq (+ y 1)) (defun f (z) (sq z)) (defun g (x) (sq x)) (f 1)"
+        ast, changes = self.optimized(program, ["inline"])
+        self.assertEqual(ast, ["(sq 2)", "(defun sq (x) (* x x))", "(let y 3)", "(* y y)", "(sq (+ y 1))",
+                               "(defun f (z) (* z z))", "(defun g (x) (sq x))", "(f 1)"])
+        self.assertEqual(changes, ["inline: (sq y) => (* y y)", "inline: (sq z) => (* z z)"])
+
+    def test_inlined_bodies_are_located_at_the_call(self):
+        for passes in [["inline"], None]:
+            with self.subTest(passes=passes):
+                ast = parse("(defun sq (x) (* x x)) (sq q)")
+                with self.assertRaises(LispError) as raised:
+                    eval(optimize(ast)[0] if passes is None else optimize(ast, passes)[0], Scope(), Screen())
+                self.assertEqual(str(raised.exception), "line 1, character 24: unknown symbol q")
+
+    def test_functions_that_may_not_be_inlined(self):
+        programs = [
+            "(defun f (x) (g x)) (defun g (y) y) (f 1)",
+            "(defun f (x) (* x z)) (f 1)",
+            "(defun f (x) (print x)) (f 1)",
+            "(defun f (x y) x) (f 1 2)",
+            "(defun f (x) x) (defun f (x) (+ x 1)) (f 1)",
+            "(defun f (x) x) (let f 1) (f 1)",
+            "(defun f (x y) (+ x y)) (f 1 x)",
+        ]
+        for program in programs:
+            with self.subTest(program=program):
+                self.assertEqual(self.optimized(program, ["inline"])[1], [])
+
+    def test_dead_defuns(self):
+        program = "(defun a () (b)) (defun b () 1) (defun c () (d)) (defun d () 2) (defun e () x) (print a) (a) (defun z () 3)"
+        ast, changes = self.optimized(program, ["dead-defuns"])
+        self.assertEqual(changes, ["dead-defuns: removed c", "dead-defuns: removed d", "dead-defuns: removed e"])
+        self.assertEqual(len(ast), 5)
+
+    def test_optimized_programs_behave_the_same(self):
+        with open("example.lisp") as f:
+            example = f.read()
+        programs = EngineTests.programs + [
+            example,
+            "(defun sq (x) (* x x)) (defun unused () 1) (let y 3) (print (sq 4) (+ 1 (sq y) (+ 2 y)))",
+            "(defun add (a b) (+ a b)) (defun f (a) (add a 1)) (print (f 2) (add 1 2))",
+            "(let x 1) (defun g () x) (defun f (x) (g)) (print (f 5))",
+            "(defun f (1) x) 5",
+        ]
+
+        def run(ast: list[LispValue]) -> tuple[LispValue | str, str]:
+            """The value of `ast`, or the message of its error, and what it printed"""
+            screen = TestScreen()
+            try:
+                return eval(ast, Scope(), screen), screen.get_contents()
+            except Exception as error:
+                return str(error), screen.get_contents()
+
+        for program in programs:
+            for static in [False, True]:
+                with self.subTest(program=program, static=static):
+                    ast = parse(program)
+                    if static:
+                        try:
+                            ast = bind_to_static_scope(ast, Scope())
+                        except Exception:
+                            # Rejected when bound, before there is anything to optimize
+                            continue
+                    self.assertEqual(run(optimize(ast)[0]), run(ast))
+
+    def test_unknown_pass(self):
+        with self.assertRaises(Exception):
+            optimize(parse("1"), ["unknown"])
+
+
+@unittest.skipIf(numpy is None, "NumPy is not installed")
+class VectorTests(unittest.TestCase):
+    def run_program(self, program: str, engine: str = "tree") -> LispValue:
+        return evaluate(parse(program), Scope(), Screen(), engine)
+
+    def test_builtins(self):
+        cases = [
+            ("(vector->list (vector+ (vector 1 2 3) (vector 10 20 30) 100))", "(111 122 133)"),
+            ("(vector->list (vector- 10 (vector 1 2 3)))", "(9 8 7)"),
+            ("(vector->list (vector* (vector-range 0 4) (vector-range 0 4)))", "(0 1 4 9)"),
+            ("(vector->list (vector/ (vector 7 -7 9) 2))", "(3 -4 4)"),
+            ("(vector->list (vector/ 100 (vector 3 -3 7)))", "(33 -34 14)"),
+            ("(vector-sum (vector-range 0 1001))", "500500"),
+            ("(vector-product (list->vector (list 1 2 3 4 5)))", "120"),
+            ("(vector-sum (vector))", "0"),
+            ("(vector-ref (vector-range 5 10) 2)", "7"),
+            ("(vector-slice (vector-range 0 10) 3 6)", "#(3 4 5)"),
+            ("(vector-length (vector-slice (vector-range 0 10) 4 4))", "0"),
+        ]
+        for engine in ENGINES:
+            for program, expected in cases:
+                with self.subTest(engine=engine, program=program):
+                    self.assertEqual(str(self.run_program(program, engine)), expected)
+
+    def test_division_matches_numbers(self):
+        for dividend in [7, -7, 0, 13]:
+            for divisor in [2, -2, 5, -13]:
+                with self.subTest(dividend=dividend, divisor=divisor):
+                    expected = self.run_program(f"(/ {dividend} {divisor})")
+                    self.assertEqual(self.run_program(f"(vector-ref (vector/ (vector {dividend}) {divisor}) 0)"), expected)
+
+    def test_errors(self):
+        with self.assertRaises(Exception) as expected:
+            self.run_program("(/ 1 0)")
+        for engine in ENGINES:
+            with self.subTest(engine=engine):
+                with self.assertRaises(Exception) as raised:
+                    self.run_program("(vector/ (vector 1 2) (vector 1 0))", engine)
+                self.assertEqual(str(raised.exception), str(expected.exception))
+
+        for program in ["(vector+ (vector 1 2) (vector 1 2 3))", "(vector-ref (vector 1) 1)", "(vector+ 1 2)",
+                        "(list->vector (list 1 ()))", "(vector 99999999999999999999)", "(vector-sum (list 1))"]:
+            with self.subTest(program=program):
+                with self.assertRaises(Exception):
+                    self.run_program(program)
+
+    def test_overflow(self):
+        exact = [
+            ("(vector-sum (vector 9223372036854775807 1))", str(2**63)),
+            ("(vector-sum (vector -9223372036854775808 -1))", str(-2**63 - 1)),
+            ("(vector-product (vector-range 1 30))", str(math.factorial(29))),
+            ("(vector-product (vector 0 9223372036854775807 5))", "0"),
+            ("(vector->list (vector* (vector 4294967296 -1) (vector 2147483647 -9223372036854775807)))",
+             "(9223372032559808512 9223372036854775807)"),
+        ]
+        overflowing = ["(vector+ (vector 9223372036854775807) 1)", "(vector+ 9223372036854775807 1 (vector 1))",
+                       "(vector- 0 (vector -9223372036854775808))", "(vector* (vector 4294967296) 2147483648)",
+                       "(vector* (vector -1) -9223372036854775808)", "(vector/ (vector -9223372036854775808) -1)"]
+        for engine in ENGINES:
+            for program, expected in exact:
+                with self.subTest(engine=engine, program=program):
+                    self.assertEqual(str(self.run_program(program, engine)), expected)
+            for program in overflowing:
+                with self.subTest(engine=engine, program=program):
+                    with warnings.catch_warnings():
+                        warnings.simplefilter("error")
+                        with self.assertRaisesRegex(Exception, "overflowed a vector element"):
+                            self.run_program(program, engine)
+
+    def test_vectors_are_values(self):
+        vector = self.run_program("(let v (vector 1 2 3)) (defun twice (x) (vector+ x x)) (twice v)")
+        assert isinstance(vector, LispVector)
+        self.assertEqual(vector, self.run_program("(vector 2 4 6)"))
+        self.assertFalse(vector.array.flags.writeable)
+        self.assertEqual(str(self.run_program("(vector->list (vector 1 2))", "vm")), "(1 2)")
+
+    def test_vector_to_list_counts_cells(self):
+        with self.assertRaises(QuotaExceeded):
+            eval_limited(parse("(vector->list (vector-range 0 100))"), Scope(), Screen(), Limits(max_cells=50))
+
+    def test_vectors_are_charged_before_allocating(self):
+        limits = Limits(max_steps=10, max_cells=10)
+        with self.assertRaises(QuotaExceeded) as raised:
+            eval_limited(parse("(vector-length (vector-range 0 300000000))"), Scope(), Screen(), limits)
+        self.assertEqual(raised.exception.usage.cells, 300000000)
+        programs = {
+            "(vector 1 2 3) (list->vector (list 1 2 3 4 5))": 3 + 5 + 5,
+            "(let v (vector-range 0 4)) (vector/ (vector+ v 1 v) 2)": 4 + 4 + 4,
+        }
+        for program, cells in programs.items():
+            with self.subTest(program=program):
+                interpreter = LimitedInterpreter(limits)
+                with self.assertRaises(QuotaExceeded):
+                    interpreter.eval(parse(program), Scope(), Screen())
+                self.assertEqual(interpreter.usage.cells, cells)
+
+
 class FinalInterpreterTests(unittest.TestCase):
     def test_dynamic_scope(self):
         program = ""
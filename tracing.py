@@ -0,0 +1,233 @@
+import argparse
+import pickle
+from collections import deque
+from typing import Iterable, Sequence, cast
+from lisptypes import LispEmptyList, LispList, LispNonEmptyList, LispSymbol, LispValue
+from scope import Scope, SymbolType
+from screen import BufferScreen
+
+
+class Tracer():
+    """Hooks called by `interpreter.Interpreter` while it evaluates, when one is attached.
+    They all do nothing by default"""
+
+    def start(self, ast: Sequence[LispValue]) -> None:
+        """The program is about to run"""
+
+    def call(self, name: LispSymbol, arguments: LispList, scope: Scope) -> None:
+        """A function application is about to be evaluated, builtins included"""
+
+    def returned(self, name: LispSymbol, value: LispValue) -> None:
+        """A function application evaluated to `value`"""
+
+    def failed(self, name: LispSymbol, error: Exception) -> None:
+        """A function application raised `error` instead of returning"""
+
+    def enter(self, name: LispSymbol) -> None:
+        """The block of a user-defined function began"""
+
+    def leave(self, name: LispSymbol) -> None:
+        """The block of a user-defined function ended"""
+
+    def bind(self, symbol: LispSymbol, value: LispValue, symbol_type: SymbolType) -> None:
+        """A symbol was created in the current block, by `let`, `defun` or a function parameter"""
+
+    def assign(self, symbol: LispSymbol, value: LispValue) -> None:
+        """An existing symbol was set with `=`"""
+
+    def output(self, lines: Sequence[str]) -> None:
+        """Lines were printed"""
+
+    def finish(self, scope: Scope) -> None:
+        """The program ended"""
+
+
+# Kinds of the events kept by `RecordingTracer`, each one a tuple (kind, a, b)
+START = 0   # (START, ast, None)
+CALL = 1    # (CALL, name, arguments)
+RETURN = 2  # (RETURN, name, value)
+ENTER = 3   # (ENTER, name, None)
+LEAVE = 4   # (LEAVE, name, None)
+BIND = 5    # (BIND, symbol, value)
+DEFINE = 6  # (DEFINE, symbol, definition), for functions
+ASSIGN = 7  # (ASSIGN, symbol, value)
+OUTPUT = 8  # (OUTPUT, lines, None)
+
+Event = tuple[int, object, object]
+
+
+class RecordingTracer(Tracer):
+    """Records events in a ring buffer keeping the last `capacity` of them. Events only hold references
+    to values and AST nodes, nothing is rendered until they are replayed with `replay`"""
+
+    def __init__(self, capacity: int = 100_000) -> None:
+        self.events: deque[Event] = deque(maxlen=capacity)
+
+    def start(self, ast: Sequence[LispValue]) -> None:
+        self.events.append((START, ast, None))
+
+    def call(self, name: LispSymbol, arguments: LispList, scope: Scope) -> None:
+        self.events.append((CALL, name, arguments))
+
+    def returned(self, name: LispSymbol, value: LispValue) -> None:
+        self.events.append((RETURN, name, value))
+
+    def enter(self, name: LispSymbol) -> None:
+        self.events.append((ENTER, name, None))
+
+    def leave(self, name: LispSymbol) -> None:
+        self.events.append((LEAVE, name, None))
+
+    def bind(self, symbol: LispSymbol, value: LispValue, symbol_type: SymbolType) -> None:
+        self.events.append((DEFINE if symbol_type == SymbolType.FUNCTION else BIND, symbol, value))
+
+    def assign(self, symbol: LispSymbol, value: LispValue) -> None:
+        self.events.append((ASSIGN, symbol, value))
+
+    def output(self, lines: Sequence[str]) -> None:
+        self.events.append((OUTPUT, tuple(lines), None))
+
+    def save(self, path: str) -> None:
+        with open(path, "wb") as f:
+            pickle.dump(list(self.events), f)
+
+
+def load(path: str) -> list[Event]:
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+class StepTracer(Tracer):
+    """The interactive stepper: shows the program, its output and the scope before every function
+    application, waiting for enter to go on. Output is read from `screen`"""
+
+    def __init__(self, screen: BufferScreen) -> None:
+        self.screen = screen
+        self.ast: Sequence[LispValue] = []
+
+    def start(self, ast: Sequence[LispValue]) -> None:
+        self.ast = ast
+
+    def call(self, name: LispSymbol, arguments: LispList, scope: Scope) -> None:
+        self.show(name, arguments, scope)
+
+    def finish(self, scope: Scope) -> None:
+        self.show(LispSymbol("global"), LispEmptyList(), scope)
+
+    def show(self, name: LispSymbol, arguments: LispList, scope: Scope):
+        print("\n"*30)
+        print_side_by_side_by_side(
+            program_panel(LispNonEmptyList(name, arguments), scope.names, self.ast),
+            "Output:\n\n" + self.screen.get_contents(),
+            str(scope),
+        )
+        input()  # Pause
+
+
+def program_panel(expression: LispValue, names: Sequence[str], ast: Sequence[LispValue]) -> str:
+    result = ""
+    result += f"Expression:    {expression}\n"
+    result += f"Current Scope: {' '.join(names)}\n\n\n"
+    for node in ast:
+        result += node.__str__() + "\n"
+    return result
+
+
+def replay(events: Iterable[Event], step: bool = False) -> None:
+    """Shows the recorded state before every function application, like `StepTracer` did while the
+    program ran. When the oldest events were dropped from the ring buffer, the scope and output only
+    reflect what was kept"""
+    ast: Sequence[LispValue] = []
+    output: list[str] = []
+    # Blocks of the scope, outermost first: (name, [symbol, value, symbol type])
+    blocks: list[tuple[str, list[list[object]]]] = [("global", [])]
+
+    for kind, a, b in events:
+        if kind == START:
+            ast = cast(Sequence[LispValue], a)
+        elif kind == CALL:
+            if step:
+                print("\n"*30)
+            print_side_by_side_by_side(
+                program_panel(LispNonEmptyList(cast(LispSymbol, a), cast(LispList, b)),
+                              [name for name, _ in blocks], ast),
+                "Output:\n\n" + "".join(line + "\n" for line in output),
+                scope_panel(blocks),
+            )
+            if step:
+                input()  # Pause
+        elif kind == ENTER:
+            blocks.append((cast(LispSymbol, a).symbolName, []))
+        elif kind == LEAVE:
+            if len(blocks) > 1:
+                blocks.pop()
+        elif kind == BIND or kind == DEFINE:
+            blocks[-1][1].append([a, b, SymbolType.FUNCTION if kind == DEFINE else SymbolType.VARIABLE])
+        elif kind == ASSIGN:
+            binding = find_binding(blocks, cast(LispSymbol, a))
+            if binding is not None:
+                binding[1] = b
+        elif kind == OUTPUT:
+            output.extend(cast(tuple[str, ...], a))
+
+
+def find_binding(blocks: list[tuple[str, list[list[object]]]], symbol: LispSymbol) -> list[object] | None:
+    for _, bindings in reversed(blocks):
+        for binding in reversed(bindings):
+            if binding[0] == symbol:
+                return binding
+    return None
+
+
+def scope_panel(blocks: list[tuple[str, list[list[object]]]]) -> str:
+    """The blocks, formatted like `Scope.__str__`"""
+    result = ""
+    for _, bindings in blocks:
+        for var, value, symbol_type in bindings:
+            result += f"{var}" + (f" = {value}" if symbol_type ==
+                                  SymbolType.VARIABLE else "()") + "\n"
+        result += "-----------------------------\n"
+    return result.removesuffix("-----------------------------\n")
+
+
+def print_side_by_side_by_side(left: str, middle: str, right: str):
+    leftLines = left.split("\n")
+    middleLines = middle.split("\n")
+    rightLines = right.split("\n")
+
+    maxLeftWidth = max(map(lambda line: len(line), leftLines))
+    maxMiddleWidth = max(map(lambda line: len(line), middleLines))
+
+    for i in range(max(len(leftLines), len(middleLines))):
+        if i < len(leftLines):
+            neededPadding = maxLeftWidth - len(leftLines[i])
+            print(leftLines[i] + " " * neededPadding, end="")
+        else:
+            print(" " * maxLeftWidth, end="")
+
+        print(" | ", end="")
+
+        if i < len(middleLines):
+            neededPadding = maxMiddleWidth - len(middleLines[i])
+            print(middleLines[i] + " " * neededPadding, end="")
+        else:
+            print(" " * maxMiddleWidth, end="")
+
+        print(" | ", end="")
+
+        if i < len(rightLines):
+            print(rightLines[i], end="")
+
+        print()  # Break line
+
+
+def main():
+    arguments = argparse.ArgumentParser(description="Replays a trace saved by `RecordingTracer.save`")
+    arguments.add_argument("trace")
+    arguments.add_argument("--step", action="store_true", help="wait for enter after every application")
+    options = arguments.parse_args()
+    replay(load(options.trace), options.step)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+import math
+from typing import TYPE_CHECKING, Callable, TypeAlias
+from lisptypes import LispList, LispNumber, LispValue
+from primitives import arity_error
+
+if TYPE_CHECKING:
+    # Checked as if installed, the builtins using it are replaced by `missing_numpy` when it isn't
+    import numpy
+    from numpy.typing import NDArray
+else:
+    try:
+        import numpy
+    except ImportError:
+        numpy = None
+
+# Numeric vectors, backed by NumPy int64 arrays, and the builtins working on them. Aggregating a
+# vector is a single vectorized call instead of an application per element.
+#
+# Elements are 64-bit integers: arithmetic producing an element that doesn't fit raises, while sums
+# and products are numbers, as exact as those of `+` and `*`. Division is integer division and fails
+# on zero divisors, like `/`. The builtins are available in every engine, and raise when NumPy is not
+# installed.
+
+# Vector builtins: evaluated arguments in, value out
+Builtin = Callable[[list[LispValue]], LispValue]
+
+Array: TypeAlias = "NDArray[numpy.int64]"
+# Operands of the elementwise operations: numbers apply to every element
+Operand: TypeAlias = "Array | int"
+
+INT64_MIN = -2**63
+
+
+class LispVector(LispValue):
+    """A read-only vector of integers. Slices share the array of the vector they were taken from"""
+    __slots__ = ("array",)
+
+    def __init__(self, array: Array) -> None:
+        super().__init__()
+        array.flags.writeable = False
+        self.array = array
+
+    def __len__(self) -> int:
+        return len(self.array)
+
+    def __reduce__(self) -> tuple[type['LispVector'], tuple[Array]]:
+        return (LispVector, (self.array.copy(),))
+
+    def __eq__(self, value: object) -> bool:
+        return value is self or (isinstance(value, LispVector) and numpy.array_equal(value.array, self.array))
+
+    def __str__(self) -> str:
+        return "#(" + " ".join(map(str, self.array.tolist())) + ")"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+ELEMENTWISE_OPERATIONS: dict[str, str] = {
+    "vector+": "addition",
+    "vector-": "subtraction",
+    "vector*": "multiplication",
+}
+
+
+def element(value: int) -> int:
+    """`value` as a vector element"""
+    if not INT64_MIN <= value < 2**63:
+        raise Exception(f"{value} doesn't fit in a vector element")
+    return value
+
+
+def check_overflow(operation: str, overflowed: "NDArray[numpy.bool_]") -> None:
+    """Raises if any element of the result of a vector `operation` `overflowed`. Arithmetic on the arrays
+    wraps around silently, the operations find the elements it happened to"""
+    if overflowed.any():
+        raise Exception(f"vector {operation} overflowed a vector element")
+
+
+def vector_operand(form: str, value: LispValue) -> LispVector:
+    if not isinstance(value, LispVector):
+        raise Exception(f"{form} expects a vector, found {value}")
+    return value
+
+
+def index_operand(form: str, value: LispValue) -> int:
+    if not isinstance(value, LispNumber):
+        raise Exception(f"{form} expects a number as index, found {value}")
+    return value.numberValue
+
+
+def elementwise_operands(form: str, args: list[LispValue]) -> tuple[Array, list[Operand]]:
+    """The first operand in `args` as an array, and the operands following it"""
+    operation = ELEMENTWISE_OPERATIONS[form]
+    operands: list[Operand] = []
+    length = None
+    for arg in args:
+        if isinstance(arg, LispVector):
+            if length is not None and len(arg) != length:
+                raise Exception(
+                    f"can't perform vector {operation} on vectors of lengths {length} and {len(arg)}")
+            length = len(arg)
+            operands.append(arg.array)
+        elif isinstance(arg, LispNumber):
+            operands.append(element(arg.numberValue))
+        else:
+            raise Exception(
+                f"tried to perform vector {operation} with a non num or vector type: {arg}")
+    if length is None:
+        raise Exception(f"{form} needs at least one vector, but was called with {args}")
+    return numpy.asarray(operands[0], dtype=numpy.int64), operands[1:]
+
+
+def add(args: list[LispValue]) -> LispVector:
+    result, operands = elementwise_operands("vector+", args)
+    # Operations on numbers alone warn when they wrap around, overflows are checked instead
+    with numpy.errstate(over="ignore"):
+        for operand in operands:
+            total = numpy.add(result, operand, dtype=numpy.int64)
+            # Only addends of the same sign overflow, giving a total of the other sign
+            check_overflow("addition", (result ^ total) & (operand ^ total) < 0)
+            result = total
+    return LispVector(result)
+
+
+def subtract(args: list[LispValue]) -> LispVector:
+    result, operands = elementwise_operands("vector-", args)
+    with numpy.errstate(over="ignore"):
+        for operand in operands:
+            difference = numpy.subtract(result, operand, dtype=numpy.int64)
+            # Only operands of different signs overflow, giving a difference of the sign of the subtrahend
+            check_overflow("subtraction", (result ^ operand) & (result ^ difference) < 0)
+            result = difference
+    return LispVector(result)
+
+
+def multiply(args: list[LispValue]) -> LispVector:
+    result, operands = elementwise_operands("vector*", args)
+    with numpy.errstate(over="ignore"):
+        for operand in operands:
+            product = numpy.multiply(result, operand, dtype=numpy.int64)
+            # A product that didn't wrap around divided by one factor gives the other one back. Dividing
+            # INT64_MIN by -1 wraps around itself, so -1 * INT64_MIN is checked apart
+            factors = numpy.where(result == 0, 1, result)
+            wrong = numpy.floor_divide(product, factors, dtype=numpy.int64) != operand
+            check_overflow("multiplication", (result != 0) & (wrong | ((result == -1) & (operand == INT64_MIN))))
+            result = product
+    return LispVector(result)
+
+
+def divide(args: list[LispValue]) -> LispVector:
+    if len(args) != 2:
+        raise arity_error("vector/", "two", args)
+    [dividend, divisor] = args
+    if not isinstance(dividend, (LispNumber, LispVector)) or not isinstance(divisor, (LispNumber, LispVector)) \
+            or not (isinstance(dividend, LispVector) or isinstance(divisor, LispVector)):
+        raise Exception(
+            f"can't perform vector division using non vector values, attempted: {dividend}/{divisor}")
+    if isinstance(dividend, LispVector) and isinstance(divisor, LispVector) and len(dividend) != len(divisor):
+        raise Exception(
+            f"can't perform vector division on vectors of lengths {len(dividend)} and {len(divisor)}")
+
+    divisors = numpy.asarray(divisor.array if isinstance(divisor, LispVector) else element(divisor.numberValue),
+                             dtype=numpy.int64)
+    if not numpy.all(divisors):
+        raise Exception(
+            f"can't divide a number by zero")
+    dividends = numpy.asarray(dividend.array if isinstance(dividend, LispVector) else element(dividend.numberValue),
+                              dtype=numpy.int64)
+    # The only quotient that doesn't fit
+    check_overflow("division", (dividends == INT64_MIN) & (divisors == -1))
+    # Floor division, like `//` on the ints of `/`
+    return LispVector(numpy.floor_divide(dividends, divisors, dtype=numpy.int64))
+
+
+def vector_sum(args: list[LispValue]) -> LispNumber:
+    if len(args) != 1:
+        raise arity_error("vector-sum", "one", args)
+    array = vector_operand("vector-sum", args[0]).array
+    # No partial sum can reach 2**63 when the largest element times the length doesn't
+    if len(array) and len(array) * max(-int(array.min()), int(array.max())) >= 2**63:
+        return LispNumber(sum(array.tolist()))
+    return LispNumber(int(array.sum(dtype=numpy.int64)))
+
+
+def vector_product(args: list[LispValue]) -> LispNumber:
+    if len(args) != 1:
+        raise arity_error("vector-product", "one", args)
+    array = vector_operand("vector-product", args[0]).array
+    if not array.all():
+        return LispNumber(0)
+    # The product fits in an int64 while the factors have less than 62 bits between them, with room
+    # for the rounding of the logarithms
+    if numpy.log2(numpy.abs(array.astype(numpy.float64))).sum() >= 62:
+        return LispNumber(math.prod(array.tolist()))
+    return LispNumber(int(array.prod(dtype=numpy.int64)))
+
+
+def vector_length(args: list[LispValue]) -> LispNumber:
+    if len(args) != 1:
+        raise arity_error("vector-length", "one", args)
+    return LispNumber(len(vector_operand("vector-length", args[0])))
+
+
+def vector_ref(args: list[LispValue]) -> LispNumber:
+    if len(args) != 2:
+        raise arity_error("vector-ref", "two", args)
+    vector = vector_operand("vector-ref", args[0])
+    index = index_operand("vector-ref", args[1])
+    if not 0 <= index < len(vector):
+        raise Exception(f"vector index {index} out of range for a vector of length {len(vector)}")
+    return LispNumber(int(vector.array[index]))
+
+
+def vector_slice(args: list[LispValue]) -> LispVector:
+    """`(vector-slice v start end)`: the elements from `start` up to, not including, `end`"""
+    if len(args) != 3:
+        raise arity_error("vector-slice", "three", args)
+    vector = vector_operand("vector-slice", args[0])
+    start = index_operand("vector-slice", args[1])
+    end = index_operand("vector-slice", args[2])
+    if not 0 <= start <= end <= len(vector):
+        raise Exception(f"can't slice from {start} to {end} a vector of length {len(vector)}")
+    return LispVector(vector.array[start:end])
+
+
+def vector_range(args: list[LispValue]) -> LispVector:
+    """`(vector-range start end)`: the numbers from `start` up to, not including, `end`"""
+    if len(args) != 2:
+        raise arity_error("vector-range", "two", args)
+    start = element(index_operand("vector-range", args[0]))
+    end = element(index_operand("vector-range", args[1]))
+    return LispVector(numpy.arange(start, max(start, end), dtype=numpy.int64))
+
+
+def vector(args: list[LispValue]) -> LispVector:
+    """`(vector 1 2 3)`"""
+    return list_to_vector([LispList.from_list(args)])
+
+
+def list_to_vector(args: list[LispValue]) -> LispVector:
+    if len(args) != 1:
+        raise arity_error("list->vector", "one", args)
+    if not isinstance(args[0], LispList):
+        raise Exception(f"list->vector expects a list, found {args[0]}")
+    values: list[int] = []
+    for item in args[0]:
+        if not isinstance(item, LispNumber):
+            raise Exception(f"vectors can only hold numbers, found {item}")
+        values.append(element(item.numberValue))
+    return LispVector(numpy.array(values, dtype=numpy.int64))
+
+
+def vector_to_list(args: list[LispValue]) -> LispList:
+    if len(args) != 1:
+        raise arity_error("vector->list", "one", args)
+    return LispList.from_list([LispNumber(value) for value in vector_operand("vector->list", args[0]).array.tolist()])
+
+
+def allocated_cells(name: str, args: list[LispValue]) -> int:
+    """Number of elements, or list cells for `vector->list`, that the builtin `name` allocates when applied
+    to the evaluated `args`, known before it runs. 0 for arguments it will reject"""
+    match name:
+        case "vector":
+            return len(args)
+        case "vector-range":
+            if len(args) == 2 and isinstance(args[0], LispNumber) and isinstance(args[1], LispNumber):
+                return max(0, args[1].numberValue - args[0].numberValue)
+        case "list->vector":
+            if len(args) == 1 and isinstance(args[0], LispList):
+                return len(args[0])
+        case "vector->list":
+            if len(args) == 1 and isinstance(args[0], LispVector):
+                return len(args[0])
+        case form if form in ELEMENTWISE_OPERATIONS or form == "vector/":
+            for arg in args:
+                if isinstance(arg, LispVector):
+                    return len(arg)
+        case _:
+            pass
+    return 0
+
+
+VECTOR_BUILTINS: dict[str, Builtin] = {
+    "vector": vector,
+    "vector-range": vector_range,
+    "list->vector": list_to_vector,
+    "vector->list": vector_to_list,
+    "vector+": add,
+    "vector-": subtract,
+    "vector*": multiply,
+    "vector/": divide,
+    "vector-sum": vector_sum,
+    "vector-product": vector_product,
+    "vector-length": vector_length,
+    "vector-ref": vector_ref,
+    "vector-slice": vector_slice,
+}
+
+if numpy is None:
+    def missing_numpy(args: list[LispValue]) -> LispValue:
+        raise Exception("vectors need NumPy, which is not installed")
+
+    # The names stay builtins, so programs mean the same with or without NumPy
+    for name in VECTOR_BUILTINS:
+        VECTOR_BUILTINS[name] = missing_numpy
+
+# Position of every builtin in `VECTOR_BUILTINS`, the operand of the VM instruction applying it
+VECTOR_NAMES: list[str] = list(VECTOR_BUILTINS)
@@ -0,0 +1,437 @@
+from array import array
+from lisptypes import LispEmptyList, LispFunction, LispList, LispNonEmptyList, LispNumber, LispSymbol, LispValue
+from primitives import ARITHMETIC, ARITHMETIC_OPERATIONS, arity_error, cons, divide, number_operand
+from scope import Scope, SymbolType, reject_lexical_addresses
+from screen import Screen
+from source import Span, located
+from vectors import VECTOR_BUILTINS, VECTOR_NAMES
+
+# Bytecode for the Lisp dialect: every instruction is an opcode followed by its operands, all stored in
+# an `array("i")`. Operands index the tables of the `CodeObject` the instruction belongs to.
+#
+# Arithmetic operands are checked as soon as each one is evaluated, like in the tree-walker, so the
+# operands after one of the wrong type never run. Operands followed only by constants, which can't
+# have effects or raise, are left for the arithmetic instruction to check.
+
+OPCODES: list[tuple[str, int]] = [
+    # name, number of operands
+    ("CONST", 1),   # push constants[k]
+    ("LOAD", 1),    # push the value of names[n]
+    ("POP", 0),     # discard the top value
+    ("CHECK", 1),   # the top value must be a number for the operation "+-*"[o], leaving it
+    ("ADD", 1),     # add the n values on top
+    ("SUB", 1),     # subtract the n values on top
+    ("MUL", 1),     # multiply the n values on top
+    ("DIV", 0),     # integer division of the two values on top
+    ("CONS", 0),    # cons the two values on top
+    ("LIST", 1),    # build a list from the n values on top
+    ("PRINT", 0),   # add the top value to the lines to print and discard it
+    ("FLUSH", 0),   # print the pending lines with one write
+    ("LET", 1),     # create names[n] with the top value, leaving it
+    ("ASSIGN", 1),  # set names[n] to the top value, leaving it
+    ("DEFUN", 2),   # bind names[n] to functions[f], push ()
+    ("ENTER", 2),   # look up the function names[n], begin its block and check it takes `argc` arguments
+    ("BIND", 1),    # bind parameter i of the function being entered to the top value, discarding it
+    ("CALL", 0),    # run the function being entered
+    ("RETURN", 0),  # end the blocks of the function and go back to its caller
+    ("HALT", 0),    # end of the program, its value is on top
+    ("RAISE", 1),   # raise a new exception with the message errors[e]
+    ("BUILTIN", 2),  # apply the vector builtin VECTOR_NAMES[b] to the n values on top
+]
+
+(CONST, LOAD, POP, CHECK, ADD, SUB, MUL, DIV, CONS, LIST, PRINT, FLUSH, LET, ASSIGN,
+ DEFUN, ENTER, BIND, CALL, RETURN, HALT, RAISE, BUILTIN) = range(len(OPCODES))
+
+
+class CodeObject():
+    """The bytecode of a program or a function body, and the tables its operands refer to.
+    `span_at` gives, for the offset of each instruction, the index in `spans` of the list it was compiled from"""
+    __slots__ = ("name", "code", "constants", "names", "functions", "errors", "spans", "span_at")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.code = array("i")
+        self.constants: list[LispValue] = []
+        self.names: list[LispSymbol] = []
+        self.functions: list[VMFunction] = []
+        # Messages of the errors RAISE raises, a new exception every time
+        self.errors: list[str] = []
+        self.spans: list[Span | None] = []
+        self.span_at = array("i")
+
+
+class VMFunction(LispValue):
+    """What `defun` binds in the scope when running on the VM"""
+    __slots__ = ("definition", "params", "arity", "code")
+
+    def __init__(self, definition: LispList, params: tuple[LispSymbol, ...], code: CodeObject) -> None:
+        super().__init__()
+        self.definition = definition
+        self.params = params
+        self.arity = len(params)
+        self.code = code
+
+    def __str__(self) -> str:
+        return str(self.definition)
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class Compiler():
+    def __init__(self, name: str) -> None:
+        self.code_object = CodeObject(name)
+        self.constant_indexes: dict[LispValue, int] = {}
+        self.name_indexes: dict[LispSymbol, int] = {}
+        # Index in `spans` of the innermost list being compiled
+        self.current_span = -1
+
+    def emit(self, opcode: int, *operands: int):
+        code_object = self.code_object
+        code_object.code.append(opcode)
+        code_object.code.extend(operands)
+        code_object.span_at.append(self.current_span)
+        code_object.span_at.extend([self.current_span] * len(operands))
+
+    def constant(self, value: LispValue) -> int:
+        if value not in self.constant_indexes:
+            self.constant_indexes[value] = len(self.code_object.constants)
+            self.code_object.constants.append(value)
+        return self.constant_indexes[value]
+
+    def name(self, symbol: LispSymbol) -> int:
+        if symbol not in self.name_indexes:
+            self.name_indexes[symbol] = len(self.code_object.names)
+            self.code_object.names.append(symbol)
+        return self.name_indexes[symbol]
+
+    def error(self, exception: Exception):
+        self.emit(RAISE, len(self.code_object.errors))
+        self.code_object.errors.append(str(exception))
+
+    def compile_body(self, body: list[LispValue], end: int) -> CodeObject:
+        if len(body) == 0:
+            self.emit(CONST, self.constant(LispEmptyList()))
+        for i, expr in enumerate(body):
+            if i > 0:
+                self.emit(POP)
+            self.compile_expression(expr)
+        self.emit(end)
+        return self.code_object
+
+    def compile_expression(self, expr: LispValue):
+        if isinstance(expr, (LispNumber, LispEmptyList)):
+            self.emit(CONST, self.constant(expr))
+
+        elif isinstance(expr, LispSymbol):
+            self.emit(LOAD, self.name(expr))
+
+        elif isinstance(expr, LispNonEmptyList):
+            enclosing_span = self.current_span
+            if expr.span is not None:
+                self.current_span = len(self.code_object.spans)
+                self.code_object.spans.append(expr.span)
+
+            if isinstance(expr.first, LispSymbol):
+                self.compile_function_application(expr.first, expr.rest.to_python_list())
+            else:
+                self.error(Exception(
+                    f"can't perform function application using '{expr.first}' as a function"))
+            self.current_span = enclosing_span
+
+        else:
+            raise Exception(f"unexpected value {expr}")
+
+    def compile_function_application(self, name: LispSymbol, args: list[LispValue]):
+        match name.symbolName:
+            case "+" | "-" | "*":
+                operation = "+-*".index(name.symbolName)
+                last_effect = max((i for i, arg in enumerate(args) if not isinstance(arg, (LispNumber, LispEmptyList))),
+                                  default=0)
+                for i, arg in enumerate(args):
+                    self.compile_expression(arg)
+                    if i < last_effect:
+                        self.emit(CHECK, operation)
+                self.emit({"+": ADD, "-": SUB, "*": MUL}[name.symbolName], len(args))
+
+            case "/":
+                if len(args) != 2:
+                    return self.error(arity_error("division", "two", args))
+                self.compile_expression(args[0])
+                self.compile_expression(args[1])
+                self.emit(DIV)
+
+            case "defun":
+                # Not dealing with duplicated function names
+                if len(args) < 3:
+                    return self.error(Exception(
+                        f"function definition expects at least three arguments (foo_name, arguments, body), given {args}"))
+                [foo_name, *foo_body] = args
+                if not isinstance(foo_name, LispSymbol):
+                    return self.error(Exception(
+                        f"function name must be a symbol, given {foo_name}"))
+
+                try:
+                    function = compile_function(foo_name, LispList.from_list(foo_body))
+                except Exception as error:
+                    # Malformed definitions fail when they are evaluated, like in the tree-walker
+                    return self.error(error)
+                self.emit(DEFUN, self.name(foo_name), len(self.code_object.functions))
+                self.code_object.functions.append(function)
+
+            case "let" | "=":
+                if len(args) != 2:
+                    return self.error(arity_error(name.symbolName, "two", args))
+                [symbol, value] = args
+                if not isinstance(symbol, LispSymbol):
+                    return self.error(Exception(
+                        f"can't perform attribution using '{symbol}' as a variable"))
+                self.compile_expression(value)
+                self.emit(LET if name.symbolName == "let" else ASSIGN, self.name(symbol))
+
+            case "cons":
+                if len(args) != 2:
+                    return self.error(arity_error("cons", "two", args))
+                self.compile_expression(args[0])
+                self.compile_expression(args[1])
+                self.emit(CONS)
+
+            case "list":
+                for arg in args:
+                    self.compile_expression(arg)
+                self.emit(LIST, len(args))
+
+            case "print":
+                # Like in the tree-walker, lines are written together unless an argument may print too
+                pending = False
+                for arg in args:
+                    if pending and isinstance(arg, LispNonEmptyList):
+                        self.emit(FLUSH)
+                    self.compile_expression(arg)
+                    self.emit(PRINT)
+                    pending = True
+                if pending:
+                    self.emit(FLUSH)
+                self.emit(CONST, self.constant(LispEmptyList()))
+
+            case builtin if builtin in VECTOR_BUILTINS:
+                for arg in args:
+                    self.compile_expression(arg)
+                self.emit(BUILTIN, VECTOR_NAMES.index(builtin), len(args))
+
+            case _:
+                # Like the tree-walker, the block of the callee begins before its arguments are evaluated
+                self.emit(ENTER, self.name(name), len(args))
+                for i, arg in enumerate(args):
+                    self.compile_expression(arg)
+                    self.emit(BIND, i)
+                self.emit(CALL)
+
+
+def compile_program(ast: list[LispValue]) -> CodeObject:
+    if len(ast) == 0:
+        raise Exception("can't evaluate an empty program")
+    reject_lexical_addresses(ast, "vm")
+    return Compiler("program").compile_body(ast, HALT)
+
+
+def compile_function(name: LispSymbol, definition: LispList) -> VMFunction:
+    """Compiles a function definition `((parameter-list) body...)`, as stored by `defun`, raising if it
+    is malformed"""
+    function = LispFunction(name, definition)
+    code = Compiler(name.symbolName).compile_body(list(function.body), RETURN)
+    return VMFunction(definition, function.params, code)
+
+
+def disassemble(code_object: CodeObject) -> str:
+    """Lists the instructions of a code object, and of the functions it defines"""
+    lines = [f"== {code_object.name} =="]
+    code = code_object.code
+    pc = 0
+    while pc < len(code):
+        opcode = code[pc]
+        name, operand_count = OPCODES[opcode]
+        operands = list(code[pc + 1:pc + 1 + operand_count])
+
+        comment = ""
+        if opcode == CONST:
+            comment = str(code_object.constants[operands[0]])
+        elif opcode in (LOAD, LET, ASSIGN, ENTER):
+            comment = str(code_object.names[operands[0]])
+        elif opcode == DEFUN:
+            comment = f"{code_object.names[operands[0]]} {code_object.functions[operands[1]].definition}"
+        elif opcode == RAISE:
+            comment = code_object.errors[operands[0]]
+        elif opcode == BUILTIN:
+            comment = VECTOR_NAMES[operands[0]]
+
+        text = f"{pc:6} {name:<8} {' '.join(map(str, operands)):<8}"
+        lines.append(f"{text} ({comment})" if comment else text.rstrip())
+        pc += 1 + operand_count
+
+    for function in code_object.functions:
+        lines.append("")
+        lines.append(disassemble(function.code))
+    return "\n".join(lines)
+
+
+def eval_vm(ast: list[LispValue], scope: Scope, screen: Screen) -> LispValue:
+    return run(compile_program(ast), scope, screen)
+
+
+def run(program: CodeObject, scope: Scope, screen: Screen) -> LispValue:
+    values: list[LispValue] = []
+    # Functions whose arguments are being evaluated, innermost last
+    entering: list[VMFunction] = []
+    # Callers waiting for a function to return: code object, where to continue, blocks to end on return
+    frames: list[tuple[CodeObject, int, int]] = []
+    # Functions defined by other engines, compiled on their first call
+    compiled_definitions: dict[int, tuple[LispFunction, VMFunction]] = {}
+    # Values of the print in progress, nested prints only start once they are written
+    lines: list[str] = []
+
+    current = program
+    code, constants, names = current.code, current.constants, current.names
+    pc = 0
+    blocks = 0
+    instruction = 0
+
+    try:
+        while True:
+            instruction = pc
+            opcode = code[pc]
+
+            if opcode == LOAD:
+                symbol = names[code[pc + 1]]
+                value = scope.read_symbol(symbol)
+                if value is None:
+                    raise Exception(f"unknown symbol {symbol}")
+                values.append(value)
+                pc += 2
+
+            elif opcode == CONST:
+                values.append(constants[code[pc + 1]])
+                pc += 2
+
+            elif opcode == BIND:
+                scope.create_symbol(entering[-1].params[code[pc + 1]], values.pop(), SymbolType.VARIABLE)
+                pc += 2
+
+            elif opcode == CHECK:
+                number_operand(ARITHMETIC_OPERATIONS["+-*"[code[pc + 1]]], values[-1])
+                pc += 2
+
+            elif opcode == ADD or opcode == SUB or opcode == MUL:
+                count = code[pc + 1]
+                operation = ARITHMETIC_OPERATIONS["+-*"[opcode - ADD]]
+                operators = [number_operand(operation, value) for value in values[len(values) - count:]]
+                del values[len(values) - count:]
+                values.append(ARITHMETIC["+-*"[opcode - ADD]](operators))
+                pc += 2
+
+            elif opcode == ENTER:
+                name = names[code[pc + 1]]
+                foo = scope.read_symbol(name)
+                scope.begin_block(name.symbolName)
+
+                if isinstance(foo, VMFunction):
+                    function = foo
+                elif isinstance(foo, LispFunction):
+                    cached = compiled_definitions.get(id(foo))
+                    if cached is None or cached[0] is not foo:
+                        cached = (foo, compile_function(name, foo.definition))
+                        compiled_definitions[id(foo)] = cached
+                    function = cached[1]
+                else:
+                    raise Exception(
+                        f"Function {name} not defined")
+                # Check if user passed the needed number of parameters
+                if function.arity != code[pc + 2]:
+                    raise Exception(
+                        f"{name} expects {function.arity} arguments, were given {code[pc + 2]}")
+                entering.append(function)
+                pc += 3
+
+            elif opcode == CALL:
+                function = entering.pop()
+                if code[pc + 1] == RETURN:
+                    # Tail call: the frame is reused, its blocks end when the callee returns
+                    blocks += 1
+                else:
+                    frames.append((current, pc + 1, blocks))
+                    blocks = 1
+                current = function.code
+                code, constants, names = current.code, current.constants, current.names
+                pc = 0
+
+            elif opcode == RETURN:
+                for _ in range(blocks):
+                    scope.end_block()
+                current, pc, blocks = frames.pop()
+                code, constants, names = current.code, current.constants, current.names
+
+            elif opcode == POP:
+                values.pop()
+                pc += 1
+
+            elif opcode == DIV:
+                divisor = values.pop()
+                values.append(divide(values.pop(), divisor))
+                pc += 1
+
+            elif opcode == CONS:
+                rest = values.pop()
+                values.append(cons(values.pop(), rest))
+                pc += 1
+
+            elif opcode == LIST:
+                count = code[pc + 1]
+                items = values[len(values) - count:]
+                del values[len(values) - count:]
+                values.append(LispList.from_list(items))
+                pc += 2
+
+            elif opcode == PRINT:
+                lines.append(str(values.pop()))
+                pc += 1
+
+            elif opcode == FLUSH:
+                screen.print_lines(lines)
+                lines = []
+                pc += 1
+
+            elif opcode == LET:
+                scope.create_symbol(names[code[pc + 1]], values[-1], SymbolType.VARIABLE)
+                pc += 2
+
+            elif opcode == ASSIGN:
+                scope.set_symbol(names[code[pc + 1]], values[-1], SymbolType.VARIABLE)
+                pc += 2
+
+            elif opcode == DEFUN:
+                scope.create_symbol(names[code[pc + 1]], current.functions[code[pc + 2]], SymbolType.FUNCTION)
+                values.append(LispEmptyList())
+                pc += 3
+
+            elif opcode == HALT:
+                return values[-1]
+
+            elif opcode == RAISE:
+                raise Exception(current.errors[code[pc + 1]])
+
+            elif opcode == BUILTIN:
+                count = code[pc + 2]
+                args = values[len(values) - count:]
+                del values[len(values) - count:]
+                values.append(VECTOR_BUILTINS[VECTOR_NAMES[code[pc + 1]]](args))
+                pc += 3
+
+            else:
+                raise Exception(f"unknown opcode {opcode}")
+
+    except Exception as error:
+        # Like the tree-walker, a print that fails still writes what it evaluated
+        if lines:
+            screen.print_lines(lines)
+        span_index = current.span_at[instruction]
+        raise located(error, current.spans[span_index] if span_index >= 0 else None)